@@ -1,5 +1,12 @@
 from __future__ import annotations
 
-from .main import app
-
 __all__ = ["app"]
+
+
+def __getattr__(name: str):
+    # Lazy so worker processes (parsing, inference) that import submodules don't build the web app.
+    if name == "app":
+        from .main import app
+
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
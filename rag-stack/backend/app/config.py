@@ -4,11 +4,14 @@ import functools
 from pathlib import Path
 from typing import List
 
-from pydantic import Field
+from pydantic import Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from .models import PREFIX_INDEX_DIMS
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR.parent / "data"
+INDEX_DIR = DATA_DIR / "indexes"
 
 
 class Settings(BaseSettings):
@@ -23,21 +26,97 @@ class Settings(BaseSettings):
     claude_output_cost_per_1k: float = Field(default=0.015, alias="CLAUDE_OUTPUT_COST_PER_1K")
     openai_input_cost_per_1k: float = Field(default=0.005, alias="OPENAI_INPUT_COST_PER_1K")
     openai_output_cost_per_1k: float = Field(default=0.015, alias="OPENAI_OUTPUT_COST_PER_1K")
+    llm_max_connections: int = Field(default=100, alias="LLM_MAX_CONNECTIONS")
+    llm_max_keepalive_connections: int = Field(default=20, alias="LLM_MAX_KEEPALIVE_CONNECTIONS")
+    llm_max_concurrency: int = Field(default=16, alias="LLM_MAX_CONCURRENCY")
+    llm_timeout: float = Field(default=60.0, alias="LLM_TIMEOUT")
+    llm_connect_timeout: float = Field(default=5.0, alias="LLM_CONNECT_TIMEOUT")
+    llm_retry_attempts: int = Field(default=3, alias="LLM_RETRY_ATTEMPTS")
+    llm_retry_backoff: float = Field(default=0.5, alias="LLM_RETRY_BACKOFF")
+    llm_retry_max_backoff: float = Field(default=8.0, alias="LLM_RETRY_MAX_BACKOFF")
     embeddings_provider: str = Field(default="sentence-transformers", alias="EMBEDDINGS_PROVIDER")
     embeddings_model: str = Field(default="BAAI/bge-m3", alias="EMBEDDINGS_MODEL")
+    onnx_model_dir: str | None = Field(default=None, alias="ONNX_MODEL_DIR")
+    onnx_quantized: bool = Field(default=False, alias="ONNX_QUANTIZED")
+    onnx_threads: int = Field(default=0, alias="ONNX_THREADS")
+    embedding_cache_size: int = Field(default=4096, alias="EMBEDDING_CACHE_SIZE")
+    embedding_cache_ttl: float = Field(default=86_400.0, alias="EMBEDDING_CACHE_TTL")
+    embedding_disk_cache: bool = Field(default=False, alias="EMBEDDING_DISK_CACHE")
+    embedding_disk_cache_size: int = Field(default=50_000, alias="EMBEDDING_DISK_CACHE_SIZE")
+    embedding_batch_size: int = Field(default=32, alias="EMBEDDING_BATCH_SIZE")
+    embedding_batch_wait_ms: float = Field(default=0.0, alias="EMBEDDING_BATCH_WAIT_MS")
+    inference_workers: int = Field(default=0, alias="INFERENCE_WORKERS")
+    rerank_workers: int = Field(default=0, alias="RERANK_WORKERS")
     database_url: str = Field(alias="DATABASE_URL")
     api_key: str = Field(alias="API_KEY")
     enable_rerank: bool = Field(default=False, alias="ENABLE_RERANK")
+    rerank_max_length: int = Field(default=512, alias="RERANK_MAX_LENGTH")
+    rerank_batch_size: int = Field(default=32, alias="RERANK_BATCH_SIZE")
+    rerank_fanout: int = Field(default=1, alias="RERANK_FANOUT")
+    rerank_candidates: int = Field(default=0, alias="RERANK_CANDIDATES")
+    rerank_cache_size: int = Field(default=50_000, alias="RERANK_CACHE_SIZE")
     enable_hybrid: bool = Field(default=False, alias="ENABLE_HYBRID")
+    hnsw_m: int = Field(default=16, alias="HNSW_M")
+    hnsw_ef_construction: int = Field(default=64, alias="HNSW_EF_CONSTRUCTION")
+    two_phase_retrieval: bool = Field(default=True, alias="TWO_PHASE_RETRIEVAL")
+    chunk_cache_size: int = Field(default=10_000, alias="CHUNK_CACHE_SIZE")
+    enable_metadata_index: bool = Field(default=True, alias="ENABLE_METADATA_INDEX")
+    vector_backend: str = Field(default="pgvector", alias="VECTOR_BACKEND")
+    faiss_index_type: str = Field(default="flat", alias="FAISS_INDEX_TYPE")
+    faiss_nlist: int = Field(default=1024, alias="FAISS_NLIST")
+    faiss_nprobe: int = Field(default=16, alias="FAISS_NPROBE")
+    faiss_hnsw_m: int = Field(default=32, alias="FAISS_HNSW_M")
+    faiss_ef_search: int = Field(default=64, alias="FAISS_EF_SEARCH")
+    faiss_quantization: str = Field(default="none", alias="FAISS_QUANTIZATION")
+    faiss_train_min_rows: int = Field(default=10_000, alias="FAISS_TRAIN_MIN_ROWS")
+    faiss_train_sample: int = Field(default=100_000, alias="FAISS_TRAIN_SAMPLE")
+    pgvector_quantization: str = Field(default="none", alias="PGVECTOR_QUANTIZATION")
+    quantization_rescore_factor: int = Field(default=4, alias="QUANTIZATION_RESCORE_FACTOR")
+    coarse_dims: int = Field(default=0, alias="COARSE_DIMS")
+    coarse_method: str = Field(default="prefix", alias="COARSE_METHOD")
+    coarse_rescore_factor: int = Field(default=8, alias="COARSE_RESCORE_FACTOR")
+    ask_batch_concurrency: int = Field(default=4, alias="ASK_BATCH_CONCURRENCY")
+    coalesce_requests: bool = Field(default=False, alias="COALESCE_REQUESTS")
+    enable_answer_cache: bool = Field(default=False, alias="ENABLE_ANSWER_CACHE")
+    answer_cache_size: int = Field(default=1024, alias="ANSWER_CACHE_SIZE")
+    answer_cache_threshold: float = Field(default=0.95, alias="ANSWER_CACHE_THRESHOLD")
+    answer_cache_ttl: float = Field(default=3600.0, alias="ANSWER_CACHE_TTL")
+    ask_deadline_ms: int = Field(default=0, alias="ASK_DEADLINE_MS")
+    hybrid_min_budget_ms: float = Field(default=100.0, alias="HYBRID_MIN_BUDGET_MS")
+    rerank_min_budget_ms: float = Field(default=1500.0, alias="RERANK_MIN_BUDGET_MS")
+    generation_overhead_ms: float = Field(default=500.0, alias="GENERATION_OVERHEAD_MS")
+    generation_ms_per_token: float = Field(default=20.0, alias="GENERATION_MS_PER_TOKEN")
+    generation_min_tokens: int = Field(default=64, alias="GENERATION_MIN_TOKENS")
     max_tokens: int = Field(default=1024, alias="MAX_TOKENS")
+    context_token_budget: int = Field(default=3000, alias="CONTEXT_TOKEN_BUDGET")
     temperature: float = Field(default=0.0, alias="TEMPERATURE")
     response_language: str = Field(default="es", alias="RESPONSE_LANGUAGE")
     rate_limit_per_minute: int = Field(default=60, alias="RATE_LIMIT_PER_MINUTE")
     log_level: str = Field(default="INFO", alias="LOG_LEVEL")
+    ingest_workers: int = Field(default=0, alias="INGEST_WORKERS")
+    ingest_parse_timeout: float = Field(default=300.0, alias="INGEST_PARSE_TIMEOUT")
+    ingest_pdf_pages_per_task: int = Field(default=50, alias="INGEST_PDF_PAGES_PER_TASK")
+    ingest_queue_size: int = Field(default=8, alias="INGEST_QUEUE_SIZE")
+    ingest_embed_batch_size: int = Field(default=256, alias="INGEST_EMBED_BATCH_SIZE")
+    ingest_embed_token_budget: int = Field(default=8192, alias="INGEST_EMBED_TOKEN_BUDGET")
+    ingest_write_batch_rows: int = Field(default=5000, alias="INGEST_WRITE_BATCH_ROWS")
     ingest_default_repo: str = "local"
     ingest_default_tag: str = "local"
     ingest_default_acl: List[str] = Field(default_factory=lambda: ["public"])
 
+    @model_validator(mode="after")
+    def check_coarse_dims(self) -> Settings:
+        # pgvector searches a prefix through the expression index built by migration 0004, and only
+        # the lengths listed there have one; FAISS reduces vectors itself and takes any length.
+        if (
+            self.coarse_dims
+            and self.vector_backend.lower() != "faiss"
+            and self.coarse_dims not in PREFIX_INDEX_DIMS
+        ):
+            supported = ", ".join(str(dims) for dims in PREFIX_INDEX_DIMS)
+            raise ValueError(f"COARSE_DIMS must be 0 or one of {supported} with pgvector")
+        return self
+
     @property
     def sync_database_url(self) -> str:
         if "+psycopg_async" in self.database_url:
@@ -13,7 +13,7 @@ AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
 
 @asynccontextmanager
-def lifespan_session():
+async def lifespan_session():
     session: AsyncSession = AsyncSessionLocal()
     try:
         yield session
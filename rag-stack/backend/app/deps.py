@@ -6,8 +6,9 @@ from typing import AsyncGenerator
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .config import get_settings
-from .db import get_db
+from .db import get_db, lifespan_session
 from .rag.embeddings import EmbeddingProvider, get_default_embedding_provider
+from .rag.hybrid import get_hybrid_retriever
 from .rag.retriever import Retriever
 from .rag.rerank import get_reranker
 from .rag.service import RAGService
@@ -35,5 +36,20 @@ async def get_rag_service(session: AsyncSession = None) -> RAGService:
                     embeddings=embeddings,
                     retriever=retriever,
                     reranker=reranker,
+                    hybrid=get_hybrid_retriever(_settings, retriever),
                 )
     return _rag_service
+
+
+async def close_rag_service() -> None:
+    global _rag_service
+    service, _rag_service = _rag_service, None
+    if service is not None:
+        await service.close()
+
+
+async def start_background_indexing() -> None:
+    if _settings.enable_hybrid:
+        service = await get_rag_service()
+        if service.hybrid:
+            service.hybrid.start_build(lifespan_session)
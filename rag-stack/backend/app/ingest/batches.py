@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from typing import List, Sequence
+
+from ..rag.embeddings import EmbeddingProvider
+from ..rag.packing import estimate_tokens
+
+
+def plan_batches(texts: Sequence[str], token_budget: int, max_batch_size: int) -> List[List[int]]:
+    # Groups text positions into model batches of similar length. Texts are taken shortest first, so
+    # each batch pads to a length close to all of its members; a batch closes when its padded size
+    # (count x longest member) would pass `token_budget`, so short chunks travel in large batches
+    # and long ones in small batches. A text longer than the budget still gets a batch of its own.
+    order = sorted(range(len(texts)), key=lambda position: len(texts[position]))
+    batches: List[List[int]] = []
+    current: List[int] = []
+    for position in order:
+        tokens = estimate_tokens(texts[position])
+        if current and (
+            (len(current) + 1) * tokens > token_budget or len(current) >= max_batch_size
+        ):
+            batches.append(current)
+            current = []
+        current.append(position)
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def embed_in_batches(
+    embeddings: EmbeddingProvider,
+    texts: Sequence[str],
+    token_budget: int,
+    max_batch_size: int,
+) -> List[List[float]]:
+    # Vectors come back in the order of `texts`.
+    # Providers without `embed_batch` (e.g. test stubs) would re-split the batch themselves.
+    encode = getattr(embeddings, "embed_batch", embeddings.embed_documents)
+    vectors: List[List[float] | None] = [None] * len(texts)
+    for batch in plan_batches(texts, max(1, token_budget), max(1, max_batch_size)):
+        for position, vector in zip(
+            batch, await encode([texts[position] for position in batch]), strict=True
+        ):
+            vectors[position] = vector
+    return vectors  # type: ignore[return-value]
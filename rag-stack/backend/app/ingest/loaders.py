@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import hashlib
 import json
 from dataclasses import dataclass
 from pathlib import Path
@@ -17,6 +18,9 @@ class LoadedDocument:
     content: str
     mime: str
     metadata: dict
+    file_hash: str | None = None
+    # Set by the parser when the file matches its manifest hash; `content` is then left empty.
+    unchanged: bool = False
 
 
 def load_text(path: Path) -> str:
@@ -29,11 +33,24 @@ def load_pdf(path: Path) -> str:
     return "\n".join(pages)
 
 
+def load_pdf_pages(path: Path, start: int, stop: int) -> tuple[str, int]:
+    reader = PdfReader(str(path))
+    total = len(reader.pages)
+    pages = [reader.pages[index].extract_text() or "" for index in range(start, min(stop, total))]
+    return "\n".join(pages), total
+
+
 def load_html(path: Path) -> str:
     soup = BeautifulSoup(path.read_text(encoding="utf-8"), "html.parser")
     return soup.get_text(separator="\n")
 
 
+def file_hash(path: Path) -> str:
+    # Same digest as sha256 over the raw bytes, so uploads and directory runs agree on a file.
+    with open(path, "rb") as handle:
+        return hashlib.file_digest(handle, "sha256").hexdigest()
+
+
 def detect_mime(path: Path) -> str:
     suffix = path.suffix.lower()
     if suffix == ".pdf":
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Sequence
+
+from sqlalchemy import Column, MetaData, Row, String, Table, exists, func, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from ..models import IngestManifest, RagChunk
+from .splitter import TextChunk
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class DocumentUpdate:
+    # A file's new chunk rows; `embeddings[i]` stays None for chunks expected to be reused
+    # unchanged.
+    path: str
+    mime: str
+    file_hash: str
+    repo: str | None
+    tag: str | None
+    version: str | None
+    acl: List[str] | None
+    chunks: List[RagChunk] = field(default_factory=list)
+    hashes: List[str] = field(default_factory=list)
+    embeddings: List[List[float] | None] = field(default_factory=list)
+
+    def add_chunks(self, chunks: Sequence[TextChunk]) -> None:
+        for chunk in chunks:
+            self.chunks.append(
+                RagChunk(
+                    content=chunk.content,
+                    path=self.path,
+                    mime=self.mime,
+                    repo=self.repo,
+                    tag=self.tag,
+                    version=self.version,
+                    acl=self.acl,
+                    meta={**chunk.metadata, "source": self.path},
+                )
+            )
+            self.hashes.append(content_hash(chunk.content))
+            self.embeddings.append(None)
+
+    def to_embed(self, previous: Sequence[str]) -> List[int]:
+        # Positions whose content is not among the chunk hashes the file had last time.
+        available = Counter(previous)
+        positions = []
+        for position, chunk_hash in enumerate(self.hashes):
+            if available[chunk_hash] > 0:
+                available[chunk_hash] -= 1
+            else:
+                positions.append(position)
+        return positions
+
+
+@dataclass
+class SyncResult:
+    added: int = 0
+    reused: int = 0
+    removed: int = 0
+    # Whole transaction: diffing, deletes, the bulk insert and the commit.
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.added / self.seconds if self.seconds else 0.0
+
+
+# Paths listed by the current directory ingest; lives on the lookup's own connection.
+SEEN_PATHS = Table(
+    "ingest_seen_paths",
+    MetaData(),
+    Column("path", String, primary_key=True),
+    prefixes=["TEMPORARY"],
+)
+SEEN_BATCH_SIZE = 500
+
+
+def reusable(entry: IngestManifest | None, acl: List[str] | None) -> bool:
+    # ACLs are stored on every row, so a changed ACL rewrites the whole file.
+    return entry is not None and entry.acl == acl
+
+
+def chunk_hashes(entry: IngestManifest | None, acl: List[str] | None) -> List[str]:
+    return [chunk_hash for chunk_hash, _, _ in entry.chunks] if reusable(entry, acl) else []
+
+
+def in_scope(model, repo: str | None, tag: str | None, version: str | None) -> list:
+    # Same coalesce() expressions as the unique index from migration 0005, so NULL scopes match each
+    # other.
+    return [
+        func.coalesce(model.repo, "") == (repo or ""),
+        func.coalesce(model.tag, "") == (tag or ""),
+        func.coalesce(model.version, "") == (version or ""),
+    ]
+
+
+async def get_manifest_entry(
+    session: AsyncSession,
+    path: str,
+    repo: str | None,
+    tag: str | None,
+    version: str | None,
+) -> IngestManifest | None:
+    stmt = (
+        select(IngestManifest)
+        .where(IngestManifest.path == path, *in_scope(IngestManifest, repo, tag, version))
+        .execution_options(populate_existing=True)
+    )
+    return (await session.execute(stmt)).scalars().first()
+
+
+class ManifestLookup:
+    # Manifest access for a directory ingest without holding the whole manifest in memory: entries
+    # are fetched per file as the parser reaches it and dropped once the file is through the split
+    # stage, and listed paths go to a temporary table so pruning is an anti-join in SQL. Uses a
+    # connection of its own because the ingest session is busy writing while files are being looked
+    # up.
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        repo: str | None,
+        tag: str | None,
+        version: str | None,
+        acl: List[str] | None,
+    ) -> None:
+        self.engine = engine
+        self.scope = (repo, tag, version)
+        self.acl = acl
+        self._connection: AsyncConnection | None = None
+        self._lock = asyncio.Lock()
+        self._entries: dict[str, Row | None] = {}
+        self._seen: set[str] = set()
+
+    async def __aenter__(self) -> ManifestLookup:
+        self._connection = await self.engine.connect()
+        await self._connection.run_sync(lambda sync: SEEN_PATHS.create(sync, checkfirst=True))
+        await self._connection.execute(SEEN_PATHS.delete())
+        await self._connection.commit()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        connection, self._connection = self._connection, None
+        try:
+            # Pooled connections outlive the run, and with them any temporary table left behind.
+            await connection.rollback()
+            await connection.run_sync(lambda sync: SEEN_PATHS.drop(sync, checkfirst=True))
+            await connection.commit()
+        finally:
+            await connection.close()
+
+    async def known_hash(self, path: Path) -> str | None:
+        # The file hash an unchanged file would have; None when the file must be parsed.
+        stmt = select(IngestManifest.file_hash, IngestManifest.acl, IngestManifest.chunks).where(
+            IngestManifest.path == str(path), *in_scope(IngestManifest, *self.scope)
+        )
+        async with self._lock:
+            entry = (await self._connection.execute(stmt)).first()
+            await self._connection.commit()
+        self._entries[str(path)] = entry
+        return entry.file_hash if reusable(entry, self.acl) else None
+
+    def previous(self, path: Path) -> List[str]:
+        # Chunk hashes the file had last time; releases the cached entry.
+        return chunk_hashes(self._entries.pop(str(path), None), self.acl)
+
+    async def seen(self, path: Path) -> None:
+        self._seen.add(str(path))
+        if len(self._seen) >= SEEN_BATCH_SIZE:
+            await self._flush_seen()
+
+    async def unseen(self, under: Path, limit: int) -> List[int]:
+        # Ids of manifest entries below `under` whose file was not listed by this run.
+        await self._flush_seen()
+        stmt = (
+            select(IngestManifest.id)
+            .where(
+                *in_scope(IngestManifest, *self.scope),
+                or_(
+                    IngestManifest.path == str(under),
+                    IngestManifest.path.startswith(f"{under}{os.sep}", autoescape=True),
+                ),
+                ~exists().where(SEEN_PATHS.c.path == IngestManifest.path),
+            )
+            .order_by(IngestManifest.id)
+            .limit(limit)
+        )
+        async with self._lock:
+            ids = list((await self._connection.execute(stmt)).scalars())
+            await self._connection.commit()
+        return ids
+
+    async def _flush_seen(self) -> None:
+        if not self._seen:
+            return
+        rows = [{"path": path} for path in self._seen]
+        self._seen = set()
+        async with self._lock:
+            await self._connection.execute(insert(SEEN_PATHS), rows)
+            await self._connection.commit()
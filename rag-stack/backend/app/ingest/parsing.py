@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from multiprocessing.queues import SimpleQueue
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Iterator
+
+from .loaders import LoadedDocument, detect_mime, file_hash, load_document, load_pdf_pages
+
+_DONE = object()
+
+
+@dataclass
+class ParseFailure:
+    path: Path
+    error: str
+
+
+@dataclass
+class _Part:
+    text: str
+    # Set when only one page range of a PDF was read.
+    total_pages: int | None = None
+    # Only computed by the task that reads the start of the file.
+    file_hash: str | None = None
+    unchanged: bool = False
+
+
+def _report_pid(pids: SimpleQueue) -> None:
+    # Worker initializer: the parent kills stuck workers by pid.
+    pids.put(os.getpid())
+
+
+def _parse(path: Path, start: int, pages_per_task: int, known_hash: str | None = None) -> _Part:
+    # Runs in a worker. Large PDFs come back with just their first page range plus the page count,
+    # and the parent fans the remaining ranges out to other workers.
+    digest = file_hash(path) if start == 0 else None
+    if digest is not None and digest == known_hash:
+        return _Part(text="", file_hash=digest, unchanged=True)
+    if pages_per_task > 0 and path.suffix.lower() == ".pdf":
+        text, total = load_pdf_pages(path, start, start + pages_per_task)
+        return _Part(text=text, total_pages=total, file_hash=digest)
+    return _Part(text=load_document(path).content, file_hash=digest)
+
+
+class DocumentParser:
+    def __init__(
+        self, workers: int = 0, timeout: float | None = None, pages_per_task: int = 0
+    ) -> None:
+        self.workers = max(0, workers)
+        # Only worker processes can be killed; an in-process parse that hangs would keep running
+        # after the timeout, so without workers there is none.
+        self.timeout = (timeout or None) if self.workers else None
+        # Splitting PDFs only pays off when the ranges can run on other cores.
+        self.pages_per_task = max(0, pages_per_task) if self.workers else 0
+
+    async def parse(
+        self,
+        paths: Iterable[Path],
+        known_hash: Callable[[Path], Awaitable[str | None]] | None = None,
+    ) -> AsyncIterator[LoadedDocument | ParseFailure]:
+        # Yields documents as they finish (not in input order); a failing file never stops the run.
+        # Files whose hash matches `await known_hash(path)` are not parsed and come back as
+        # `unchanged`.
+        loop = asyncio.get_running_loop()
+        pools: dict[ProcessPoolExecutor, SimpleQueue] = {}
+        executor = self._new_executor(pools)
+        # Tasks are only submitted when a worker is free, so the timeout measures parsing, not
+        # queueing.
+        limit = asyncio.Semaphore(max(1, self.workers))
+        results: asyncio.Queue = asyncio.Queue(maxsize=max(1, self.workers) * 2)
+
+        async def run(
+            path: Path, start: int, expected: str | None = None, retry: bool = True
+        ) -> _Part:
+            nonlocal executor
+            pool = executor
+            async with limit:
+                try:
+                    return await asyncio.wait_for(
+                        loop.run_in_executor(
+                            pool, _parse, path, start, self.pages_per_task, expected
+                        ),
+                        self.timeout,
+                    )
+                except TimeoutError:
+                    # The parse keeps running in its worker and the executor has no per-task kill:
+                    # move on to a fresh pool and kill the old one. Its other in-flight parses retry
+                    # on the new pool.
+                    if pool is not None and executor is pool:
+                        executor = self._new_executor(pools)
+                        self._kill(pool, pools[pool])
+                    raise
+                except BrokenProcessPool:
+                    # A worker died (e.g. on a malformed PDF) and took the pool down; retry once on
+                    # a fresh one.
+                    if not retry:
+                        raise
+                    if executor is pool:
+                        executor = self._new_executor(pools)
+            return await run(path, start, expected, retry=False)
+
+        async def parse_one(path: Path) -> None:
+            try:
+                first = await run(
+                    path, 0, await known_hash(path) if known_hash is not None else None
+                )
+                texts = [first.text]
+                if first.total_pages is not None and first.total_pages > self.pages_per_task:
+                    starts = range(self.pages_per_task, first.total_pages, self.pages_per_task)
+                    texts.extend(
+                        part.text
+                        for part in await asyncio.gather(*(run(path, start) for start in starts))
+                    )
+                item: LoadedDocument | ParseFailure = LoadedDocument(
+                    path=path,
+                    content="\n".join(texts),
+                    mime=detect_mime(path),
+                    metadata={},
+                    file_hash=first.file_hash,
+                    unchanged=first.unchanged,
+                )
+            except TimeoutError:
+                item = ParseFailure(path=path, error=f"timeout after {self.timeout}s")
+            except Exception as exc:
+                item = ParseFailure(path=path, error=f"{type(exc).__name__}: {exc}")
+            await results.put(item)
+
+        async def feed(pending: Iterator[Path]) -> None:
+            for path in pending:
+                await parse_one(path)
+
+        async def produce() -> None:
+            # A fixed set of feeders pulls paths lazily, so memory doesn't grow with the number of
+            # files.
+            pending = iter(paths)
+            try:
+                await asyncio.gather(*(feed(pending) for _ in range(max(1, self.workers))))
+            except Exception as exc:
+                # e.g. the directory walk failed; hand it to the consumer instead of leaving it
+                # waiting.
+                await results.put(exc)
+            else:
+                await results.put(_DONE)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while (item := await results.get()) is not _DONE:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            producer.cancel()
+            for pool, pids in pools.items():
+                pool.shutdown(wait=True, cancel_futures=True)
+                pids.close()
+
+    def _new_executor(
+        self, pools: dict[ProcessPoolExecutor, SimpleQueue]
+    ) -> ProcessPoolExecutor | None:
+        if not self.workers:
+            return None
+        # spawn: the ingest CLI may already hold model threads, which are not fork-safe.
+        context = multiprocessing.get_context("spawn")
+        pids = context.SimpleQueue()
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_report_pid,
+            initargs=(pids,),
+        )
+        pools[pool] = pids
+        return pool
+
+    @staticmethod
+    def _kill(pool: ProcessPoolExecutor, pids: SimpleQueue) -> None:
+        # Every worker that has run a task reported its pid. Pending futures fail with
+        # BrokenProcessPool once their workers are gone.
+        while not pids.empty():
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pids.get(), signal.SIGTERM)
+        pool.shutdown(wait=False)
@@ -2,56 +2,284 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import time
+from contextlib import aclosing
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List
+from typing import Iterable, List
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..config import DATA_DIR, get_settings
 from ..db import lifespan_session
-from ..models import RagChunk
+from ..logging_conf import get_logger
+from ..models import IngestManifest
 from ..rag.embeddings import get_default_embedding_provider
+from ..rag.packing import estimate_tokens
+from ..rag.hybrid import get_hybrid_retriever
 from ..rag.service import RAGService
 from ..rag.retriever import Retriever
 from ..rag.rerank import get_reranker
-from .loaders import load_from_directory
+from .batches import embed_in_batches
+from .loaders import iter_documents
+from .manifest import DocumentUpdate, ManifestLookup
+from .parsing import DocumentParser, ParseFailure
 from .splitter import ChunkSplitter
 
+logger = get_logger(__name__)
+_DONE = object()
+# Model batches' worth of chunk text gathered before it is sorted into length buckets.
+BUCKET_WINDOW = 4
+# Manifest entries removed per transaction when pruning files that are gone.
+PRUNE_BATCH_SIZE = 500
 
-async def ingest_directory(path: Path, repo: str, tag: str, version: str | None, acl: List[str]) -> None:
-    settings = get_settings()
-    embeddings = get_default_embedding_provider()
-    retriever = Retriever(settings)
-    reranker = get_reranker(settings) if settings.enable_rerank else None
-    service = RAGService(settings=settings, embeddings=embeddings, retriever=retriever, reranker=reranker)
 
-    docs = load_from_directory(path)
+@dataclass
+class StageStats:
+    name: str
+    unit: str
+    items: int = 0
+    busy: float = 0.0
+
+    def record(self, items: int, started: float) -> None:
+        self.items += items
+        self.busy += time.perf_counter() - started
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.busy if self.busy else 0.0
+
+
+@dataclass
+class IngestReport:
+    stages: List[StageStats]
+    failures: List[ParseFailure] = field(default_factory=list)
+    # Files skipped because their hash matched the manifest, chunks kept from the previous run,
+    # and chunks deleted because their file changed or disappeared.
+    unchanged: int = 0
+    reused: int = 0
+    removed: int = 0
+    elapsed: float = 0.0
+
+    def format(self) -> str:
+        lines = [f"{'stage':<8}{'items':>10} {'unit':<7}{'busy s':>10}{'items/s':>12}"]
+        for stage in self.stages:
+            lines.append(
+                f"{stage.name:<8}{stage.items:>10} {stage.unit:<7}"
+                f"{stage.busy:>10.2f}{stage.throughput:>12.1f}"
+            )
+        lines.append(
+            f"failed: {len(self.failures)}  unchanged: {self.unchanged}  reused: {self.reused}  "
+            f"removed: {self.removed}  elapsed: {self.elapsed:.2f}s"
+        )
+        return "\n".join(lines)
+
+
+async def ingest_paths(
+    service: RAGService,
+    session: AsyncSession,
+    paths: Iterable[Path],
+    parser: DocumentParser,
+    repo: str,
+    tag: str,
+    version: str | None,
+    acl: List[str],
+    prune_under: Path | None = None,
+) -> IngestReport:
+    # discover -> load -> split -> embed -> write, one task per stage joined by bounded queues:
+    # every stage works concurrently and a slow stage holds back the ones before it, so memory
+    # stays flat however large the corpus is.
+    # Re-runs are incremental: unchanged files are skipped, changed ones only embed new chunk text,
+    # and with `prune_under` files under that directory that are no longer listed are removed.
+    settings = service.settings
     splitter = ChunkSplitter()
-    async with lifespan_session() as session:
-        for doc in docs:
+    loop = asyncio.get_running_loop()
+    load, split, embed, write = (
+        StageStats("load", "docs"),
+        StageStats("split", "chunks"),
+        StageStats("embed", "chunks"),
+        StageStats("write", "rows"),
+    )
+    report = IngestReport(stages=[load, split, embed, write])
+    queue_size = max(1, settings.ingest_queue_size)
+    loaded: asyncio.Queue = asyncio.Queue(queue_size)
+    chunked: asyncio.Queue = asyncio.Queue(queue_size)
+    embedded: asyncio.Queue = asyncio.Queue(queue_size)
+    started_at = time.perf_counter()
+
+    async def load_stage(manifest: ManifestLookup) -> None:
+        async with aclosing(parser.parse(paths, manifest.known_hash)) as documents:
+            started = time.perf_counter()
+            async for doc in documents:
+                # Failed files still exist at the source, so they are not pruned either.
+                await manifest.seen(doc.path)
+                if isinstance(doc, ParseFailure):
+                    logger.warning("ingest_parse_failed", path=str(doc.path), error=doc.error)
+                    report.failures.append(doc)
+                    manifest.previous(doc.path)
+                elif doc.unchanged:
+                    report.unchanged += 1
+                    manifest.previous(doc.path)
+                else:
+                    load.record(1, started)
+                    await loaded.put(doc)
+                started = time.perf_counter()
+        await loaded.put(_DONE)
+
+    async def split_stage(manifest: ManifestLookup) -> None:
+        while (doc := await loaded.get()) is not _DONE:
+            started = time.perf_counter()
+            update = DocumentUpdate(
+                path=str(doc.path),
+                mime=doc.mime,
+                file_hash=doc.file_hash,
+                repo=repo,
+                tag=tag,
+                version=version,
+                acl=acl,
+            )
             metadata = {
-                "path": str(doc.path),
+                "path": update.path,
                 "mime": doc.mime,
                 "repo": repo,
                 "tag": tag,
                 "version": version,
                 "acl": acl,
             }
-            chunks = splitter.split(doc.content, metadata)
-            texts = [chunk.content for chunk in chunks]
-            embeddings_list = await embeddings.embed_documents(texts)
-            rag_chunks = [
-                RagChunk(
-                    content=chunk.content,
-                    path=metadata["path"],
-                    mime=metadata["mime"],
-                    repo=metadata["repo"],
-                    tag=metadata["tag"],
-                    version=metadata["version"],
-                    acl=acl,
-                    meta={**chunk.metadata, "source": metadata["path"]},
-                )
-                for chunk in chunks
+            update.add_chunks(
+                await loop.run_in_executor(None, splitter.split, doc.content, metadata)
+            )
+            split.record(len(update.chunks), started)
+            # Documents without any new chunk text still go through so the write stage drops stale
+            # rows.
+            await chunked.put((update, update.to_embed(manifest.previous(doc.path))))
+        await chunked.put(_DONE)
+
+    async def embed_stage() -> None:
+        # Only chunk text the file didn't already have is encoded. Chunks from several documents are
+        # pooled and sorted into length buckets so each model batch pads little; pending documents
+        # are flushed once the pool holds a few batches' worth of tokens or nothing else is waiting,
+        # so a slow loader never leaves the model idle on a partial batch.
+        token_budget = max(1, settings.ingest_embed_token_budget)
+        pending: List[tuple[DocumentUpdate, List[int]]] = []
+        waiting = 0
+        finished = False
+        while pending or not finished:
+            if not finished and (
+                not pending or (waiting < token_budget * BUCKET_WINDOW and not chunked.empty())
+            ):
+                item = await chunked.get()
+                if item is _DONE:
+                    finished = True
+                else:
+                    update, positions = item
+                    pending.append(item)
+                    waiting += sum(
+                        estimate_tokens(update.chunks[position].content) for position in positions
+                    )
+                continue
+            targets = [
+                (update, position) for update, positions in pending for position in positions
             ]
-            await service.ingest_chunks(session, list(zip(rag_chunks, embeddings_list)))
+            if targets:
+                started = time.perf_counter()
+                vectors = await embed_in_batches(
+                    service.embeddings,
+                    [update.chunks[position].content for update, position in targets],
+                    token_budget,
+                    settings.ingest_embed_batch_size,
+                )
+                for (update, position), vector in zip(targets, vectors, strict=True):
+                    update.embeddings[position] = vector
+                embed.record(len(targets), started)
+            for update, _ in pending:
+                await embedded.put(update)
+            pending, waiting = [], 0
+        await embedded.put(_DONE)
+
+    async def write_stage() -> None:
+        # Documents are committed in groups of about INGEST_WRITE_BATCH_ROWS rows per transaction,
+        # flushed early when nothing else is waiting, same as the embed stage.
+        batch_rows = max(1, settings.ingest_write_batch_rows)
+        pending: List[DocumentUpdate] = []
+        rows = 0
+        finished = False
+        while pending or not finished:
+            if not finished and (not pending or (rows < batch_rows and not embedded.empty())):
+                item = await embedded.get()
+                if item is _DONE:
+                    finished = True
+                else:
+                    pending.append(item)
+                    rows += len(item.chunks)
+                continue
+            started = time.perf_counter()
+            result = await service.sync_documents(session, pending)
+            write.record(result.added, started)
+            report.reused += result.reused
+            report.removed += result.removed
+            pending, rows = [], 0
+
+    async with ManifestLookup(session.bind, repo, tag, version, acl) as manifest:
+        async with asyncio.TaskGroup() as group:
+            group.create_task(load_stage(manifest))
+            group.create_task(split_stage(manifest))
+            group.create_task(embed_stage())
+            group.create_task(write_stage())
+        if prune_under is not None:
+            pruned = 0
+            while ids := await manifest.unseen(prune_under, PRUNE_BATCH_SIZE):
+                gone = (
+                    await session.execute(select(IngestManifest).where(IngestManifest.id.in_(ids)))
+                ).scalars()
+                report.removed += await service.remove_documents(session, gone.all())
+                pruned += len(ids)
+            if pruned:
+                logger.info("ingest_pruned", files=pruned)
+    report.elapsed = time.perf_counter() - started_at
+    return report
+
+
+async def ingest_directory(
+    path: Path,
+    repo: str,
+    tag: str,
+    version: str | None,
+    acl: List[str],
+    workers: int | None = None,
+) -> IngestReport:
+    settings = get_settings()
+    embeddings = get_default_embedding_provider()
+    retriever = Retriever(settings)
+    reranker = get_reranker(settings) if settings.enable_rerank else None
+    service = RAGService(
+        settings=settings,
+        embeddings=embeddings,
+        retriever=retriever,
+        reranker=reranker,
+        hybrid=get_hybrid_retriever(settings, retriever),
+    )
+    parser = DocumentParser(
+        workers=settings.ingest_workers if workers is None else workers,
+        timeout=settings.ingest_parse_timeout,
+        pages_per_task=settings.ingest_pdf_pages_per_task,
+    )
+    try:
+        async with lifespan_session() as session:
+            return await ingest_paths(
+                service,
+                session,
+                iter_documents(path),
+                parser,
+                repo,
+                tag,
+                version,
+                acl,
+                prune_under=path,
+            )
+    finally:
+        await service.close()
 
 
 def parse_args() -> argparse.Namespace:
@@ -61,6 +289,9 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--tag", type=str, required=True)
     parser.add_argument("--version", type=str, default=None)
     parser.add_argument("--acl", type=str, default="public")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Parser processes (default: INGEST_WORKERS)"
+    )
     return parser.parse_args()
 
 
@@ -68,7 +299,10 @@ def main() -> None:
     args = parse_args()
     path = Path(args.path)
     acl = [scope.strip() for scope in args.acl.split(",") if scope.strip()]
-    asyncio.run(ingest_directory(path, args.repo, args.tag, args.version, acl))
+    report = asyncio.run(
+        ingest_directory(path, args.repo, args.tag, args.version, acl, workers=args.workers)
+    )
+    print(report.format())
 
 
 if __name__ == "__main__":
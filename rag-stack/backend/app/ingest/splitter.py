@@ -21,6 +21,9 @@ class ChunkSplitter:
             chunk_size=chunk_size,
             chunk_overlap=overlap,
             separators=["\n\n", "\n", " ", ""],
+            # Stored in chunk meta so the prompt packer can stitch neighbouring chunks back
+            # together.
+            add_start_index=True,
         )
 
     def split(self, text: str, metadata: dict | None = None) -> List[TextChunk]:
@@ -3,13 +3,16 @@ from __future__ import annotations
 import asyncio
 import time
 from collections import defaultdict
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
 from .config import get_settings
+from .deps import close_rag_service, start_background_indexing
 from .logging_conf import setup_logging
+from .rag.clients import close_http_clients
 from .routes import api_router
 
 
@@ -43,10 +46,18 @@ class RateLimiterMiddleware:
         await self.app(scope, receive, send)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_background_indexing()
+    yield
+    await close_rag_service()
+    await close_http_clients()
+
+
 def create_app() -> FastAPI:
     settings = get_settings()
     setup_logging()
-    app = FastAPI(title="rag-stack", version="0.1.0")
+    app = FastAPI(title="rag-stack", version="0.1.0", lifespan=lifespan)
     app.include_router(api_router)
 
     app.add_middleware(
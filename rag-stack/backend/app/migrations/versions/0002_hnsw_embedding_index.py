@@ -0,0 +1,41 @@
+"""switch embedding index to hnsw
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2024-06-01 00:00:00
+
+"""
+from __future__ import annotations
+
+from alembic import op
+
+from app.config import get_settings
+
+# revision identifiers, used by Alembic.
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    settings = get_settings()
+    # CONCURRENTLY keeps the table writable while the graph is built; it cannot run in a
+    # transaction.
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_chunks_embedding")
+        op.execute(
+            "CREATE INDEX CONCURRENTLY idx_chunks_embedding ON rag_chunks "
+            "USING hnsw (embedding vector_cosine_ops) "
+            f"WITH (m = {int(settings.hnsw_m)}, "
+            f"ef_construction = {int(settings.hnsw_ef_construction)})"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_chunks_embedding")
+        op.execute(
+            "CREATE INDEX CONCURRENTLY idx_chunks_embedding ON rag_chunks "
+            "USING ivfflat (embedding vector_cosine_ops)"
+        )
@@ -0,0 +1,61 @@
+"""quantized embedding indexes
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2024-07-01 00:00:00
+
+"""
+from __future__ import annotations
+
+from alembic import op
+
+from app.config import get_settings
+from app.models import EMBEDDING_DIM
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+QUANTIZED_INDEXES = {
+    "halfvec": (
+        "idx_chunks_embedding_halfvec",
+        f"(embedding::halfvec({EMBEDDING_DIM})) halfvec_cosine_ops",
+    ),
+    "binary": (
+        "idx_chunks_embedding_bit",
+        f"(binary_quantize(embedding)::bit({EMBEDDING_DIM})) bit_hamming_ops",
+    ),
+}
+
+
+def upgrade() -> None:
+    settings = get_settings()
+    mode = settings.pgvector_quantization.lower()
+    if mode not in QUANTIZED_INDEXES:
+        return
+    name, expression = QUANTIZED_INDEXES[mode]
+    # The quantized index replaces the float32 one: the coarse search walks the quantized graph and
+    # the rescore reads the full-precision column by id, so nothing scans idx_chunks_embedding.
+    with op.get_context().autocommit_block():
+        op.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON rag_chunks "
+            f"USING hnsw ({expression}) "
+            f"WITH (m = {int(settings.hnsw_m)}, "
+            f"ef_construction = {int(settings.hnsw_ef_construction)})"
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_chunks_embedding")
+
+
+def downgrade() -> None:
+    settings = get_settings()
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_embedding ON rag_chunks "
+            "USING hnsw (embedding vector_cosine_ops) "
+            f"WITH (m = {int(settings.hnsw_m)}, "
+            f"ef_construction = {int(settings.hnsw_ef_construction)})"
+        )
+        for name, _ in QUANTIZED_INDEXES.values():
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
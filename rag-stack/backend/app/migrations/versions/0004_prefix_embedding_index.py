@@ -0,0 +1,45 @@
+"""truncated prefix embedding index
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2024-07-15 00:00:00
+
+"""
+from __future__ import annotations
+
+from alembic import op
+
+from app.config import get_settings
+from app.models import PREFIX_INDEX_DIMS
+
+# revision identifiers, used by Alembic.
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+PREFIX_INDEX = "idx_chunks_embedding_prefix{dims}"
+
+
+def upgrade() -> None:
+    settings = get_settings()
+    dims = settings.coarse_dims
+    # Only built when coarse-to-fine search on pgvector is enabled at migrate time, and only for the
+    # configured length. The first components are indexed; candidates are rescored against the
+    # full column.
+    if not dims or settings.vector_backend.lower() == "faiss":
+        return
+    with op.get_context().autocommit_block():
+        op.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {PREFIX_INDEX.format(dims=int(dims))} "
+            f"ON rag_chunks USING hnsw "
+            f"((subvector(embedding, 1, {int(dims)})::vector({int(dims)})) vector_cosine_ops) "
+            f"WITH (m = {int(settings.hnsw_m)}, "
+            f"ef_construction = {int(settings.hnsw_ef_construction)})"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for dims in PREFIX_INDEX_DIMS:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {PREFIX_INDEX.format(dims=dims)}")
@@ -0,0 +1,50 @@
+"""ingest manifest table
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2024-08-05 00:00:00
+
+"""
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ingest_manifest",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("path", sa.Text(), nullable=False),
+        sa.Column("repo", sa.Text(), nullable=True),
+        sa.Column("tag", sa.Text(), nullable=True),
+        sa.Column("version", sa.Text(), nullable=True),
+        sa.Column("file_hash", sa.Text(), nullable=False),
+        sa.Column("acl", sa.JSON(), nullable=True),
+        sa.Column("chunks", sa.JSON(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    )
+    # One entry per file and scope; NULL scope fields compare equal, matching the coalesce()
+    # lookups.
+    op.execute(
+        "CREATE UNIQUE INDEX idx_manifest_scope_path ON ingest_manifest "
+        "(coalesce(repo, ''), coalesce(tag, ''), coalesce(version, ''), path)"
+    )
+    # The corpus generation behind the answer cache reads max(updated_at) on every cached lookup.
+    op.create_index("idx_manifest_updated_at", "ingest_manifest", ["updated_at"])
+    # Legacy rows (ingested before the manifest existed) are found by path when a file is first
+    # synced.
+    op.create_index("idx_chunks_path", "rag_chunks", ["path"])
+
+
+def downgrade() -> None:
+    op.drop_index("idx_chunks_path", table_name="rag_chunks")
+    op.drop_index("idx_manifest_updated_at", table_name="ingest_manifest")
+    op.execute("DROP INDEX IF EXISTS idx_manifest_scope_path")
+    op.drop_table("ingest_manifest")
@@ -26,6 +26,11 @@ except Exception:  # pragma: no cover
             return value
 
 
+EMBEDDING_DIM = 1024
+# Prefix lengths with an HNSW expression index on pgvector (migration 0004).
+PREFIX_INDEX_DIMS = (128, 256)
+
+
 class Base(DeclarativeBase):
     pass
 
@@ -33,7 +38,7 @@ class Base(DeclarativeBase):
 try:
     from sqlalchemy.dialects.postgresql import ARRAY as PG_ARRAY  # type: ignore
 
-    ACLType = PG_ARRAY(String)  # type: ignore
+    ACLType = JSON().with_variant(PG_ARRAY(String), "postgresql")  # type: ignore
 except Exception:  # pragma: no cover
     ACLType = JSON
 
@@ -43,7 +48,7 @@ class RagChunk(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     content: Mapped[str] = mapped_column(Text, nullable=False)
-    embedding: Mapped[Sequence[float] | None] = mapped_column(Vector(1024), nullable=True)
+    embedding: Mapped[Sequence[float] | None] = mapped_column(Vector(EMBEDDING_DIM), nullable=True)
     path: Mapped[str | None] = mapped_column(String, nullable=True)
     mime: Mapped[str | None] = mapped_column(String, nullable=True)
     repo: Mapped[str | None] = mapped_column(String, nullable=True)
@@ -53,3 +58,20 @@ class RagChunk(Base):
     meta: Mapped[dict | None] = mapped_column(JSON, nullable=True)
     updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
 
+
+
+class IngestManifest(Base):
+    # What was last ingested for a file in a repo/tag/version scope, so re-runs only touch what
+    # changed.
+    __tablename__ = "ingest_manifest"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    path: Mapped[str] = mapped_column(String, nullable=False)
+    repo: Mapped[str | None] = mapped_column(String, nullable=True)
+    tag: Mapped[str | None] = mapped_column(String, nullable=True)
+    version: Mapped[str | None] = mapped_column(String, nullable=True)
+    file_hash: Mapped[str] = mapped_column(String, nullable=False)
+    acl: Mapped[list[str] | None] = mapped_column(JSON, nullable=True)
+    # [chunk_hash, chunk_id, start_index] per chunk, in document order.
+    chunks: Mapped[list] = mapped_column(JSON, nullable=False, default=list)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List
+
+from .metrics import Histogram
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_WAIT_MS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 250)
+
+
+@dataclass
+class _Pending:
+    texts: List[str]
+    future: asyncio.Future
+    enqueued_at: float = 0.0
+
+
+class MicroBatcher:
+    # Coalesces small encode calls that arrive within `max_wait_ms` into one model call.
+    def __init__(
+        self,
+        encode: Callable[[List[str]], Awaitable[List[List[float]]]],
+        max_batch_size: int,
+        max_wait_ms: float,
+    ) -> None:
+        self.encode = encode
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_MS_BUCKETS)
+        self._queue: asyncio.Queue[_Pending] | None = None
+        self._worker: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def submit(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        if len(texts) >= self.max_batch_size:
+            # Already a full batch (e.g. ingestion); queueing would only add latency.
+            self.batch_sizes.observe(len(texts))
+            return await self.encode(texts)
+        loop = asyncio.get_running_loop()
+        self._ensure_worker(loop)
+        pending = _Pending(texts=list(texts), future=loop.create_future(), enqueued_at=loop.time())
+        await self._queue.put(pending)
+        return await pending.future
+
+    def stats(self) -> dict:
+        return {
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+        }
+
+    def _ensure_worker(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._worker is not None and not self._worker.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._worker = loop.create_task(self._run(self._queue))
+
+    async def _run(self, queue: asyncio.Queue[_Pending]) -> None:
+        loop = asyncio.get_running_loop()
+        carry: _Pending | None = None
+        while True:
+            first = carry or await queue.get()
+            carry = None
+            batch = [first]
+            size = len(first.texts)
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except TimeoutError:
+                    break
+                if size + len(item.texts) > self.max_batch_size:
+                    carry = item
+                    break
+                batch.append(item)
+                size += len(item.texts)
+            await self._flush(batch, loop.time())
+
+    async def _flush(self, batch: List[_Pending], started_at: float) -> None:
+        batch = [item for item in batch if not item.future.cancelled()]
+        if not batch:
+            return
+        texts = [text for item in batch for text in item.texts]
+        self.batch_sizes.observe(len(texts))
+        for item in batch:
+            self.queue_wait_ms.observe((started_at - item.enqueued_at) * 1000)
+        try:
+            vectors = await self.encode(texts)
+        except Exception as exc:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(exc)
+            return
+        offset = 0
+        for item in batch:
+            end = offset + len(item.texts)
+            if not item.future.done():
+                item.future.set_result(vectors[offset:end])
+            offset = end
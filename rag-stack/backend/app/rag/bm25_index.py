@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import heapq
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Iterable, List
+
+import numpy as np
+import orjson
+
+from ..config import INDEX_DIR
+from .filelock import FileLock
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+DEFAULT_K1 = 1.5
+DEFAULT_B = 0.75
+# The log is folded into a new snapshot once it grows past this share of the snapshot's size.
+LOG_COMPACT_RATIO = 0.5
+
+
+def tokenize(text: str) -> List[str]:
+    normalized = unicodedata.normalize("NFKD", text.lower())
+    stripped = "".join(ch for ch in normalized if not unicodedata.combining(ch))
+    return TOKEN_RE.findall(stripped)
+
+
+class BM25Index:
+    def __init__(
+        self, index_dir: Path | None = None, k1: float = DEFAULT_K1, b: float = DEFAULT_B
+    ) -> None:
+        self.path = (index_dir or INDEX_DIR) / "bm25.json"
+        # Writes append their changes to the log; the snapshot is only rewritten on compaction.
+        self.log_path = self.path.with_suffix(".log")
+        self.lock_path = self.path.with_suffix(".lock")
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, dict[int, int]] = defaultdict(dict)
+        self._doc_lengths: dict[int, int] = {}
+        self._doc_terms: dict[int, tuple[str, ...]] = {}
+        self._total_length = 0
+        # Log records for changes made since the last save.
+        self._pending: list[bytes] = []
+        self._needs_snapshot = False
+        self._loaded_mtime: float | None = None
+        self._log_offset = 0
+        self._ready = False
+        self._lock = threading.RLock()
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self._doc_lengths
+
+    def writer_lock(self) -> FileLock:
+        return FileLock(self.lock_path)
+
+    def reader_lock(self) -> FileLock:
+        return FileLock(self.lock_path, shared=True)
+
+    def load(self) -> bool:
+        with self._lock:
+            if not self.path.exists():
+                return False
+            mtime = self.path.stat().st_mtime
+            if self._ready and self._loaded_mtime == mtime:
+                self._replay_log()
+                return True
+            payload = orjson.loads(self.path.read_bytes())
+            self._clear()
+            for term, entries in payload["postings"].items():
+                postings = self._postings[term]
+                for doc_id, tf in entries:
+                    postings[doc_id] = tf
+            self._doc_lengths = {
+                int(doc_id): length for doc_id, length in payload["doc_lengths"].items()
+            }
+            self._total_length = sum(self._doc_lengths.values())
+            doc_terms: dict[int, list[str]] = defaultdict(list)
+            for term, postings in self._postings.items():
+                for doc_id in postings:
+                    doc_terms[doc_id].append(term)
+            self._doc_terms = {doc_id: tuple(terms) for doc_id, terms in doc_terms.items()}
+            self._loaded_mtime = mtime
+            self._log_offset = 0
+            self._replay_log()
+            self._ready = True
+            return True
+
+    def refresh(self) -> None:
+        # Picks up changes other processes (e.g. the ingest CLI) saved: a new snapshot is reloaded,
+        # new log records are applied on top of the loaded state.
+        if self.path.exists():
+            self.load()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._clear()
+            self._needs_snapshot = True
+            self._ready = True
+
+    def add(self, documents: Iterable[tuple[int, str]]) -> None:
+        with self._lock:
+            added = []
+            for doc_id, text in documents:
+                counts = Counter(tokenize(text))
+                self._add(doc_id, counts)
+                added.append((doc_id, counts))
+            if added and not self._needs_snapshot:
+                self._pending.append(orjson.dumps({"add": added}))
+            self._ready = True
+
+    def remove(self, doc_ids: Iterable[int]) -> None:
+        with self._lock:
+            removed = [doc_id for doc_id in doc_ids if doc_id in self._doc_lengths]
+            for doc_id in removed:
+                self._remove(doc_id)
+            if removed and not self._needs_snapshot:
+                self._pending.append(orjson.dumps({"remove": removed}))
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        candidates: np.ndarray | None = None,
+    ) -> List[tuple[int, float]]:
+        terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self._doc_lengths)
+            if not terms or n_docs == 0 or k <= 0:
+                return []
+            allowed = set(candidates.tolist()) if candidates is not None else None
+            avg_length = self._total_length / n_docs
+            scores: dict[int, float] = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tf in postings.items():
+                    if allowed is not None and doc_id not in allowed:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def save(self) -> None:
+        # Writers hold `lock_path` and call refresh() before changing the index, so appends from
+        # several processes land in order and none is lost.
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            log_size = self.log_path.stat().st_size if self.log_path.exists() else 0
+            log_size += sum(len(record) + 1 for record in self._pending)
+            if (
+                self._needs_snapshot
+                or not self.path.exists()
+                or log_size > LOG_COMPACT_RATIO * self.path.stat().st_size
+            ):
+                self._write_snapshot()
+            elif self._pending:
+                with open(self.log_path, "ab") as handle:
+                    handle.write(b"".join(record + b"\n" for record in self._pending))
+                self._log_offset = self.log_path.stat().st_size
+            self._pending = []
+
+    def _write_snapshot(self) -> None:
+        payload = {
+            "postings": {term: list(postings.items()) for term, postings in self._postings.items()},
+            "doc_lengths": {str(doc_id): length for doc_id, length in self._doc_lengths.items()},
+        }
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(orjson.dumps(payload))
+        os.replace(tmp_path, self.path)
+        # A reader that still pairs the new snapshot with the old log replays changes the snapshot
+        # already holds; adds and removes are idempotent, so it ends in the same state.
+        self.log_path.unlink(missing_ok=True)
+        self._loaded_mtime = self.path.stat().st_mtime
+        self._log_offset = 0
+        self._needs_snapshot = False
+
+    def _replay_log(self) -> None:
+        size = self.log_path.stat().st_size if self.log_path.exists() else 0
+        if size <= self._log_offset:
+            return
+        with open(self.log_path, "rb") as handle:
+            handle.seek(self._log_offset)
+            data = handle.read()
+        # A record still being appended by another process has no newline yet.
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            record = orjson.loads(line)
+            for doc_id in record.get("remove", ()):
+                self._remove(doc_id)
+            for doc_id, counts in record.get("add", ()):
+                self._add(doc_id, counts)
+        self._log_offset += end
+
+    def _add(self, doc_id: int, counts: dict[str, int]) -> None:
+        if doc_id in self._doc_lengths:
+            self._remove(doc_id)
+        for term, tf in counts.items():
+            self._postings[term][doc_id] = tf
+        length = sum(counts.values())
+        self._doc_lengths[doc_id] = length
+        self._doc_terms[doc_id] = tuple(counts)
+        self._total_length += length
+
+    def _remove(self, doc_id: int) -> None:
+        for term in self._doc_terms.pop(doc_id, ()):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(doc_id, 0)
+
+    def _clear(self) -> None:
+        self._pending = []
+        self._postings = defaultdict(dict)
+        self._doc_lengths = {}
+        self._doc_terms = {}
+        self._total_length = 0
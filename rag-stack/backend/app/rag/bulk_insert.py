@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import struct
+from datetime import datetime
+from typing import Sequence
+
+import numpy as np
+import orjson
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from ..models import RagChunk
+
+# `id` is drawn from the sequence before the COPY so the written rows can be matched back to their
+# chunks.
+COPY_COLUMNS = (
+    "id",
+    "content",
+    "embedding",
+    "path",
+    "mime",
+    "repo",
+    "tag",
+    "version",
+    "acl",
+    "meta",
+    "updated_at",
+)
+# Binary COPY field types. Vector and JSON fields are sent pre-encoded as raw bytes; the server
+# decodes them with the column's own receive function.
+COPY_TYPES = [
+    "int8",
+    "text",
+    "bytea",
+    "text",
+    "text",
+    "text",
+    "text",
+    "text",
+    "text[]",
+    "bytea",
+    "timestamp",
+]
+INSERT_COLUMNS = [column.name for column in RagChunk.__table__.columns if column.name != "id"]
+
+
+def encode_vector(values: Sequence[float]) -> bytes:
+    # pgvector's binary format: dimension and an unused flag as int16, then big-endian float32
+    # values.
+    array = np.asarray(values, dtype=">f4")
+    return struct.pack(">HH", len(array), 0) + array.tobytes()
+
+
+async def insert_chunks(session: AsyncSession, chunks: Sequence[RagChunk]) -> None:
+    # Writes new rows around the ORM unit of work and sets `chunk.id` on each. Runs inside the
+    # session's transaction; the caller commits.
+    if not chunks:
+        return
+    now = datetime.utcnow()
+    for chunk in chunks:
+        chunk.updated_at = chunk.updated_at or now
+    connection = await session.connection()
+    if connection.dialect.name == "postgresql" and connection.dialect.driver == "psycopg":
+        ids = await _copy(connection, chunks)
+    else:
+        ids = await _insert_many(session, chunks)
+    for chunk, chunk_id in zip(chunks, ids, strict=True):
+        chunk.id = chunk_id
+
+
+async def _copy(connection: AsyncConnection, chunks: Sequence[RagChunk]) -> list[int]:
+    raw = await connection.get_raw_connection()
+    async with raw.driver_connection.cursor() as cursor:
+        await cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence('rag_chunks', 'id')) "
+            "FROM generate_series(1, %s)",
+            (len(chunks),),
+        )
+        ids = [row[0] for row in await cursor.fetchall()]
+        statement = f"COPY rag_chunks ({', '.join(COPY_COLUMNS)}) FROM STDIN (FORMAT BINARY)"
+        async with cursor.copy(statement) as copy:
+            copy.set_types(COPY_TYPES)
+            for chunk_id, chunk in zip(ids, chunks, strict=True):
+                await copy.write_row(
+                    (
+                        chunk_id,
+                        chunk.content,
+                        encode_vector(chunk.embedding) if chunk.embedding is not None else None,
+                        chunk.path,
+                        chunk.mime,
+                        chunk.repo,
+                        chunk.tag,
+                        chunk.version,
+                        chunk.acl,
+                        orjson.dumps(chunk.meta) if chunk.meta is not None else None,
+                        chunk.updated_at,
+                    )
+                )
+    return ids
+
+
+async def _insert_many(session: AsyncSession, chunks: Sequence[RagChunk]) -> list[int]:
+    # One executemany-style INSERT batch; RETURNING in parameter order gives the ids back per chunk.
+    stmt = insert(RagChunk).returning(RagChunk.id, sort_by_parameter_order=True)
+    rows = [{name: getattr(chunk, name) for name in INSERT_COLUMNS} for chunk in chunks]
+    return list((await session.execute(stmt, rows)).scalars())
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Generic, Hashable, Sequence, TypeVar
+
+import numpy as np
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    def __init__(self, maxsize: int, ttl: float | None = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: K, value: V) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: K) -> V | None:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[1] if entry else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+
+@dataclass
+class _Entry(Generic[V]):
+    scope: Hashable
+    vector: np.ndarray
+    value: V
+    stored_at: float
+
+
+class SemanticCache(Generic[V]):
+    # Nearest-neighbour lookup: hits when a stored query in the same scope is similar enough.
+
+    def __init__(self, maxsize: int, threshold: float, ttl: float | None = None) -> None:
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[int, _Entry[V]] = OrderedDict()
+        self._scopes: dict[Hashable, dict[int, None]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, scope: Hashable, embedding: Sequence[float]) -> tuple[V, float] | None:
+        query = self._normalize(embedding)
+        with self._lock:
+            entry_ids = list(self._scopes.get(scope, ()))
+            if self.ttl is not None:
+                now = time.monotonic()
+                for entry_id in [
+                    i for i in entry_ids if now - self._entries[i].stored_at > self.ttl
+                ]:
+                    self._discard(entry_id)
+                entry_ids = list(self._scopes.get(scope, ()))
+            if not entry_ids:
+                self.misses += 1
+                return None
+            matrix = np.stack([self._entries[i].vector for i in entry_ids])
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            entry_id = entry_ids[best]
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return self._entries[entry_id].value, float(similarities[best])
+
+    def put(self, scope: Hashable, embedding: Sequence[float], value: V) -> None:
+        if self.maxsize <= 0:
+            return
+        vector = self._normalize(embedding)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(
+                scope=scope, vector=vector, value=value, stored_at=time.monotonic()
+            )
+            self._scopes.setdefault(scope, {})[entry_id] = None
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def _discard(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        members = self._scopes.get(entry.scope)
+        if members is not None:
+            members.pop(entry_id, None)
+            if not members:
+                del self._scopes[entry.scope]
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+
+class DiskCache:
+    # Small sqlite key/value store so warm entries survive restarts; shared by all workers on the
+    # host. Writes evict expired entries, then the oldest ones beyond `max_entries` (0 keeps
+    # everything).
+    def __init__(self, path: Path, ttl: float | None = None, max_entries: int = 0) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max(0, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), timeout=5.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(key TEXT PRIMARY KEY, value BLOB NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_stored_at ON entries (stored_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl is not None and time.time() - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: bytes) -> None:
+        with self._lock:
+            now = time.time()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, value, now),
+            )
+            if self.ttl is not None:
+                self._conn.execute("DELETE FROM entries WHERE stored_at < ?", (now - self.ttl,))
+            if self.max_entries:
+                excess = (
+                    self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                    - self.max_entries
+                )
+                if excess > 0:
+                    self._conn.execute(
+                        "DELETE FROM entries WHERE key IN "
+                        "(SELECT key FROM entries ORDER BY stored_at LIMIT ?)",
+                        (excess,),
+                    )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "size": size}
@@ -2,13 +2,21 @@ from __future__ import annotations
 
 import asyncio
 from dataclasses import dataclass
-from typing import Any, Dict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, TypeVar
 
-from anthropic import Anthropic
-from openai import OpenAI
+import anthropic
+import openai
+from anthropic import AsyncAnthropic
+from openai import AsyncOpenAI
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
 
 from ..config import Settings, get_settings
 
+T = TypeVar("T")
+RETRYABLE_STATUS = {408, 409, 429}
+
+_http_clients: dict[str, Any] = {}
+
 
 @dataclass
 class CompletionMessage:
@@ -16,24 +24,93 @@ class CompletionMessage:
     usage: Dict[str, Any]
 
 
-class ClaudeClient:
+@dataclass
+class StreamChunk:
+    text: str = ""
+    usage: Dict[str, Any] | None = None
+
+
+def _timeout(sdk: Any, settings: Settings) -> Any:
+    return sdk.Timeout(settings.llm_timeout, connect=settings.llm_connect_timeout)
+
+
+def get_http_client(sdk: Any, settings: Settings | None = None) -> Any:
+    # One keep-alive pool per provider, reused by every request so TLS connections stay warm. Each
+    # SDK pins its own HTTP stack, so the pool is built from the SDK's exports instead of importing
+    # httpx.
+    client = _http_clients.get(sdk.__name__)
+    if client is None or client.is_closed:
+        settings = settings or get_settings()
+        limits = type(sdk.DEFAULT_CONNECTION_LIMITS)(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_keepalive_connections,
+        )
+        client = sdk.DefaultAsyncHttpxClient(limits=limits, timeout=_timeout(sdk, settings))
+        _http_clients[sdk.__name__] = client
+    return client
+
+
+async def close_http_clients() -> None:
+    clients = list(_http_clients.values())
+    _http_clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (anthropic.APIConnectionError, openai.APIConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    return status is not None and (status in RETRYABLE_STATUS or status >= 500)
+
+
+class _AsyncLLMClient:
     def __init__(self, settings: Settings) -> None:
         self.settings = settings
+        self._limit = asyncio.Semaphore(max(1, settings.llm_max_concurrency))
+
+    async def _request(self, send: Callable[[], Awaitable[T]]) -> T:
+        # SDK retries are disabled; retry here with jittered backoff so concurrent callers don't
+        # retry in lockstep.
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(max(1, self.settings.llm_retry_attempts)),
+            wait=wait_random_exponential(
+                multiplier=self.settings.llm_retry_backoff, max=self.settings.llm_retry_max_backoff
+            ),
+            retry=retry_if_exception(_is_retryable),
+            reraise=True,
+        )
+        async for attempt in retrying:
+            with attempt:
+                result = await send()
+        return result
+
+
+class ClaudeClient(_AsyncLLMClient):
+    def __init__(self, settings: Settings) -> None:
+        super().__init__(settings)
         if not settings.anthropic_api_key:
             raise ValueError("ANTHROPIC_API_KEY no está configurada")
-        self._client = Anthropic(api_key=settings.anthropic_api_key)
-
-    async def complete(self, prompt: str) -> CompletionMessage:
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None,
-            lambda: self._client.messages.create(
-                model=self.settings.claude_model,
-                max_tokens=self.settings.max_tokens,
-                temperature=self.settings.temperature,
-                messages=[{"role": "user", "content": prompt}],
-            ),
+        self._client = AsyncAnthropic(
+            api_key=settings.anthropic_api_key,
+            http_client=get_http_client(anthropic, settings),
+            timeout=_timeout(anthropic, settings),
+            max_retries=0,
         )
+
+    def _params(self, prompt: str, max_tokens: int | None) -> dict:
+        return {
+            "model": self.settings.claude_model,
+            "max_tokens": max_tokens or self.settings.max_tokens,
+            "temperature": self.settings.temperature,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+
+    async def complete(self, prompt: str, max_tokens: int | None = None) -> CompletionMessage:
+        async with self._limit:
+            response = await self._request(
+                lambda: self._client.messages.create(**self._params(prompt, max_tokens))
+            )
         text = "".join(getattr(block, "text", "") for block in response.content)
         usage = {
             "input_tokens": getattr(response.usage, "input_tokens", None),
@@ -41,29 +118,60 @@ class ClaudeClient:
         }
         return CompletionMessage(text=text, usage=usage)
 
+    async def stream(
+        self, prompt: str, max_tokens: int | None = None
+    ) -> AsyncIterator[StreamChunk]:
+        usage: Dict[str, Any] = {"input_tokens": None, "output_tokens": None}
+        async with self._limit:
+            # Only opening the stream is retried; once tokens have been sent a retry would duplicate
+            # them.
+            stream = await self._request(
+                lambda: self._client.messages.create(
+                    **self._params(prompt, max_tokens), stream=True
+                )
+            )
+            try:
+                async for event in stream:
+                    if event.type == "message_start":
+                        usage["input_tokens"] = getattr(event.message.usage, "input_tokens", None)
+                    elif event.type == "content_block_delta" and event.delta.type == "text_delta":
+                        yield StreamChunk(text=event.delta.text)
+                    elif event.type == "message_delta":
+                        usage["output_tokens"] = getattr(event.usage, "output_tokens", None)
+            finally:
+                await stream.close()
+        yield StreamChunk(usage=usage)
+
 
 def get_claude_client(settings: Settings | None = None) -> ClaudeClient:
     return ClaudeClient(settings or get_settings())
 
 
-class OpenAIClient:
+class OpenAIClient(_AsyncLLMClient):
     def __init__(self, settings: Settings) -> None:
         if not settings.openai_api_key:
             raise ValueError("OPENAI_API_KEY no está configurada")
-        self.settings = settings
-        self._client = OpenAI(api_key=settings.openai_api_key)
-
-    async def complete(self, prompt: str) -> CompletionMessage:
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None,
-            lambda: self._client.chat.completions.create(
-                model=self.settings.openai_model,
-                max_tokens=self.settings.max_tokens,
-                temperature=self.settings.temperature,
-                messages=[{"role": "user", "content": prompt}],
-            ),
+        super().__init__(settings)
+        self._client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            http_client=get_http_client(openai, settings),
+            timeout=_timeout(openai, settings),
+            max_retries=0,
         )
+
+    def _params(self, prompt: str, max_tokens: int | None) -> dict:
+        return {
+            "model": self.settings.openai_model,
+            "max_tokens": max_tokens or self.settings.max_tokens,
+            "temperature": self.settings.temperature,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+
+    async def complete(self, prompt: str, max_tokens: int | None = None) -> CompletionMessage:
+        async with self._limit:
+            response = await self._request(
+                lambda: self._client.chat.completions.create(**self._params(prompt, max_tokens))
+            )
         message = response.choices[0].message
         text = getattr(message, "content", "") if message else ""
         usage = {
@@ -72,6 +180,31 @@ class OpenAIClient:
         }
         return CompletionMessage(text=text, usage=usage)
 
+    async def stream(
+        self, prompt: str, max_tokens: int | None = None
+    ) -> AsyncIterator[StreamChunk]:
+        async with self._limit:
+            stream = await self._request(
+                lambda: self._client.chat.completions.create(
+                    **self._params(prompt, max_tokens),
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+            )
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield StreamChunk(text=chunk.choices[0].delta.content)
+                    if chunk.usage:
+                        yield StreamChunk(
+                            usage={
+                                "input_tokens": chunk.usage.prompt_tokens,
+                                "output_tokens": chunk.usage.completion_tokens,
+                            }
+                        )
+            finally:
+                await stream.close()
+
 
 def get_openai_client(settings: Settings | None = None) -> OpenAIClient:
     return OpenAIClient(settings or get_settings())
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import math
+import time
+
+
+class Deadline:
+    def __init__(self, budget_ms: float | None) -> None:
+        self.budget_ms = budget_ms or None
+        self.started_at = time.perf_counter()
+        self.skipped: list[str] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget_ms is not None
+
+    def remaining_ms(self) -> float:
+        if self.budget_ms is None:
+            return math.inf
+        return self.budget_ms - (time.perf_counter() - self.started_at) * 1000
+
+    def allows(self, stage: str, needed_ms: float) -> bool:
+        if self.remaining_ms() >= needed_ms:
+            return True
+        self.skipped.append(stage)
+        return False
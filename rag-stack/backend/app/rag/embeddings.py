@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import asyncio
-from functools import lru_cache
+import hashlib
+import unicodedata
+from abc import ABC, abstractmethod
+from functools import lru_cache, partial
 from pathlib import Path
 from typing import Iterable, List, Protocol
 
@@ -9,6 +12,9 @@ import numpy as np
 from sentence_transformers import SentenceTransformer
 
 from ..config import DATA_DIR, get_settings
+from .batching import MicroBatcher
+from .cache import DiskCache, LRUCache
+from .workers import ModelWorkerPool
 
 
 class EmbeddingProvider(Protocol):
@@ -17,10 +23,98 @@ class EmbeddingProvider(Protocol):
     async def embed_query(self, text: str) -> List[float]: ...
 
 
-class SentenceTransformerEmbeddings:
-    def __init__(self, model_name: str, cache_folder: Path | None = None) -> None:
+def normalize_question(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class BaseEmbeddings(ABC):
+    # Query cache and micro-batching shared by the concrete providers; subclasses implement
+    # `_encode`.
+    def __init__(
+        self,
+        model_name: str,
+        query_cache_size: int = 0,
+        query_cache_ttl: float | None = None,
+        disk_cache: DiskCache | None = None,
+        batch_size: int = 32,
+        batch_wait_ms: float = 0.0,
+    ) -> None:
         self.model_name = model_name
+        self.query_cache: LRUCache[tuple[str, str], List[float]] = LRUCache(
+            query_cache_size, ttl=query_cache_ttl
+        )
+        self.disk_cache = disk_cache
+        self.batch_size = batch_size
+        self.batcher = (
+            MicroBatcher(self._encode, batch_size, batch_wait_ms) if batch_wait_ms > 0 else None
+        )
+
+    @staticmethod
+    def _normalize(vectors: Iterable[Iterable[float]]) -> List[List[float]]:
+        normalized = []
+        for vector in vectors:
+            arr = np.array(list(vector), dtype=np.float32)
+            norm = np.linalg.norm(arr)
+            if norm > 0:
+                arr = arr / norm
+            normalized.append(arr.tolist())
+        return normalized
+
+    async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.batcher is not None:
+            return await self.batcher.submit(texts)
+        return await self._encode(texts)
+
+    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        # Encodes `texts` as one model batch, for callers that already sized it (ingestion).
+        return await self._encode(texts, batch_size=max(1, len(texts)))
+
+    @abstractmethod
+    async def _encode(
+        self, texts: List[str], batch_size: int | None = None
+    ) -> List[List[float]]: ...
+
+    async def embed_query(self, text: str) -> List[float]:
+        key = (self.model_name, normalize_question(text))
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return list(cached)
+        loop = asyncio.get_event_loop()
+        disk_key = hashlib.sha256("\0".join(key).encode("utf-8")).hexdigest()
+        if self.disk_cache is not None:
+            stored = await loop.run_in_executor(None, lambda: self.disk_cache.get(disk_key))
+            if stored is not None:
+                vector = np.frombuffer(stored, dtype=np.float32).tolist()
+                self.query_cache.put(key, vector)
+                return list(vector)
+        [vector] = await self.embed_documents([key[1]])
+        self.query_cache.put(key, vector)
+        if self.disk_cache is not None:
+            payload = np.asarray(vector, dtype=np.float32).tobytes()
+            await loop.run_in_executor(None, lambda: self.disk_cache.put(disk_key, payload))
+        return list(vector)
+
+    def batching_stats(self) -> dict | None:
+        return self.batcher.stats() if self.batcher is not None else None
+
+    def cache_stats(self) -> dict:
+        stats = {"memory": self.query_cache.stats()}
+        if self.disk_cache is not None:
+            stats["disk"] = self.disk_cache.stats()
+        return stats
+
+
+class SentenceTransformerEmbeddings(BaseEmbeddings):
+    def __init__(
+        self,
+        model_name: str,
+        cache_folder: Path | None = None,
+        worker_pool: ModelWorkerPool | None = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(model_name, **kwargs)
         self.cache_folder = cache_folder
+        self.worker_pool = worker_pool
         self._model: SentenceTransformer | None = None
         self._lock = asyncio.Lock()
 
@@ -37,25 +131,17 @@ class SentenceTransformerEmbeddings:
                     )
         return self._model
 
-    @staticmethod
-    def _normalize(vectors: Iterable[Iterable[float]]) -> List[List[float]]:
-        normalized = []
-        for vector in vectors:
-            arr = np.array(list(vector), dtype=np.float32)
-            norm = np.linalg.norm(arr)
-            if norm > 0:
-                arr = arr / norm
-            normalized.append(arr.tolist())
-        return normalized
-
-    async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+    async def _encode(self, texts: List[str], batch_size: int | None = None) -> List[List[float]]:
+        batch_size = batch_size or self.batch_size
+        if self.worker_pool is not None:
+            return self._normalize(await self.worker_pool.encode(texts, batch_size))
         model = await self._get_model()
         loop = asyncio.get_event_loop()
         embeddings = await loop.run_in_executor(
             None,
             lambda: model.encode(
                 texts,
-                batch_size=32,
+                batch_size=batch_size,
                 show_progress_bar=False,
                 convert_to_numpy=True,
                 normalize_embeddings=False,
@@ -63,16 +149,47 @@ class SentenceTransformerEmbeddings:
         )
         return self._normalize(embeddings)
 
-    async def embed_query(self, text: str) -> List[float]:
-        [vector] = await self.embed_documents([text])
-        return vector
-
 
 @lru_cache(maxsize=1)
 def get_default_embedding_provider() -> EmbeddingProvider:
     settings = get_settings()
     cache_dir = DATA_DIR / ".cache"
     cache_dir.mkdir(parents=True, exist_ok=True)
+    ttl = settings.embedding_cache_ttl or None
+    options = {
+        "query_cache_size": settings.embedding_cache_size,
+        "query_cache_ttl": ttl,
+        "disk_cache": (
+            DiskCache(
+                cache_dir / "query_embeddings.sqlite",
+                ttl=ttl,
+                max_entries=settings.embedding_disk_cache_size,
+            )
+            if settings.embedding_disk_cache
+            else None
+        ),
+        "batch_size": settings.embedding_batch_size,
+        "batch_wait_ms": settings.embedding_batch_wait_ms,
+    }
     if settings.embeddings_provider == "sentence-transformers":
-        return SentenceTransformerEmbeddings(settings.embeddings_model, cache_dir)
+        worker_pool = None
+        if settings.inference_workers > 0:
+            loader = partial(
+                SentenceTransformer, settings.embeddings_model, cache_folder=str(cache_dir)
+            )
+            worker_pool = ModelWorkerPool(loader, settings.inference_workers)
+        return SentenceTransformerEmbeddings(
+            settings.embeddings_model, cache_dir, worker_pool=worker_pool, **options
+        )
+    if settings.embeddings_provider == "onnx":
+        from .onnx_embeddings import OnnxEmbeddings, default_onnx_dir
+
+        model_dir = (
+            Path(settings.onnx_model_dir)
+            if settings.onnx_model_dir
+            else default_onnx_dir(settings.embeddings_model)
+        )
+        return OnnxEmbeddings(
+            model_dir, quantized=settings.onnx_quantized, threads=settings.onnx_threads, **options
+        )
     raise ValueError(f"Unsupported embeddings provider: {settings.embeddings_provider}")
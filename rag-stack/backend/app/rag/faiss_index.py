@@ -0,0 +1,364 @@
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+from typing import List, Sequence
+
+import faiss
+import numpy as np
+
+from ..config import INDEX_DIR, Settings
+from .filelock import FileLock
+
+SUPPORTED_INDEX_TYPES = {"flat", "ivf", "hnsw"}
+COARSE_METHODS = {"prefix", "pca"}
+SCALAR_QUANTIZERS = {
+    "none": None,
+    "float16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+# FAISS warns below ~39 training points per centroid.
+MIN_POINTS_PER_CENTROID = 39
+# Candidate sets up to this size are scored exactly from reconstructed vectors.
+EXACT_SEARCH_LIMIT = 4096
+# Rebuild from the table once this share of the stored vectors are tombstones.
+TOMBSTONE_REBUILD_RATIO = 0.2
+EMPTY_IDS = np.empty(0, dtype=np.int64)
+
+
+class FaissIndex:
+    def __init__(self, settings: Settings, index_dir: Path | None = None) -> None:
+        index_type = settings.faiss_index_type.lower()
+        if index_type not in SUPPORTED_INDEX_TYPES:
+            raise ValueError(f"Unsupported FAISS index type: {settings.faiss_index_type}")
+        quantization = settings.faiss_quantization.lower()
+        if quantization not in SCALAR_QUANTIZERS:
+            raise ValueError(f"Unsupported FAISS quantization: {settings.faiss_quantization}")
+        coarse_method = settings.coarse_method.lower()
+        if coarse_method not in COARSE_METHODS:
+            raise ValueError(f"Unsupported coarse method: {settings.coarse_method}")
+        self.settings = settings
+        self.index_type = index_type
+        self.quantization = quantization
+        self.coarse_dims = max(0, settings.coarse_dims)
+        self.coarse_method = coarse_method
+        suffix = "" if quantization == "none" else f"-{quantization}"
+        if self.coarse_dims:
+            suffix += f"-{coarse_method}{self.coarse_dims}"
+        self.path = (index_dir or INDEX_DIR) / f"faiss-{index_type}{suffix}.index"
+        self.tombstones_path = self.path.with_suffix(".deleted.npy")
+        self.lock_path = self.path.with_suffix(".lock")
+        self._index: faiss.IndexIDMap2 | None = None
+        # Removed ids the index type can't drop in place (HNSW graphs, IVF direct maps); filtered at
+        # search time.
+        self._tombstones = EMPTY_IDS
+        # An exact flat index stands in for index types that need training until the table has
+        # enough rows.
+        self._provisional = False
+        self._max_id = 0
+        self._loaded_mtime: float | None = None
+        self._ready = False
+        self._lock = threading.RLock()
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready
+
+    @property
+    def is_quantized(self) -> bool:
+        return self.quantization != "none"
+
+    @property
+    def is_reduced(self) -> bool:
+        return self._index is not None and isinstance(self._base_index(), faiss.IndexPreTransform)
+
+    @property
+    def needs_rescore(self) -> bool:
+        return self.is_quantized or self.is_reduced
+
+    @property
+    def rescore_factor(self) -> int:
+        factor = 1
+        if self.is_quantized:
+            factor = max(factor, self.settings.quantization_rescore_factor)
+        if self.is_reduced:
+            factor = max(factor, self.settings.coarse_rescore_factor)
+        return factor
+
+    @property
+    def ntotal(self) -> int:
+        return int(self._index.ntotal) if self._index is not None else 0
+
+    @property
+    def max_id(self) -> int:
+        return self._max_id
+
+    @property
+    def training_rows(self) -> int:
+        return max(1, self.settings.faiss_train_min_rows)
+
+    @property
+    def is_provisional(self) -> bool:
+        return self._index is not None and self._provisional
+
+    @property
+    def needs_rebuild(self) -> bool:
+        if self.is_provisional and self.ntotal >= self.training_rows:
+            return True
+        return len(self._tombstones) > TOMBSTONE_REBUILD_RATIO * self.ntotal
+
+    def load(self) -> bool:
+        with self._lock:
+            if not self.path.exists():
+                return False
+            mtime = self.path.stat().st_mtime
+            if self._ready and self._loaded_mtime == mtime:
+                return True
+            self._index = faiss.read_index(str(self.path))
+            self._tombstones = (
+                np.load(self.tombstones_path) if self.tombstones_path.exists() else EMPTY_IDS
+            )
+            self._provisional = (
+                isinstance(self._base_index(), faiss.IndexFlat)
+                and not self._build(self._index.d, 0).is_trained
+            )
+            self._max_id = int(self._stored_ids().max()) if self._index.ntotal else 0
+            self._loaded_mtime = mtime
+            self._configure_search()
+            self._ready = True
+            return True
+
+    def refresh(self) -> None:
+        # Another process (e.g. the ingest CLI) may have appended to the index on disk.
+        if self.path.exists() and self.path.stat().st_mtime != self._loaded_mtime:
+            self.load()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._index = None
+            self._tombstones = EMPTY_IDS
+            self._provisional = False
+            self._max_id = 0
+            self._ready = True
+
+    def writer_lock(self) -> FileLock:
+        return FileLock(self.lock_path)
+
+    def train(self, vectors: Sequence[Sequence[float]]) -> None:
+        # Called by the table rebuild with a sample of stored embeddings, before anything is added.
+        matrix = self._as_matrix(vectors)
+        base = self._build(matrix.shape[1], matrix.shape[0])
+        if not base.is_trained:
+            base.train(matrix)
+        with self._lock:
+            self._index = faiss.IndexIDMap2(base)
+            self._provisional = False
+            self._max_id = 0
+            self._configure_search()
+
+    def add(self, ids: Sequence[int], vectors: Sequence[Sequence[float]]) -> None:
+        if not ids:
+            return
+        matrix = self._as_matrix(vectors)
+        id_array = np.asarray(ids, dtype=np.int64)
+        with self._lock:
+            if self._index is None:
+                self._create(matrix.shape[1])
+            elif matrix.shape[1] != self._index.d:
+                raise ValueError(
+                    f"Embedding dimension {matrix.shape[1]} does not match "
+                    f"FAISS index dimension {self._index.d}"
+                )
+            self._index.add_with_ids(matrix, id_array)
+            self._max_id = max(self._max_id, int(id_array.max()))
+            self._ready = True
+
+    def missing(self, ids: Sequence[int]) -> List[int]:
+        # The ids not stored yet; writers skip vectors another process already added.
+        id_array = np.asarray(ids, dtype=np.int64)
+        if self._index is None or not len(id_array):
+            return id_array.tolist()
+        with self._lock:
+            return id_array[~np.isin(id_array, self._stored_ids())].tolist()
+
+    def remove(self, ids: Sequence[int]) -> None:
+        if self._index is None or not len(ids):
+            return
+        id_array = np.unique(np.asarray(ids, dtype=np.int64))
+        with self._lock:
+            try:
+                self._index.remove_ids(faiss.IDSelectorBatch(id_array))
+            except RuntimeError:
+                # Chunk ids come from a sequence and are never reused, so a tombstone can't hide a
+                # later add.
+                self._tombstones = np.union1d(self._tombstones, id_array)
+
+    def search(
+        self,
+        vector: Sequence[float],
+        k: int,
+        candidates: np.ndarray | None = None,
+        ef_search: int | None = None,
+        nprobe: int | None = None,
+    ) -> List[tuple[int, float]]:
+        if self._index is None or self._index.ntotal == 0 or k <= 0:
+            return []
+        if candidates is not None and len(candidates) == 0:
+            return []
+        query = self._as_matrix([vector])
+        if query.shape[1] != self._index.d:
+            raise ValueError(
+                f"Query dimension {query.shape[1]} does not match "
+                f"FAISS index dimension {self._index.d}"
+            )
+        with self._lock:
+            tombstones = self._tombstones
+            if candidates is not None and len(tombstones):
+                candidates = np.setdiff1d(candidates, tombstones)
+                if not len(candidates):
+                    return []
+            if candidates is not None and len(candidates) <= EXACT_SEARCH_LIMIT:
+                hits = self._exact_search(query, k, candidates)
+                if hits is not None:
+                    return hits
+            selector = excluded = None
+            if candidates is not None:
+                selector = faiss.IDSelectorBatch(np.asarray(candidates, dtype=np.int64))
+            elif len(tombstones):
+                # `excluded` must outlive the search; IDSelectorNot doesn't keep it alive.
+                excluded = faiss.IDSelectorBatch(tombstones)
+                selector = faiss.IDSelectorNot(excluded)
+            params = self._search_params(selector, ef_search=ef_search, nprobe=nprobe)
+            scores, ids = self._index.search(query, min(k, self._index.ntotal), params=params)
+        return [
+            (int(cid), float(score))
+            for cid, score in zip(ids[0], scores[0], strict=True)
+            if cid != -1
+        ]
+
+    def _exact_search(
+        self, query: np.ndarray, k: int, candidates: np.ndarray
+    ) -> List[tuple[int, float]] | None:
+        ids = np.asarray(candidates, dtype=np.int64)
+        try:
+            vectors = self._index.reconstruct_batch(ids)
+        except RuntimeError:
+            # Some candidates are not in the index yet; let the selector search skip them.
+            return None
+        scores = vectors @ query[0]
+        top = np.argsort(-scores)[:k]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def _search_params(
+        self,
+        selector: faiss.IDSelector | None,
+        ef_search: int | None = None,
+        nprobe: int | None = None,
+    ) -> faiss.SearchParameters | None:
+        base = self._search_index()
+        if isinstance(base, faiss.IndexIVF):
+            if selector is None and nprobe is None:
+                return None
+            params = faiss.SearchParametersIVF(nprobe=min(nprobe or base.nprobe, base.nlist))
+        elif isinstance(base, faiss.IndexHNSW):
+            if selector is None and ef_search is None:
+                return None
+            params = faiss.SearchParametersHNSW(efSearch=ef_search or base.hnsw.efSearch)
+        else:
+            if selector is None:
+                return None
+            params = faiss.SearchParameters()
+        if selector is not None:
+            params.sel = selector
+        return params
+
+    def save(self) -> None:
+        with self._lock:
+            if self._index is None:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+            faiss.write_index(self._index, str(tmp_path))
+            # Tombstones go first so a reader never sees the index without the ids it must skip.
+            if len(self._tombstones):
+                tmp_tombstones = self.tombstones_path.with_suffix(f".{os.getpid()}.tmp")
+                with open(tmp_tombstones, "wb") as handle:
+                    np.save(handle, self._tombstones)
+                os.replace(tmp_tombstones, self.tombstones_path)
+            else:
+                self.tombstones_path.unlink(missing_ok=True)
+            os.replace(tmp_path, self.path)
+            self._loaded_mtime = self.path.stat().st_mtime
+
+    def _create(self, full_dim: int) -> None:
+        base = self._build(full_dim, 0)
+        self._provisional = not base.is_trained
+        if self._provisional:
+            # Never train on whatever batch happens to arrive first; `needs_rebuild` retrains from
+            # the table.
+            base = faiss.IndexFlatIP(full_dim)
+        self._index = faiss.IndexIDMap2(base)
+        self._configure_search()
+
+    def _build(self, full_dim: int, training_rows: int) -> faiss.Index:
+        # The configured index, untrained; `training_rows` caps the IVF list count.
+        dim = self.coarse_dims if 0 < self.coarse_dims < full_dim else full_dim
+        qtype = SCALAR_QUANTIZERS[self.quantization]
+        metric = faiss.METRIC_INNER_PRODUCT
+        if self.index_type == "hnsw":
+            if qtype is None:
+                base = faiss.IndexHNSWFlat(dim, self.settings.faiss_hnsw_m, metric)
+            else:
+                base = faiss.IndexHNSWSQ(dim, qtype, self.settings.faiss_hnsw_m, metric)
+        elif self.index_type == "ivf":
+            nlist = max(1, min(self.settings.faiss_nlist, training_rows // MIN_POINTS_PER_CENTROID))
+            quantizer = faiss.IndexFlatIP(dim)
+            if qtype is None:
+                base = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+            else:
+                base = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, qtype, metric)
+            base.make_direct_map()
+        elif qtype is None:
+            base = faiss.IndexFlatIP(dim)
+        else:
+            base = faiss.IndexScalarQuantizer(dim, qtype, metric)
+        if dim < full_dim:
+            # Vectors go in at full dimension and are reduced (then re-normalized) before reaching
+            # the base index.
+            base = faiss.IndexPreTransform(base)
+            base.prepend_transform(faiss.NormalizationTransform(dim, 2.0))
+            if self.coarse_method == "pca":
+                base.prepend_transform(faiss.PCAMatrix(full_dim, dim))
+            else:
+                base.prepend_transform(faiss.RemapDimensionsTransform(full_dim, dim, False))
+        return base
+
+    def _configure_search(self) -> None:
+        if self._index is None:
+            return
+        base = self._search_index()
+        if isinstance(base, faiss.IndexIVF):
+            base.nprobe = min(self.settings.faiss_nprobe, base.nlist)
+        elif isinstance(base, faiss.IndexHNSW):
+            base.hnsw.efSearch = self.settings.faiss_ef_search
+
+    def _stored_ids(self) -> np.ndarray:
+        return faiss.vector_to_array(self._index.id_map)
+
+    def _base_index(self) -> faiss.Index:
+        return faiss.downcast_index(self._index.index)
+
+    def _search_index(self) -> faiss.Index:
+        base = self._base_index()
+        if isinstance(base, faiss.IndexPreTransform):
+            return faiss.downcast_index(base.index)
+        return base
+
+    @staticmethod
+    def _as_matrix(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+        matrix = np.array(vectors, dtype=np.float32)
+        if matrix.ndim != 2:
+            raise ValueError("Expected a 2D array of embeddings")
+        faiss.normalize_L2(matrix)
+        return matrix
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import os
+from pathlib import Path
+
+
+class FileLock:
+    # flock shared by every process that rewrites the same on-disk index (the API and the ingest
+    # CLI). Writers hold it exclusively across reload, update and save so none overwrites another's
+    # changes; readers hold it shared so they never load files a writer is halfway through.
+    def __init__(self, path: Path, shared: bool = False) -> None:
+        self.path = path
+        self.shared = shared
+        self._fd: int | None = None
+
+    async def __aenter__(self) -> FileLock:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            operation = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+            await asyncio.get_running_loop().run_in_executor(None, fcntl.flock, fd, operation)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
@@ -1,12 +1,19 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
 from collections import defaultdict
 from dataclasses import dataclass
-from typing import Iterable, List, Sequence
+from typing import AsyncContextManager, Callable, List, Sequence
 
-from rank_bm25 import BM25Okapi
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..config import Settings
+from ..logging_conf import get_logger
 from ..models import RagChunk
+from .bm25_index import BM25Index
+from .retriever import REBUILD_BATCH_SIZE, RetrievedChunk, Retriever
 
 
 @dataclass
@@ -15,25 +22,128 @@ class HybridResult:
     score: float
 
 
+logger = get_logger(__name__)
+SessionFactory = Callable[[], AsyncContextManager[AsyncSession]]
+
+
 class HybridRetriever:
-    def __init__(self, corpus: Iterable[RagChunk]) -> None:
-        self.corpus = list(corpus)
-        tokenized = [chunk.content.split() for chunk in self.corpus]
-        self.bm25 = BM25Okapi(tokenized)
-
-    def search(self, query: str, vector_results: Sequence[tuple[RagChunk, float]], k: int) -> List[HybridResult]:
-        bm25_scores = self.bm25.get_scores(query.split())
-        fusion = defaultdict(float)
-        for chunk, score in vector_results:
-            fusion[chunk.id] += score
-        for chunk, bm_score in zip(self.corpus, bm25_scores):
-            fusion[chunk.id] += bm_score / (bm25_scores.max() + 1e-9)
-        scored = [HybridResult(chunk=self._find_chunk(cid), score=score) for cid, score in fusion.items()]
+    def __init__(self, retriever: Retriever, index: BM25Index | None = None) -> None:
+        self.retriever = retriever
+        self.index = index if index is not None else BM25Index()
+        self._lock = asyncio.Lock()
+        self._build: asyncio.Task | None = None
+
+    def start_build(self, session_factory: SessionFactory) -> None:
+        # Loads the corpus, or rebuilds it from the table, in the background at startup instead of
+        # inside the first search.
+        if self._build is None:
+            self._build = asyncio.create_task(self._build_in_background(session_factory))
+
+    async def _build_in_background(self, session_factory: SessionFactory) -> None:
+        try:
+            async with session_factory() as session:
+                await self.ensure_ready(session)
+        except Exception as exc:
+            # The first search retries the build.
+            logger.warning("bm25_build_failed", error=repr(exc))
+
+    async def close(self) -> None:
+        build, self._build = self._build, None
+        if build is not None and not build.done():
+            build.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await build
+
+    async def ensure_ready(self, session: AsyncSession) -> None:
+        async with self._lock:
+            async with self.index.reader_lock():
+                await asyncio.get_event_loop().run_in_executor(None, self.index.refresh)
+            if not self.index.is_ready:
+                await self.rebuild(session)
+
+    async def rebuild(self, session: AsyncSession) -> int:
+        async with self.index.writer_lock():
+            return await self._rebuild(session)
+
+    async def _rebuild(self, session: AsyncSession) -> int:
+        # Tokenizing runs in the executor, batch by batch, so a full rebuild doesn't stall the event
+        # loop.
+        loop = asyncio.get_event_loop()
+        self.index.reset()
+        last_id = 0
+        while True:
+            stmt = (
+                select(RagChunk.id, RagChunk.content)
+                .where(RagChunk.id > last_id)
+                .order_by(RagChunk.id)
+                .limit(REBUILD_BATCH_SIZE)
+            )
+            rows = (await session.execute(stmt)).all()
+            if not rows:
+                break
+            await loop.run_in_executor(
+                None, self.index.add, [(row.id, row.content) for row in rows]
+            )
+            last_id = rows[-1].id
+        await loop.run_in_executor(None, self.index.save)
+        return len(self.index)
+
+    async def index_chunks(self, chunks: Sequence[RagChunk], removed: Sequence[int] = ()) -> None:
+        documents = [(chunk.id, chunk.content) for chunk in chunks if chunk.id is not None]
+        if not documents and not removed:
+            return
+        loop = asyncio.get_event_loop()
+        async with self._lock, self.index.writer_lock():
+            # Apply what other processes appended first, so this write goes on top of theirs.
+            await loop.run_in_executor(None, self.index.refresh)
+            if not self.index.is_ready:
+                # Built from the table at startup or on first search.
+                return
+            await loop.run_in_executor(None, self.index.remove, removed)
+            await loop.run_in_executor(None, self.index.add, documents)
+            await loop.run_in_executor(None, self.index.save)
+
+    async def search(
+        self,
+        session: AsyncSession,
+        query: str,
+        vector_results: Sequence[RetrievedChunk],
+        k: int,
+        repo: str | None = None,
+        tag: str | None = None,
+        acl: list[str] | None = None,
+    ) -> List[HybridResult]:
+        await self.ensure_ready(session)
+
+        candidates = await self.retriever.filter_candidates(session, repo, tag, acl)
+        filtered_after = candidates is None and bool(repo or tag or acl)
+        fetch = k * 4 if filtered_after else k
+        loop = asyncio.get_event_loop()
+        bm25_hits = await loop.run_in_executor(
+            None, lambda: self.index.search(query, fetch, candidates)
+        )
+
+        # id -> chunk map: vector hits already carry their rows, only lexical-only hits are loaded.
+        chunks = {item.chunk.id: item.chunk for item in vector_results}
+        missing = [doc_id for doc_id, _ in bm25_hits if doc_id not in chunks]
+        for chunk in await self.retriever.load_chunks(session, missing):
+            if filtered_after and not Retriever.matches_filters(chunk, repo, tag, acl):
+                continue
+            chunks[chunk.id] = chunk
+
+        fusion: dict[int, float] = defaultdict(float)
+        for item in vector_results:
+            fusion[item.chunk.id] += item.score
+        max_bm25 = max((score for _, score in bm25_hits), default=0.0)
+        for doc_id, bm_score in bm25_hits:
+            if doc_id in chunks:
+                fusion[doc_id] += bm_score / (max_bm25 + 1e-9)
+        scored = [HybridResult(chunk=chunks[cid], score=score) for cid, score in fusion.items()]
         scored.sort(key=lambda r: r.score, reverse=True)
         return scored[:k]
 
-    def _find_chunk(self, cid: int) -> RagChunk:
-        for chunk in self.corpus:
-            if chunk.id == cid:
-                return chunk
-        raise KeyError(cid)
+
+def get_hybrid_retriever(settings: Settings, retriever: Retriever) -> HybridRetriever | None:
+    if not settings.enable_hybrid:
+        return None
+    return HybridRetriever(retriever)
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import threading
+from collections import defaultdict
+from functools import reduce
+from typing import Iterable, Sequence
+
+import numpy as np
+
+from ..models import RagChunk
+
+EMPTY_IDS = np.empty(0, dtype=np.int64)
+# Postings are compacted once removed ids reach this share of the live ones.
+COMPACT_RATIO = 0.2
+
+
+# Postings from repo/tag/version/ACL scope to chunk ids, materialized lazily as sorted arrays.
+class MetadataIndex:
+    def __init__(self) -> None:
+        self._postings: dict[tuple[str, str], list[int]] = defaultdict(list)
+        # Chunks stored without ACL are visible to every scope.
+        self._unrestricted: list[int] = []
+        self._arrays: dict[tuple[str, str], np.ndarray] = {}
+        self._unrestricted_array: np.ndarray | None = None
+        # Removed ids stay in the postings until the next compaction and are subtracted from
+        # results.
+        self._removed: set[int] = set()
+        self._removed_array: np.ndarray | None = None
+        self.max_id = 0
+        self.size = 0
+        self._lock = threading.Lock()
+
+    def add(self, chunks: Iterable[RagChunk]) -> None:
+        with self._lock:
+            for chunk in chunks:
+                if chunk.id is None:
+                    continue
+                for field in ("repo", "tag", "version"):
+                    value = getattr(chunk, field)
+                    if value is not None:
+                        self._append(field, value, chunk.id)
+                if chunk.acl is None:
+                    self._unrestricted.append(chunk.id)
+                    self._unrestricted_array = None
+                else:
+                    for scope in chunk.acl:
+                        self._append("acl", scope, chunk.id)
+                self.max_id = max(self.max_id, chunk.id)
+                self.size += 1
+
+    def remove(self, ids: Iterable[int]) -> None:
+        with self._lock:
+            removed = {int(chunk_id) for chunk_id in ids if chunk_id <= self.max_id} - self._removed
+            if not removed:
+                return
+            self._removed |= removed
+            self._removed_array = None
+            self.size -= len(removed)
+            if len(self._removed) > COMPACT_RATIO * max(self.size, 1):
+                self._compact()
+
+    def candidates(
+        self,
+        repo: str | None = None,
+        tag: str | None = None,
+        version: str | None = None,
+        acl: Sequence[str] | None = None,
+    ) -> np.ndarray | None:
+        with self._lock:
+            sets = [
+                self._ids(field, value)
+                for field, value in (("repo", repo), ("tag", tag), ("version", version))
+                if value
+            ]
+            if acl:
+                scoped = [self._ids("acl", scope) for scope in acl]
+                sets.append(reduce(np.union1d, scoped, self._unrestricted_ids()))
+            removed = self._removed_ids()
+        if not sets:
+            return None
+        sets.sort(key=len)
+        result = reduce(lambda a, b: np.intersect1d(a, b, assume_unique=True), sets)
+        return np.setdiff1d(result, removed, assume_unique=True) if len(removed) else result
+
+    def _compact(self) -> None:
+        removed = self._removed
+        for key in list(self._postings):
+            kept = [chunk_id for chunk_id in self._postings[key] if chunk_id not in removed]
+            if kept:
+                self._postings[key] = kept
+            else:
+                del self._postings[key]
+        self._unrestricted = [
+            chunk_id for chunk_id in self._unrestricted if chunk_id not in removed
+        ]
+        self._arrays.clear()
+        self._unrestricted_array = None
+        self._removed = set()
+        self._removed_array = None
+
+    def _removed_ids(self) -> np.ndarray:
+        if self._removed_array is None:
+            self._removed_array = np.fromiter(
+                sorted(self._removed), dtype=np.int64, count=len(self._removed)
+            )
+        return self._removed_array
+
+    def _append(self, field: str, value: str, chunk_id: int) -> None:
+        key = (field, value)
+        self._postings[key].append(chunk_id)
+        self._arrays.pop(key, None)
+
+    def _ids(self, field: str, value: str) -> np.ndarray:
+        key = (field, value)
+        if key not in self._postings:
+            return EMPTY_IDS
+        if key not in self._arrays:
+            self._arrays[key] = np.unique(np.asarray(self._postings[key], dtype=np.int64))
+        return self._arrays[key]
+
+    def _unrestricted_ids(self) -> np.ndarray:
+        if self._unrestricted_array is None:
+            self._unrestricted_array = np.unique(np.asarray(self._unrestricted, dtype=np.int64))
+        return self._unrestricted_array
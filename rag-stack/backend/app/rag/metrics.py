@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import bisect
+import threading
+from typing import Sequence
+
+
+class Histogram:
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds = sorted(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.total += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            buckets = {
+                f"le_{bound:g}": count
+                for bound, count in zip(self.bounds, self.counts[:-1], strict=True)
+            }
+            buckets["inf"] = self.counts[-1]
+            return {
+                "count": self.count,
+                "mean": self.total / self.count if self.count else 0.0,
+                "buckets": buckets,
+            }
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import Any, List
+
+import numpy as np
+import orjson
+
+from ..config import DATA_DIR
+from .embeddings import BaseEmbeddings
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model.int8.onnx"
+EXPORT_CONFIG_FILE = "onnx_config.json"
+
+
+def default_onnx_dir(model_name: str) -> Path:
+    return DATA_DIR / "models" / f"{model_name.rstrip('/').split('/')[-1]}-onnx"
+
+
+class OnnxEmbeddings(BaseEmbeddings):
+    def __init__(
+        self, model_dir: Path, quantized: bool = False, threads: int = 0, **kwargs
+    ) -> None:
+        # The quantization level is part of the name so cached query vectors never mix fp32 and
+        # int8.
+        super().__init__(f"onnx:{model_dir.name}:{'int8' if quantized else 'fp32'}", **kwargs)
+        self.model_dir = model_dir
+        self.quantized = quantized
+        self.threads = threads
+        self._session: Any = None
+        self._tokenizer: Any = None
+        self._max_length = 512
+        self._lock = asyncio.Lock()
+
+    async def _load(self) -> tuple[Any, Any]:
+        if self._session is None:
+            async with self._lock:
+                if self._session is None:
+                    await asyncio.get_event_loop().run_in_executor(None, self._load_sync)
+        return self._session, self._tokenizer
+
+    def _load_sync(self) -> None:
+        try:
+            import onnxruntime as ort
+        except ImportError as exc:
+            raise RuntimeError(
+                "EMBEDDINGS_PROVIDER=onnx requiere instalar el extra `onnx` (onnxruntime)"
+            ) from exc
+        from transformers import AutoTokenizer
+
+        model_path = self.model_dir / (QUANTIZED_MODEL_FILE if self.quantized else MODEL_FILE)
+        if not model_path.exists():
+            raise FileNotFoundError(
+                f"No se encontró {model_path}; "
+                "ejecuta `python -m app.rag.onnx_export` para generarlo"
+            )
+        config_path = self.model_dir / EXPORT_CONFIG_FILE
+        if config_path.exists():
+            self._max_length = orjson.loads(config_path.read_bytes()).get(
+                "max_length", self._max_length
+            )
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads > 0:
+            options.intra_op_num_threads = self.threads
+        self._tokenizer = AutoTokenizer.from_pretrained(str(self.model_dir))
+        self._session = ort.InferenceSession(
+            str(model_path), options, providers=["CPUExecutionProvider"]
+        )
+
+    async def _encode(self, texts: List[str], batch_size: int | None = None) -> List[List[float]]:
+        session, tokenizer = await self._load()
+        loop = asyncio.get_event_loop()
+        size = batch_size or self.batch_size
+        vectors = await loop.run_in_executor(
+            None, lambda: self._run(session, tokenizer, texts, size)
+        )
+        return self._normalize(vectors)
+
+    def _run(self, session: Any, tokenizer: Any, texts: List[str], batch_size: int) -> np.ndarray:
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            encoded = tokenizer(
+                texts[start : start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self._max_length,
+                return_tensors="np",
+            )
+            feed = {
+                "input_ids": encoded["input_ids"].astype(np.int64),
+                "attention_mask": encoded["attention_mask"].astype(np.int64),
+            }
+            outputs.append(session.run(None, feed)[0])
+        return np.concatenate(outputs) if outputs else np.zeros((0, 0), dtype=np.float32)
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+import orjson
+import torch
+from sentence_transformers import SentenceTransformer
+
+from ..config import get_settings
+from ..logging_conf import get_logger
+from ..models import EMBEDDING_DIM
+from .onnx_embeddings import EXPORT_CONFIG_FILE, MODEL_FILE, QUANTIZED_MODEL_FILE, default_onnx_dir
+
+logger = get_logger(__name__)
+# Protobuf caps a single ONNX file at 2 GB; larger models (bge-m3 fp32) keep weights in a side file.
+PROTOBUF_LIMIT = 2**31 - 1
+
+
+class _PooledEncoder(torch.nn.Module):
+    # Transformer + sentence-transformers pooling in one graph, so ONNX Runtime returns sentence
+    # vectors.
+    def __init__(self, model: torch.nn.Module, pooling: str) -> None:
+        super().__init__()
+        self.model = model
+        self.pooling = pooling
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        hidden = self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+        if self.pooling == "cls":
+            return hidden[:, 0]
+        mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+        return (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+
+
+def export_model(source: str, output_dir: Path, quantize: bool = False, opset: int = 17) -> Path:
+    model = SentenceTransformer(source, device="cpu")
+    transformer, pooling_module = model[0], model[1]
+    config = pooling_module.get_config_dict()
+    if config.get("pooling_mode_cls_token"):
+        pooling = "cls"
+    elif config.get("pooling_mode_mean_tokens"):
+        pooling = "mean"
+    else:
+        raise ValueError(f"Unsupported pooling for ONNX export: {config}")
+    dimension = model.get_sentence_embedding_dimension()
+    if dimension != EMBEDDING_DIM:
+        logger.warning(
+            "onnx_export_dimension_mismatch", dimension=dimension, expected=EMBEDDING_DIM
+        )
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    transformer.tokenizer.save_pretrained(str(output_dir))
+    encoder = _PooledEncoder(transformer.auto_model.eval(), pooling)
+    sample = transformer.tokenizer(["consulta de ejemplo"], return_tensors="pt")
+    model_path = output_dir / MODEL_FILE
+    with torch.no_grad():
+        torch.onnx.export(
+            encoder,
+            (sample["input_ids"], sample["attention_mask"]),
+            str(model_path),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["sentence_embedding"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "sentence_embedding": {0: "batch"},
+            },
+            opset_version=opset,
+        )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        weights = sum(parameter.numel() for parameter in encoder.parameters()) * 4
+        quantize_dynamic(
+            str(model_path),
+            str(output_dir / QUANTIZED_MODEL_FILE),
+            weight_type=QuantType.QInt8,
+            use_external_data_format=weights > PROTOBUF_LIMIT,
+        )
+    (output_dir / EXPORT_CONFIG_FILE).write_bytes(
+        orjson.dumps(
+            {
+                "source": source,
+                "pooling": pooling,
+                "dimension": dimension,
+                "max_length": model.max_seq_length,
+                "quantized": quantize,
+            },
+            option=orjson.OPT_INDENT_2,
+        )
+    )
+    return output_dir
+
+
+def parse_args() -> argparse.Namespace:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(
+        description="Export a sentence-transformers checkpoint to ONNX"
+    )
+    parser.add_argument("--model", type=str, default=settings.embeddings_model)
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--quantize", action="store_true", help="Also write a dynamic int8 model")
+    parser.add_argument("--opset", type=int, default=17)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    output = Path(args.output) if args.output else default_onnx_dir(args.model)
+    export_model(args.model, output, quantize=args.quantize, opset=args.opset)
+
+
+if __name__ == "__main__":
+    main()
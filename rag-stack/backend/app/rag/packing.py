@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from typing import List, Sequence
+
+from ..models import RagChunk
+
+# Deliberately below the ~4 chars/token of English prose: Spanish text, code and identifiers
+# tokenize denser, and there is no local tokenizer for the answering model, so the estimate errs
+# towards more tokens and the packed context stays within budget.
+CHARS_PER_TOKEN = 3
+# Neighbouring chunks whose offsets are this close only lost stripped whitespace between them.
+ADJACENT_GAP = 2
+# Chunks without stored offsets are merged only when at least this much text repeats.
+MIN_TEXT_OVERLAP = 32
+# Below this many tokens a truncated segment is not worth sending.
+MIN_PARTIAL_TOKENS = 64
+
+
+@dataclass
+class ContextSegment:
+    path: str
+    content: str
+    rank: int
+    chunk_ids: List[int] = field(default_factory=list)
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.content)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def pack_context(chunks: Sequence[RagChunk], token_budget: int) -> List[ContextSegment]:
+    # `chunks` arrive best-first; a merged segment keeps the best rank among its chunks.
+    groups: dict[tuple, list[tuple[int, RagChunk]]] = {}
+    for rank, chunk in enumerate(chunks):
+        groups.setdefault((chunk.path, chunk.repo, chunk.tag, chunk.version), []).append(
+            (rank, chunk)
+        )
+    segments = [segment for members in groups.values() for segment in _merge(members)]
+    segments.sort(key=lambda segment: segment.rank)
+    if token_budget <= 0:
+        return segments
+
+    packed: List[ContextSegment] = []
+    used = 0
+    for segment in segments:
+        tokens = segment.tokens
+        if used + tokens <= token_budget:
+            packed.append(segment)
+            used += tokens
+            continue
+        remaining = token_budget - used
+        if remaining >= MIN_PARTIAL_TOKENS:
+            segment.content = _truncate(segment.content, remaining * CHARS_PER_TOKEN)
+            packed.append(segment)
+            break
+    return packed
+
+
+def _merge(members: list[tuple[int, RagChunk]]) -> List[ContextSegment]:
+    # Document order: split offsets when every chunk has them, otherwise insertion order.
+    if all(_start(chunk) is not None for _, chunk in members):
+        members = sorted(members, key=lambda member: _start(member[1]))
+    else:
+        members = sorted(members, key=lambda member: member[1].id or 0)
+
+    segments: List[ContextSegment] = []
+    current: ContextSegment | None = None
+    end: int | None = None
+    for rank, chunk in members:
+        start = _start(chunk)
+        merged = _join(current.content, end, chunk.content, start) if current is not None else None
+        if merged is None:
+            current = ContextSegment(
+                path=chunk.path or "desconocido", content=chunk.content, rank=rank
+            )
+            segments.append(current)
+        else:
+            current.content = merged
+            current.rank = min(current.rank, rank)
+        if chunk.id is not None:
+            current.chunk_ids.append(chunk.id)
+        chunk_end = start + len(chunk.content) if start is not None else None
+        if merged is not None and end is not None and chunk_end is not None:
+            end = max(end, chunk_end)
+        else:
+            end = chunk_end
+
+    for segment in segments:
+        segment.content = " ".join(segment.content.split())
+    return segments
+
+
+def _join(previous: str, previous_end: int | None, text: str, start: int | None) -> str | None:
+    if previous_end is not None and start is not None:
+        gap = start - previous_end
+        if gap > ADJACENT_GAP:
+            return None
+        if gap > 0:
+            return f"{previous}\n{text}"
+        return previous + text[-gap:]
+    overlap = _text_overlap(previous, text)
+    return previous + text[overlap:] if overlap else None
+
+
+def _text_overlap(previous: str, text: str) -> int:
+    # Longest suffix of `previous` that `text` starts with.
+    if len(text) < MIN_TEXT_OVERLAP:
+        return 0
+    probe = text[:MIN_TEXT_OVERLAP]
+    position = previous.find(probe, max(0, len(previous) - len(text)))
+    while position != -1:
+        if text.startswith(previous[position:]):
+            return len(previous) - position
+        position = previous.find(probe, position + 1)
+    return 0
+
+
+def _start(chunk: RagChunk) -> int | None:
+    return (chunk.meta or {}).get("start_index")
+
+
+def _truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return text[: limit - 2].rsplit(" ", 1)[0] + " …"
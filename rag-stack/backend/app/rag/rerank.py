@@ -1,16 +1,32 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Iterable, List, Sequence
+import hashlib
+from functools import partial
+from typing import List, Sequence
 
 from sentence_transformers import CrossEncoder
 
 from ..config import Settings
+from .cache import LRUCache
+from .embeddings import normalize_question
+from .workers import ModelWorkerPool
 
 
 class Reranker:
-    def __init__(self, model_name: str) -> None:
+    def __init__(
+        self,
+        model_name: str,
+        worker_pool: ModelWorkerPool | None = None,
+        max_length: int | None = None,
+        batch_size: int = 32,
+        cache_size: int = 0,
+    ) -> None:
         self.model_name = model_name
+        self.worker_pool = worker_pool
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.cache: LRUCache[tuple[str, str, int | str], float] = LRUCache(cache_size)
         self._model: CrossEncoder | None = None
         self._lock = asyncio.Lock()
 
@@ -19,14 +35,48 @@ class Reranker:
             async with self._lock:
                 if self._model is None:
                     loop = asyncio.get_event_loop()
-                    self._model = await loop.run_in_executor(None, lambda: CrossEncoder(self.model_name))
+                    self._model = await loop.run_in_executor(
+                        None, lambda: CrossEncoder(self.model_name, max_length=self.max_length)
+                    )
         return self._model
 
-    async def rerank(self, query: str, documents: Sequence[str]) -> List[float]:
+    async def rerank(
+        self,
+        query: str,
+        documents: Sequence[str],
+        ids: Sequence[int | None] | None = None,
+    ) -> List[float]:
+        query_key = hashlib.sha256(normalize_question(query).encode("utf-8")).hexdigest()
+        keys = [
+            (
+                self.model_name,
+                query_key,
+                ids[i]
+                if ids is not None and ids[i] is not None
+                else hashlib.sha256(doc.encode("utf-8")).hexdigest(),
+            )
+            for i, doc in enumerate(documents)
+        ]
+        scores = [self.cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            # Similar lengths end up in the same batch, so little compute is spent on padding.
+            missing.sort(key=lambda i: len(documents[i]))
+            fresh = await self._predict(query, [documents[i] for i in missing])
+            for i, score in zip(missing, fresh, strict=True):
+                scores[i] = score
+                self.cache.put(keys[i], score)
+        return scores
+
+    async def _predict(self, query: str, documents: List[str]) -> List[float]:
+        if self.worker_pool is not None:
+            return (await self.worker_pool.predict(query, documents, self.batch_size)).tolist()
         model = await self._get_model()
         loop = asyncio.get_event_loop()
         pairs = [(query, doc) for doc in documents]
-        scores = await loop.run_in_executor(None, lambda: model.predict(pairs))
+        scores = await loop.run_in_executor(
+            None, lambda: model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        )
         return list(map(float, scores))
 
 
@@ -36,4 +86,16 @@ def get_reranker(settings: Settings) -> Reranker | None:
     model_name = "BAAI/bge-reranker-large"
     if settings.embeddings_model.endswith("m3"):
         model_name = "BAAI/bge-reranker-v2-m3"
-    return Reranker(model_name)
+    max_length = settings.rerank_max_length or None
+    worker_pool = None
+    if settings.rerank_workers > 0:
+        worker_pool = ModelWorkerPool(
+            partial(CrossEncoder, model_name, max_length=max_length), settings.rerank_workers
+        )
+    return Reranker(
+        model_name,
+        worker_pool=worker_pool,
+        max_length=max_length,
+        batch_size=settings.rerank_batch_size,
+        cache_size=settings.rerank_cache_size,
+    )
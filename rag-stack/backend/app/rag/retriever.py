@@ -1,14 +1,53 @@
 from __future__ import annotations
 
+import asyncio
+import time
 from dataclasses import dataclass
-from typing import Iterable, List, Sequence
+from typing import List, Sequence
 
 import numpy as np
-from sqlalchemy import select, text
+from sqlalchemy import func, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..config import Settings
-from ..models import RagChunk
+from ..models import EMBEDDING_DIM, IngestManifest, RagChunk
+from .cache import LRUCache
+from .faiss_index import FaissIndex
+from .metadata_index import MetadataIndex
+
+# Extra FAISS candidates fetched per requested result when metadata filters may discard hits.
+FAISS_FILTER_OVERFETCH = 4
+REBUILD_BATCH_SIZE = 1000
+# Keeps `id IN (...)` lists under the bound-parameter limits of SQLite and psycopg.
+ID_BATCH_SIZE = 5000
+# Everything reranking and prompting needs; the embedding stays in the database.
+CHUNK_COLUMNS = [column for column in RagChunk.__table__.columns if column.name != "embedding"]
+# Coarse distance over the quantized expression indexes created by migration 0003.
+# `{query}` is the bound query vector (or the VALUES column in batch searches).
+QUANTIZED_DISTANCES = {
+    "halfvec": (
+        f"embedding::halfvec({EMBEDDING_DIM}) "
+        f"<=> CAST({{query}} AS halfvec({EMBEDDING_DIM}))"
+    ),
+    "binary": (
+        f"binary_quantize(embedding)::bit({EMBEDDING_DIM}) "
+        f"<~> binary_quantize(CAST({{query}} AS vector({EMBEDDING_DIM})))"
+    ),
+}
+# pgvector's hnsw.ef_search default and upper bound. An HNSW scan returns at most ef_search rows, so
+# a LIMIT above the default needs a matching SET LOCAL.
+HNSW_DEFAULT_EF_SEARCH = 40
+HNSW_MAX_EF_SEARCH = 1000
+# Coarse distance over the prefix expression indexes created by migration 0004.
+PREFIX_DISTANCE = (
+    "subvector(embedding, 1, {dims})::vector({dims}) "
+    f"<=> subvector(CAST({{query}} AS vector({EMBEDDING_DIM})), 1, {{dims}})::vector({{dims}})"
+)
+
+
+def _record(timings: dict[str, float] | None, key: str, start: float) -> None:
+    if timings is not None:
+        timings[key] = timings.get(key, 0.0) + time.perf_counter() - start
 
 
 @dataclass
@@ -17,9 +56,31 @@ class RetrievedChunk:
     score: float
 
 
+@dataclass
+class SearchRequest:
+    embedding: Sequence[float]
+    k: int
+    repo: str | None = None
+    tag: str | None = None
+    acl: list[str] | None = None
+    ef_search: int | None = None
+    probes: int | None = None
+
+
 class Retriever:
     def __init__(self, settings: Settings) -> None:
         self.settings = settings
+        self.ann_index: FaissIndex | None = None
+        if settings.vector_backend.lower() == "faiss":
+            self.ann_index = FaissIndex(settings)
+            self.ann_index.load()
+        self._ann_lock = asyncio.Lock()
+        self.metadata_index: MetadataIndex | None = (
+            MetadataIndex() if settings.enable_metadata_index else None
+        )
+        self._metadata_lock = asyncio.Lock()
+        self.chunk_cache: LRUCache[int, RagChunk] = LRUCache(settings.chunk_cache_size)
+        self._chunk_cache_generation: tuple | None = None
 
     async def _postgres_vector_search(
         self,
@@ -29,7 +90,14 @@ class Retriever:
         repo: str | None,
         tag: str | None,
         acl: list[str] | None,
+        ef_search: int | None = None,
+        probes: int | None = None,
+        timings: dict[str, float] | None = None,
     ) -> List[RetrievedChunk]:
+        coarse = self._coarse_distance()
+        await self._set_ef_search(session, ef_search, k * coarse[1] if coarse else k)
+        if probes:
+            await session.execute(text(f"SET LOCAL ivfflat.probes = {int(probes)}"))
         params = {"embedding": embedding, "limit": k, "repo": repo, "tag": tag, "acl": acl}
         filters = ["TRUE"]
         if repo:
@@ -39,9 +107,37 @@ class Retriever:
         if acl:
             filters.append("acl && :acl")
         where_clause = " AND ".join(filters)
+        two_phase = self.settings.two_phase_retrieval
+        columns = "id" if two_phase else ", ".join(column.name for column in CHUNK_COLUMNS)
+        if coarse:
+            # Search the quantized or truncated index for an over-fetched pool, rescore it at full
+            # precision.
+            coarse_distance, factor = coarse
+            coarse_start = time.perf_counter()
+            pool_stmt = text(
+                f"""
+                SELECT id FROM rag_chunks
+                WHERE {where_clause}
+                ORDER BY {coarse_distance}
+                LIMIT :candidates
+                """
+            )
+            pool = (
+                (await session.execute(pool_stmt, {**params, "candidates": k * factor}))
+                .scalars()
+                .all()
+            )
+            _record(timings, "coarse_search", coarse_start)
+            if timings is not None:
+                timings["coarse_candidates"] = len(pool)
+            if not pool:
+                return []
+            params["ids"] = list(pool)
+            where_clause = "id = ANY(:ids)"
+        rescore_start = time.perf_counter()
         stmt = text(
             f"""
-            SELECT *, 1 - (embedding <=> :embedding) AS similarity
+            SELECT {columns}, 1 - (embedding <=> :embedding) AS similarity
             FROM rag_chunks
             WHERE {where_clause}
             ORDER BY embedding <=> :embedding
@@ -50,20 +146,222 @@ class Retriever:
         )
         result = await session.execute(stmt, params)
         rows = result.mappings().all()
-        chunks: List[RetrievedChunk] = []
-        for row in rows:
-            chunk = RagChunk(**{k: row[k] for k in row.keys() if k in RagChunk.__table__.columns.keys()})
-            chunks.append(RetrievedChunk(chunk=chunk, score=row["similarity"]))
-        return chunks
+        if coarse:
+            _record(timings, "rescore", rescore_start)
+        if two_phase:
+            scores = {row["id"]: float(row["similarity"]) for row in rows}
+            chunks = await self.load_chunks(session, list(scores))
+            return [RetrievedChunk(chunk=c, score=scores[c.id]) for c in chunks]
+        return [
+            RetrievedChunk(chunk=self._chunk_from_row(row), score=float(row["similarity"]))
+            for row in rows
+        ]
+
+    async def _postgres_vector_search_batch(
+        self,
+        session: AsyncSession,
+        requests: Sequence[SearchRequest],
+    ) -> List[List[RetrievedChunk]]:
+        # One round-trip: every query vector is a VALUES row joined LATERAL against its own top-k.
+        ef_search = max((request.ef_search or 0 for request in requests), default=0)
+        probes = max((request.probes or 0 for request in requests), default=0)
+        coarse = self._coarse_distance("q.query")
+        k_max = max(request.k for request in requests)
+        await self._set_ef_search(session, ef_search, k_max * coarse[1] if coarse else k_max)
+        if probes:
+            await session.execute(text(f"SET LOCAL ivfflat.probes = {int(probes)}"))
+        values = []
+        params: dict = {}
+        for i, request in enumerate(requests):
+            values.append(
+                f"(:qid{i}, CAST(:query{i} AS vector({EMBEDDING_DIM})), :k{i}, "
+                f"CAST(:repo{i} AS text), CAST(:tag{i} AS text), CAST(:acl{i} AS text[]))"
+            )
+            params.update(
+                {
+                    f"qid{i}": i,
+                    f"query{i}": list(request.embedding),
+                    f"k{i}": request.k,
+                    f"repo{i}": request.repo,
+                    f"tag{i}": request.tag,
+                    f"acl{i}": request.acl,
+                }
+            )
+        filters = (
+            "(q.repo_filter IS NULL OR c.repo = q.repo_filter) "
+            "AND (q.tag_filter IS NULL OR c.tag = q.tag_filter) "
+            "AND (q.acl_filter IS NULL OR c.acl && q.acl_filter)"
+        )
+        source = f"(SELECT c.id, c.embedding FROM rag_chunks c WHERE {filters}) AS c"
+        if coarse:
+            coarse_distance, factor = coarse
+            source = f"""(
+                SELECT c.id, c.embedding FROM rag_chunks c
+                WHERE {filters}
+                ORDER BY {coarse_distance}
+                LIMIT q.k * {int(factor)}
+            ) AS c"""
+        stmt = text(
+            f"""
+            SELECT q.qid, hits.id, hits.similarity
+            FROM (VALUES {", ".join(values)})
+                AS q(qid, query, k, repo_filter, tag_filter, acl_filter)
+            CROSS JOIN LATERAL (
+                SELECT c.id, 1 - (c.embedding <=> q.query) AS similarity
+                FROM {source}
+                ORDER BY c.embedding <=> q.query
+                LIMIT q.k
+            ) AS hits
+            """
+        )
+        top: List[dict[int, float]] = [{} for _ in requests]
+        for row in (await session.execute(stmt, params)).mappings():
+            top[row["qid"]][row["id"]] = float(row["similarity"])
+        return await self._load_batch_results(session, top)
+
+    async def _load_batch_results(
+        self,
+        session: AsyncSession,
+        top: Sequence[dict[int, float]],
+    ) -> List[List[RetrievedChunk]]:
+        ids = list(dict.fromkeys(cid for scores in top for cid in scores))
+        chunks = {chunk.id: chunk for chunk in await self.load_chunks(session, ids)}
+        return [
+            [
+                RetrievedChunk(chunk=chunks[cid], score=score)
+                for cid, score in scores.items()
+                if cid in chunks
+            ]
+            for scores in top
+        ]
 
     @staticmethod
-    def _cosine_similarity(a: Iterable[float], b: Iterable[float]) -> float:
-        va = np.array(list(a), dtype=np.float32)
-        vb = np.array(list(b), dtype=np.float32)
-        denom = np.linalg.norm(va) * np.linalg.norm(vb)
-        if denom == 0:
-            return 0.0
-        return float(np.dot(va, vb) / denom)
+    async def _set_ef_search(session: AsyncSession, ef_search: int | None, rows: int) -> None:
+        # `rows` is the deepest LIMIT the HNSW scan must fill: k, or the over-fetched coarse pool.
+        if not ef_search and rows <= HNSW_DEFAULT_EF_SEARCH:
+            return
+        value = min(max(int(ef_search or HNSW_DEFAULT_EF_SEARCH), int(rows)), HNSW_MAX_EF_SEARCH)
+        # SET does not take bind parameters; the value is a validated int.
+        await session.execute(text(f"SET LOCAL hnsw.ef_search = {value}"))
+
+    def _coarse_distance(self, query: str = ":embedding") -> tuple[str, int] | None:
+        # Settings only accept prefix lengths migration 0004 has an index for.
+        dims = self.settings.coarse_dims
+        if dims:
+            distance = PREFIX_DISTANCE.format(dims=int(dims), query=query)
+            return distance, self.settings.coarse_rescore_factor
+        quantized = QUANTIZED_DISTANCES.get(self.settings.pgvector_quantization.lower())
+        if quantized:
+            return quantized.format(query=query), self.settings.quantization_rescore_factor
+        return None
+
+    @staticmethod
+    def _chunk_from_row(row) -> RagChunk:
+        return RagChunk(**{column.name: row[column.name] for column in CHUNK_COLUMNS})
+
+    @staticmethod
+    def _cosine_matrix(
+        queries: Sequence[Sequence[float]],
+        vectors: Sequence[Sequence[float] | None],
+    ) -> np.ndarray:
+        scores = np.zeros((len(queries), len(vectors)), dtype=np.float32)
+        rows = [i for i, vector in enumerate(vectors) if vector is not None and len(vector)]
+        if not rows or not len(queries):
+            return scores
+        matrix = np.array([vectors[i] for i in rows], dtype=np.float32)
+        vq = np.asarray(queries, dtype=np.float32)
+        denom = np.outer(np.linalg.norm(vq, axis=1), np.linalg.norm(matrix, axis=1))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores[:, rows] = np.where(denom > 0, (vq @ matrix.T) / denom, 0.0)
+        return scores
+
+    @classmethod
+    def _cosine_scores(
+        cls, query: Sequence[float], vectors: Sequence[Sequence[float] | None]
+    ) -> np.ndarray:
+        return cls._cosine_matrix([query], vectors)[0]
+
+    @staticmethod
+    def matches_acl(chunk: RagChunk, acl: list[str]) -> bool:
+        return chunk.acl is None or any(scope in (chunk.acl or []) for scope in acl)
+
+    @classmethod
+    def matches_filters(
+        cls, chunk: RagChunk, repo: str | None, tag: str | None, acl: list[str] | None
+    ) -> bool:
+        if repo and chunk.repo != repo:
+            return False
+        if tag and chunk.tag != tag:
+            return False
+        return not acl or cls.matches_acl(chunk, acl)
+
+    async def load_chunks(self, session: AsyncSession, ids: Sequence[int]) -> List[RagChunk]:
+        # Second phase: rows without embeddings for the given ids, in the given order.
+        if ids and self.chunk_cache.maxsize > 0:
+            # A sync in another process (the CLI) can move rows without changing their id, so cached
+            # copies are only trusted while the corpus generation they were loaded under holds.
+            generation = await self.corpus_generation(session)
+            if generation != self._chunk_cache_generation:
+                self.chunk_cache.clear()
+                self._chunk_cache_generation = generation
+        found: dict[int, RagChunk] = {}
+        missing: List[int] = []
+        for cid in ids:
+            cached = self.chunk_cache.get(int(cid))
+            if cached is None:
+                missing.append(int(cid))
+            else:
+                found[int(cid)] = cached
+        for start in range(0, len(missing), ID_BATCH_SIZE):
+            batch = missing[start : start + ID_BATCH_SIZE]
+            result = await session.execute(select(*CHUNK_COLUMNS).where(RagChunk.id.in_(batch)))
+            for row in result.mappings():
+                chunk = self._chunk_from_row(row)
+                found[chunk.id] = chunk
+                self.chunk_cache.put(chunk.id, chunk)
+        return [found[int(cid)] for cid in ids if int(cid) in found]
+
+    @staticmethod
+    async def corpus_generation(session: AsyncSession) -> tuple:
+        # Read from the database on every cached lookup, so an ingest from any process (the CLI,
+        # other API workers) invalidates cached answers and chunk rows: inserts raise max(id),
+        # syncs touch the manifest's updated_at and pruned files lower its row count. One round-trip over indexed
+        # columns and a table with one row per file.
+        stmt = select(
+            select(func.max(RagChunk.id)).scalar_subquery(),
+            select(func.max(IngestManifest.updated_at)).scalar_subquery(),
+            select(func.count(IngestManifest.id)).scalar_subquery(),
+        )
+        return tuple((await session.execute(stmt)).one())
+
+    async def _sync_metadata_index(self, session: AsyncSession) -> None:
+        # Catch up with rows written since the last sync, including ones from other processes.
+        if self.metadata_index is None:
+            return
+        async with self._metadata_lock:
+            while True:
+                stmt = (
+                    select(RagChunk.id, RagChunk.repo, RagChunk.tag, RagChunk.version, RagChunk.acl)
+                    .where(RagChunk.id > self.metadata_index.max_id)
+                    .order_by(RagChunk.id)
+                    .limit(REBUILD_BATCH_SIZE)
+                )
+                rows = (await session.execute(stmt)).all()
+                if not rows:
+                    break
+                self.metadata_index.add(rows)
+
+    async def filter_candidates(
+        self,
+        session: AsyncSession,
+        repo: str | None,
+        tag: str | None,
+        acl: list[str] | None,
+    ) -> np.ndarray | None:
+        if self.metadata_index is None or not (repo or tag or acl):
+            return None
+        await self._sync_metadata_index(session)
+        return self.metadata_index.candidates(repo=repo, tag=tag, acl=acl)
 
     async def _fallback_search(
         self,
@@ -74,21 +372,293 @@ class Retriever:
         tag: str | None,
         acl: list[str] | None,
     ) -> List[RetrievedChunk]:
-        stmt = select(RagChunk)
-        if repo:
-            stmt = stmt.where(RagChunk.repo == repo)
-        if tag:
-            stmt = stmt.where(RagChunk.tag == tag)
-        result = await session.execute(stmt)
-        chunks = [row[0] for row in result.all()]
-        if acl:
-            chunks = [c for c in chunks if c.acl is None or any(scope in (c.acl or []) for scope in acl)]
-        scored = [
-            RetrievedChunk(chunk=c, score=self._cosine_similarity(embedding, c.embedding or []))
-            for c in chunks
+        candidates = await self.filter_candidates(session, repo, tag, acl)
+        stmt = select(RagChunk.id, RagChunk.embedding, RagChunk.acl)
+        if candidates is not None:
+            rows = []
+            for start in range(0, len(candidates), ID_BATCH_SIZE):
+                batch = candidates[start : start + ID_BATCH_SIZE].tolist()
+                rows.extend((await session.execute(stmt.where(RagChunk.id.in_(batch)))).all())
+        else:
+            if repo:
+                stmt = stmt.where(RagChunk.repo == repo)
+            if tag:
+                stmt = stmt.where(RagChunk.tag == tag)
+            rows = (await session.execute(stmt)).all()
+            if acl:
+                rows = [row for row in rows if self.matches_acl(row, acl)]
+        if not rows:
+            return []
+        scores = self._cosine_scores(embedding, [row.embedding for row in rows])
+        top = {rows[i].id: float(scores[i]) for i in np.argsort(-scores, kind="stable")[:k]}
+        chunks = await self.load_chunks(session, list(top))
+        return [RetrievedChunk(chunk=chunk, score=top[chunk.id]) for chunk in chunks]
+
+    async def _fallback_search_batch(
+        self,
+        session: AsyncSession,
+        requests: Sequence[SearchRequest],
+    ) -> List[List[RetrievedChunk]]:
+        candidate_sets = [
+            await self.filter_candidates(session, r.repo, r.tag, r.acl) for r in requests
+        ]
+        stmt = select(RagChunk.id, RagChunk.embedding, RagChunk.repo, RagChunk.tag, RagChunk.acl)
+        if all(candidates is not None for candidates in candidate_sets):
+            wanted = (
+                np.unique(np.concatenate(candidate_sets))
+                if candidate_sets
+                else np.empty(0, dtype=np.int64)
+            )
+            rows = []
+            for start in range(0, len(wanted), ID_BATCH_SIZE):
+                batch = wanted[start : start + ID_BATCH_SIZE].tolist()
+                rows.extend((await session.execute(stmt.where(RagChunk.id.in_(batch)))).all())
+        else:
+            rows = (await session.execute(stmt)).all()
+        if not rows:
+            return [[] for _ in requests]
+
+        # A single matrix product scores every query against every loaded row.
+        ids = np.array([row.id for row in rows], dtype=np.int64)
+        scores = self._cosine_matrix(
+            [r.embedding for r in requests], [row.embedding for row in rows]
+        )
+        top: List[dict[int, float]] = []
+        for request, candidates, row_scores in zip(requests, candidate_sets, scores, strict=True):
+            order = np.argsort(-row_scores, kind="stable")
+            if candidates is not None:
+                order = order[np.isin(ids[order], candidates)]
+            elif request.repo or request.tag or request.acl:
+                allowed = np.array(
+                    [
+                        self.matches_filters(row, request.repo, request.tag, request.acl)
+                        for row in rows
+                    ],
+                    dtype=bool,
+                )
+                order = order[allowed[order]]
+            top.append({int(ids[i]): float(row_scores[i]) for i in order[: request.k]})
+        return await self._load_batch_results(session, top)
+
+    async def _rescore(
+        self,
+        session: AsyncSession,
+        embedding: Sequence[float],
+        ids: Sequence[int],
+        k: int,
+    ) -> dict[int, float]:
+        rows = []
+        for start in range(0, len(ids), ID_BATCH_SIZE):
+            stmt = select(RagChunk.id, RagChunk.embedding).where(
+                RagChunk.id.in_(ids[start : start + ID_BATCH_SIZE])
+            )
+            rows.extend((await session.execute(stmt)).all())
+        if not rows:
+            return {}
+        scores = self._cosine_scores(embedding, [row.embedding for row in rows])
+        return {rows[i].id: float(scores[i]) for i in np.argsort(-scores, kind="stable")[:k]}
+
+    async def rebuild_ann_index(self, session: AsyncSession) -> int:
+        if self.ann_index is None:
+            return 0
+        async with self.ann_index.writer_lock():
+            return await self._rebuild_ann_index(session)
+
+    async def _rebuild_ann_index(self, session: AsyncSession) -> int:
+        # Callers hold the index's writer lock.
+        index = self.ann_index
+        loop = asyncio.get_event_loop()
+        index.reset()
+        with_embedding = RagChunk.embedding.is_not(None)
+        total = (
+            await session.execute(select(func.count()).select_from(RagChunk).where(with_embedding))
+        ).scalar_one()
+        if total >= index.training_rows:
+            # IVF centroids, int8 ranges and the PCA matrix are fit on a sample spread over the
+            # whole table.
+            sample_stmt = (
+                select(RagChunk.embedding)
+                .where(with_embedding)
+                .order_by(func.random())
+                .limit(self.settings.faiss_train_sample)
+            )
+            sample = [list(vector) for vector in (await session.execute(sample_stmt)).scalars()]
+            await loop.run_in_executor(None, index.train, sample)
+        last_id = 0
+        while True:
+            stmt = (
+                select(RagChunk.id, RagChunk.embedding)
+                .where(RagChunk.id > last_id, with_embedding)
+                .order_by(RagChunk.id)
+                .limit(REBUILD_BATCH_SIZE)
+            )
+            rows = (await session.execute(stmt)).all()
+            if not rows:
+                break
+            await loop.run_in_executor(
+                None, index.add, [row.id for row in rows], [list(row.embedding) for row in rows]
+            )
+            last_id = rows[-1].id
+        await loop.run_in_executor(None, index.save)
+        return index.ntotal
+
+    async def _catch_up_ann_index(self, session: AsyncSession, after: int) -> None:
+        # Adds committed rows above `after` that no writer has put in the index yet, e.g. rows
+        # ingested by a process that had no index loaded. Callers hold the index's writer lock.
+        index = self.ann_index
+        loop = asyncio.get_event_loop()
+        while True:
+            stmt = (
+                select(RagChunk.id)
+                .where(RagChunk.id > after, RagChunk.embedding.is_not(None))
+                .order_by(RagChunk.id)
+                .limit(REBUILD_BATCH_SIZE)
+            )
+            ids = list((await session.execute(stmt)).scalars())
+            if not ids:
+                return
+            after = ids[-1]
+            missing = index.missing(ids)
+            if missing:
+                stmt = select(RagChunk.id, RagChunk.embedding).where(RagChunk.id.in_(missing))
+                rows = (await session.execute(stmt)).all()
+                await loop.run_in_executor(
+                    None, index.add, [row.id for row in rows], [list(row.embedding) for row in rows]
+                )
+
+    async def index_chunks(
+        self,
+        session: AsyncSession,
+        chunks: Sequence[RagChunk],
+        removed: Sequence[int] = (),
+    ) -> None:
+        # `removed` are ids deleted in the same transaction that wrote `chunks`.
+        for chunk_id in removed:
+            self.chunk_cache.pop(chunk_id)
+        if self.metadata_index is not None and self.metadata_index.size:
+            self.metadata_index.remove(removed)
+            await self._sync_metadata_index(session)
+        if self.ann_index is None or not self.ann_index.is_ready:
+            # An index that was never built is rebuilt from the table on first search.
+            return
+        indexed = [
+            chunk for chunk in chunks if chunk.id is not None and chunk.embedding is not None
         ]
-        scored.sort(key=lambda r: r.score, reverse=True)
-        return scored[:k]
+        if not indexed and not removed:
+            return
+        index = self.ann_index
+        loop = asyncio.get_event_loop()
+        async with self._ann_lock, index.writer_lock():
+            # Start from what other writers saved since this process last loaded the file.
+            await loop.run_in_executor(None, index.refresh)
+            known_max = index.max_id
+            await loop.run_in_executor(None, index.remove, removed)
+            wanted = set(index.missing([chunk.id for chunk in indexed]))
+            indexed = [chunk for chunk in indexed if chunk.id in wanted]
+            await loop.run_in_executor(
+                None,
+                index.add,
+                [chunk.id for chunk in indexed],
+                [list(chunk.embedding) for chunk in indexed],
+            )
+            await self._catch_up_ann_index(session, known_max)
+            if index.needs_rebuild:
+                await self._rebuild_ann_index(session)
+            else:
+                await loop.run_in_executor(None, index.save)
+
+    async def _sync_ann_index(self, session: AsyncSession) -> None:
+        index = self.ann_index
+        loop = asyncio.get_event_loop()
+        async with self._ann_lock:
+            await loop.run_in_executor(None, index.refresh)
+            if not index.is_ready:
+                await self.rebuild_ann_index(session)
+                return
+            latest_stmt = select(func.max(RagChunk.id)).where(RagChunk.embedding.is_not(None))
+            latest = (await session.execute(latest_stmt)).scalar() or 0
+            if latest <= index.max_id:
+                return
+            async with index.writer_lock():
+                await loop.run_in_executor(None, index.refresh)
+                known_max = index.max_id
+                await self._catch_up_ann_index(session, known_max)
+                if index.max_id > known_max:
+                    await loop.run_in_executor(None, index.save)
+
+    async def _faiss_search(
+        self,
+        session: AsyncSession,
+        embedding: Sequence[float],
+        k: int,
+        repo: str | None,
+        tag: str | None,
+        acl: list[str] | None,
+        ef_search: int | None = None,
+        probes: int | None = None,
+        timings: dict[str, float] | None = None,
+    ) -> List[RetrievedChunk]:
+        index = self.ann_index
+        assert index is not None
+        await self._sync_ann_index(session)
+        if index.ntotal == 0:
+            return []
+
+        loop = asyncio.get_event_loop()
+        # Quantized or reduced vectors only rank an over-fetched pool; the final order uses
+        # full-precision scores.
+        width = k * index.rescore_factor
+        candidates = await self.filter_candidates(session, repo, tag, acl)
+        if candidates is not None:
+            coarse_start = time.perf_counter()
+            hits = await loop.run_in_executor(
+                None,
+                lambda: index.search(
+                    embedding, width, candidates, ef_search=ef_search, nprobe=probes
+                ),
+            )
+            scores = dict(hits)
+            if index.needs_rescore:
+                _record(timings, "coarse_search", coarse_start)
+                if timings is not None:
+                    timings["coarse_candidates"] = len(scores)
+                rescore_start = time.perf_counter()
+                scores = await self._rescore(session, embedding, list(scores), k)
+                _record(timings, "rescore", rescore_start)
+            chunks = await self.load_chunks(session, list(scores))
+            results = [RetrievedChunk(chunk=c, score=scores[c.id]) for c in chunks]
+            results.sort(key=lambda r: r.score, reverse=True)
+            return results[:k]
+
+        filtered = bool(repo or tag or acl)
+        fetch = width * FAISS_FILTER_OVERFETCH if filtered else width
+        while True:
+            coarse_start = time.perf_counter()
+            hits = await loop.run_in_executor(
+                None,
+                lambda fetch=fetch: index.search(
+                    embedding, fetch, ef_search=ef_search, nprobe=probes
+                ),
+            )
+            scores = dict(hits)
+            if index.needs_rescore:
+                _record(timings, "coarse_search", coarse_start)
+                if timings is not None:
+                    timings["coarse_candidates"] = len(scores)
+                rescore_start = time.perf_counter()
+                scores = await self._rescore(session, embedding, list(scores), fetch)
+                _record(timings, "rescore", rescore_start)
+            chunks = [
+                c
+                for c in await self.load_chunks(session, list(scores))
+                if self.matches_filters(c, repo, tag, acl)
+            ]
+            results = [RetrievedChunk(chunk=c, score=scores[c.id]) for c in chunks]
+            if len(results) >= k or fetch >= index.ntotal:
+                break
+            fetch = min(fetch * FAISS_FILTER_OVERFETCH, index.ntotal)
+        results.sort(key=lambda r: r.score, reverse=True)
+        return results[:k]
 
     async def search(
         self,
@@ -98,11 +668,49 @@ class Retriever:
         repo: str | None = None,
         tag: str | None = None,
         acl: list[str] | None = None,
+        ef_search: int | None = None,
+        probes: int | None = None,
+        timings: dict[str, float] | None = None,
     ) -> List[RetrievedChunk]:
-        dialect = session.bind.dialect if session.bind else None
-        if dialect and dialect.name == "postgresql":
+        if self.ann_index is not None:
+            return await self._faiss_search(
+                session, embedding, k, repo, tag, acl, ef_search, probes, timings
+            )
+        if self._uses_pgvector(session):
             try:
-                return await self._postgres_vector_search(session, embedding, k, repo, tag, acl)
+                # A failed statement aborts the whole Postgres transaction; the savepoint rolls back
+                # just this attempt so the fallback can still query.
+                async with session.begin_nested():
+                    return await self._postgres_vector_search(
+                        session, embedding, k, repo, tag, acl, ef_search, probes, timings
+                    )
             except Exception:
                 return await self._fallback_search(session, embedding, k, repo, tag, acl)
         return await self._fallback_search(session, embedding, k, repo, tag, acl)
+
+    async def search_batch(
+        self,
+        session: AsyncSession,
+        requests: Sequence[SearchRequest],
+    ) -> List[List[RetrievedChunk]]:
+        if not requests:
+            return []
+        if self.ann_index is not None:
+            return [
+                await self._faiss_search(
+                    session, r.embedding, r.k, r.repo, r.tag, r.acl, r.ef_search, r.probes
+                )
+                for r in requests
+            ]
+        if self._uses_pgvector(session):
+            try:
+                async with session.begin_nested():
+                    return await self._postgres_vector_search_batch(session, requests)
+            except Exception:
+                return await self._fallback_search_batch(session, requests)
+        return await self._fallback_search_batch(session, requests)
+
+    @staticmethod
+    def _uses_pgvector(session: AsyncSession) -> bool:
+        dialect = session.bind.dialect if session.bind else None
+        return dialect is not None and dialect.name == "postgresql"
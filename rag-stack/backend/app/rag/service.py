@@ -1,13 +1,21 @@
 from __future__ import annotations
 
+import asyncio
 import time
-from dataclasses import dataclass
-from typing import List, Sequence
+from collections import defaultdict
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import AsyncIterator, List, Sequence
 
+from sqlalchemy import delete, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..config import Settings
-from ..models import RagChunk
+from ..ingest.manifest import DocumentUpdate, SyncResult, get_manifest_entry, in_scope, reusable
+from ..logging_conf import get_logger
+from ..models import IngestManifest, RagChunk
+from .bulk_insert import insert_chunks
+from .cache import SemanticCache
 from .clients import (
     ClaudeClient,
     CompletionMessage,
@@ -15,10 +23,17 @@ from .clients import (
     get_claude_client,
     get_openai_client,
 )
-from .embeddings import EmbeddingProvider
+from .deadline import Deadline
+from .embeddings import EmbeddingProvider, normalize_question
+from .hybrid import HybridRetriever
 from .prompt import build_prompt
-from .retriever import RetrievedChunk, Retriever
+from .retriever import ID_BATCH_SIZE, RetrievedChunk, Retriever, SearchRequest
 from .rerank import Reranker
+from .singleflight import SingleFlight
+
+NO_CONTEXT_ANSWER = "No encontré información suficiente en la base de conocimiento."
+
+logger = get_logger(__name__)
 
 
 @dataclass
@@ -29,6 +44,32 @@ class AskResult:
     timings: dict
 
 
+@dataclass
+class AskQuery:
+    question: str
+    k: int = 8
+    repo: str | None = None
+    tag: str | None = None
+    acl: List[str] | None = None
+    provider: str | None = None
+    ef_search: int | None = None
+    probes: int | None = None
+    deadline_ms: int | None = None
+
+
+@dataclass
+class _AskContext:
+    query: AskQuery
+    embedding: List[float]
+    timings: dict
+    deadline: Deadline
+    started_at: float
+    chunks: List[RagChunk] = field(default_factory=list)
+    scores: List[float] = field(default_factory=list)
+    cache_scope: tuple | None = None
+    cached: AskResult | None = None
+
+
 class RAGService:
     def __init__(
         self,
@@ -37,13 +78,34 @@ class RAGService:
         retriever: Retriever,
         reranker: Reranker | None = None,
         client: ClaudeClient | OpenAIClient | None = None,
+        hybrid: HybridRetriever | None = None,
     ) -> None:
         self.settings = settings
         self.embeddings = embeddings
         self.retriever = retriever
         self.reranker = reranker
+        self.hybrid = hybrid
         self._client_override = client
         self._clients: dict[str, ClaudeClient | OpenAIClient] = {}
+        self.answer_cache: SemanticCache[AskResult] | None = None
+        if settings.enable_answer_cache:
+            ttl = settings.answer_cache_ttl or None
+            self.answer_cache = SemanticCache(
+                settings.answer_cache_size, settings.answer_cache_threshold, ttl=ttl
+            )
+        self.inflight: SingleFlight[tuple, AskResult] | None = (
+            SingleFlight() if settings.coalesce_requests else None
+        )
+
+    async def close(self) -> None:
+        # Model worker processes are not daemons; without this they outlive a shutdown or reload.
+        loop = asyncio.get_running_loop()
+        for component in (self.embeddings, self.reranker):
+            pool = getattr(component, "worker_pool", None)
+            if pool is not None:
+                await loop.run_in_executor(None, pool.shutdown)
+        if self.hybrid:
+            await self.hybrid.close()
 
     async def ask(
         self,
@@ -54,69 +116,389 @@ class RAGService:
         tag: str | None = None,
         acl: Sequence[str] | None = None,
         provider: str | None = None,
+        ef_search: int | None = None,
+        probes: int | None = None,
+        bypass_cache: bool = False,
+        deadline_ms: int | None = None,
     ) -> AskResult:
+        query = AskQuery(
+            question=question,
+            k=k,
+            repo=repo,
+            tag=tag,
+            acl=list(acl) if acl else None,
+            provider=provider,
+            ef_search=ef_search,
+            probes=probes,
+            deadline_ms=deadline_ms,
+        )
+        if self.inflight is None or bypass_cache:
+            # A caller bypassing the cache wants its own fresh run, not someone else's in-flight
+            # answer.
+            return await self._ask(session, query, bypass_cache)
+        # Identical questions already in flight share one pipeline run instead of repeating it.
+        key = (
+            normalize_question(question),
+            k,
+            repo,
+            tag,
+            tuple(sorted(set(acl or []))),
+            (provider or self.settings.default_llm_provider).lower(),
+            ef_search,
+            probes,
+            # The deadline decides which stages run, so requests with different budgets differ.
+            deadline_ms or self.settings.ask_deadline_ms,
+        )
+        result, coalesced = await self.inflight.run(
+            key, lambda: self._ask(session, query, bypass_cache)
+        )
+        if coalesced:
+            result = replace(result, timings={**result.timings, "coalesced": True})
+        return result
+
+    async def _ask(self, session: AsyncSession, query: AskQuery, bypass_cache: bool) -> AskResult:
+        context = await self._build_context(session, query, bypass_cache)
+        if context.cached is not None:
+            return context.cached
+        result = await self._generate(
+            context.query, context.chunks, context.scores, context.timings, context.deadline
+        )
+        self._remember(context, result)
+        return result
+
+    async def ask_stream(
+        self,
+        session: AsyncSession,
+        query: AskQuery,
+        bypass_cache: bool = False,
+    ) -> AsyncIterator[dict]:
+        # Everything that needs the session runs here; the returned iterator only talks to the LLM.
+        context = await self._build_context(session, query, bypass_cache)
+        return self._stream_events(context)
+
+    async def _build_context(
+        self, session: AsyncSession, query: AskQuery, bypass_cache: bool
+    ) -> _AskContext:
+        started_at = time.perf_counter()
+        query = replace(query, acl=[scope for scope in (query.acl or []) if scope] or None)
+        deadline = Deadline(query.deadline_ms or self.settings.ask_deadline_ms)
         timings: dict[str, float] = {}
-        start = time.perf_counter()
-        query_embedding = await self.embeddings.embed_query(question)
-        timings["embedding"] = time.perf_counter() - start
+        query_embedding = await self.embeddings.embed_query(query.question)
+        timings["embedding"] = time.perf_counter() - started_at
+        context = _AskContext(
+            query=query,
+            embedding=query_embedding,
+            timings=timings,
+            deadline=deadline,
+            started_at=started_at,
+        )
+
+        if self.answer_cache is not None and not bypass_cache:
+            context.cache_scope = (
+                query.repo,
+                query.tag,
+                tuple(sorted(query.acl or [])),
+                (query.provider or self.settings.default_llm_provider).lower(),
+                query.k,
+                await self.retriever.corpus_generation(session),
+            )
+            lookup_start = time.perf_counter()
+            cached = self.answer_cache.get(context.cache_scope, query_embedding)
+            timings["cache_lookup"] = time.perf_counter() - lookup_start
+            if cached is not None:
+                result, similarity = cached
+                timings["cache_hit"] = True
+                timings["cache_similarity"] = similarity
+                context.cached = replace(result, usage=dict(result.usage), timings=timings)
+                return context
+            timings["cache_hit"] = False
 
         retrieve_start = time.perf_counter()
-        acl_filters = [scope for scope in (acl or []) if scope]
         retrieved = await self.retriever.search(
             session=session,
             embedding=query_embedding,
-            k=k,
-            repo=repo,
-            tag=tag,
-            acl=acl_filters or None,
+            k=self._candidate_count(query.k),
+            repo=query.repo,
+            tag=query.tag,
+            acl=query.acl,
+            ef_search=query.ef_search,
+            probes=query.probes,
+            timings=timings,
         )
         timings["retrieval"] = time.perf_counter() - retrieve_start
 
-        if not retrieved:
-            return AskResult(
-                answer="No encontré información suficiente en la base de conocimiento.",
-                sources=[],
-                usage={},
-                timings=timings,
+        context.chunks, context.scores = await self._prepare_context(
+            session, query, retrieved, timings, deadline
+        )
+        return context
+
+    def _remember(self, context: _AskContext, result: AskResult) -> None:
+        if context.cache_scope is None or not result.sources or context.deadline.skipped:
+            return
+        self.answer_cache.put(
+            context.cache_scope,
+            context.embedding,
+            replace(result, usage=dict(result.usage), timings={}),
+        )
+
+    async def _stream_events(self, context: _AskContext) -> AsyncIterator[dict]:
+        query, timings, deadline = context.query, context.timings, context.deadline
+        if context.cached is not None:
+            result = context.cached
+            yield {"event": "sources", "data": result.sources}
+            yield {"event": "token", "data": {"text": result.answer}}
+            yield {"event": "done", "data": {"usage": result.usage, "timings": result.timings}}
+            return
+
+        sources = self._sources(context.chunks, context.scores)
+        yield {"event": "sources", "data": sources}
+        max_tokens = self._generation_tokens(timings, deadline) if context.chunks else None
+        if max_tokens is None:
+            answer = (
+                self._extractive_answer(context.chunks) if context.chunks else NO_CONTEXT_ANSWER
+            )
+            self._record_deadline(timings, deadline)
+            yield {"event": "token", "data": {"text": answer}}
+            yield {"event": "done", "data": {"usage": {}, "timings": timings}}
+            return
+
+        prompt = build_prompt(self.settings, query.question, context.chunks)
+        gen_start = time.perf_counter()
+        parts: List[str] = []
+        usage: dict = {}
+        async for chunk in self._get_client(query.provider).stream(prompt, max_tokens=max_tokens):
+            if chunk.text:
+                if not parts:
+                    timings["time_to_first_token"] = time.perf_counter() - context.started_at
+                parts.append(chunk.text)
+                yield {"event": "token", "data": {"text": chunk.text}}
+            if chunk.usage:
+                usage = dict(chunk.usage)
+        timings["generation"] = time.perf_counter() - gen_start
+        self._record_deadline(timings, deadline)
+        usage = self._with_cost(query.provider, usage)
+        self._remember(
+            context,
+            AskResult(answer="".join(parts).strip(), sources=sources, usage=usage, timings=timings),
+        )
+        yield {"event": "done", "data": {"usage": usage, "timings": timings}}
+
+    async def ask_batch(
+        self, session: AsyncSession, queries: Sequence[AskQuery]
+    ) -> List[AskResult | Exception]:
+        # Embedding and retrieval are shared calls; each item reports the duration of the shared
+        # step. A failed generation is returned in place of that item's result. Batches skip the
+        # answer cache and request coalescing: items are embedded as documents in one call, not
+        # through the per-question path those key on.
+        if not queries:
+            return []
+        queries = [
+            replace(query, acl=[scope for scope in (query.acl or []) if scope] or None)
+            for query in queries
+        ]
+        deadlines = [
+            Deadline(query.deadline_ms or self.settings.ask_deadline_ms) for query in queries
+        ]
+        start = time.perf_counter()
+        embeddings = await self.embeddings.embed_documents([query.question for query in queries])
+        embedding_time = time.perf_counter() - start
+
+        retrieve_start = time.perf_counter()
+        retrieved = await self.retriever.search_batch(
+            session,
+            [
+                SearchRequest(
+                    embedding=embedding,
+                    k=self._candidate_count(query.k),
+                    repo=query.repo,
+                    tag=query.tag,
+                    acl=query.acl,
+                    ef_search=query.ef_search,
+                    probes=query.probes,
+                )
+                for query, embedding in zip(queries, embeddings, strict=True)
+            ],
+        )
+        retrieval_time = time.perf_counter() - retrieve_start
+
+        # The session is not safe for concurrent use: hybrid and rerank run in order, generation in
+        # parallel.
+        prepared = []
+        for query, hits, deadline in zip(queries, retrieved, deadlines, strict=True):
+            timings = {
+                "embedding": embedding_time,
+                "retrieval": retrieval_time,
+                "batch_size": len(queries),
+            }
+            chunks, scores = await self._prepare_context(session, query, hits, timings, deadline)
+            prepared.append((query, chunks, scores, timings, deadline))
+
+        semaphore = asyncio.Semaphore(max(1, self.settings.ask_batch_concurrency))
+
+        async def generate(query, chunks, scores, timings, deadline) -> AskResult:
+            async with semaphore:
+                return await self._generate(query, chunks, scores, timings, deadline)
+
+        results = await asyncio.gather(
+            *(generate(*item) for item in prepared), return_exceptions=True
+        )
+        for position, result in enumerate(results):
+            if isinstance(result, Exception):
+                logger.warning("ask_batch_item_failed", position=position, error=repr(result))
+            elif isinstance(result, BaseException):
+                raise result
+        return list(results)
+
+    async def _prepare_context(
+        self,
+        session: AsyncSession,
+        query: AskQuery,
+        retrieved: List[RetrievedChunk],
+        timings: dict,
+        deadline: Deadline,
+    ) -> tuple[List[RagChunk], List[float]]:
+        if self.hybrid and deadline.allows("hybrid", self.settings.hybrid_min_budget_ms):
+            hybrid_start = time.perf_counter()
+            fused = await self.hybrid.search(
+                session,
+                query.question,
+                retrieved,
+                k=self._candidate_count(query.k),
+                repo=query.repo,
+                tag=query.tag,
+                acl=query.acl,
             )
+            retrieved = [RetrievedChunk(chunk=item.chunk, score=item.score) for item in fused]
+            timings["hybrid"] = time.perf_counter() - hybrid_start
 
         chunks = [item.chunk for item in retrieved]
         scores = [item.score for item in retrieved]
+        timings["candidates_retrieved"] = len(chunks)
 
-        if self.reranker:
+        if (
+            self.reranker
+            and chunks
+            and deadline.allows("rerank", self.settings.rerank_min_budget_ms)
+        ):
+            # Cascade: the bi-encoder (plus BM25 when hybrid) score prunes the pool before the
+            # cross-encoder.
+            limit = self.settings.rerank_candidates
+            if limit > 0 and len(chunks) > limit:
+                prune_start = time.perf_counter()
+                ranked = sorted(zip(chunks, scores, strict=True), key=lambda x: x[1], reverse=True)[
+                    : max(limit, query.k)
+                ]
+                chunks = [c for c, _ in ranked]
+                scores = [s for _, s in ranked]
+                timings["prune"] = time.perf_counter() - prune_start
+            timings["candidates_reranked"] = len(chunks)
             rerank_start = time.perf_counter()
-            rerank_scores = await self.reranker.rerank(question, [chunk.content for chunk in chunks])
+            rerank_scores = await self.reranker.rerank(
+                query.question,
+                [chunk.content for chunk in chunks],
+                ids=[chunk.id for chunk in chunks],
+            )
             timings["rerank"] = time.perf_counter() - rerank_start
             combined = list(zip(chunks, rerank_scores))
             combined.sort(key=lambda x: x[1], reverse=True)
-            chunks = [c for c, _ in combined[:k]]
-            scores = [float(score) for _, score in combined[:k]]
+            chunks = [c for c, _ in combined[: query.k]]
+            scores = [float(score) for _, score in combined[: query.k]]
+        elif len(chunks) > query.k:
+            # Over-fetched for a rerank that did not run.
+            ranked = sorted(zip(chunks, scores, strict=True), key=lambda x: x[1], reverse=True)[
+                : query.k
+            ]
+            chunks = [c for c, _ in ranked]
+            scores = [s for _, s in ranked]
+        return chunks, scores
 
-        prompt = build_prompt(self.settings, question, chunks)
-        gen_start = time.perf_counter()
-        client = self._get_client(provider)
-        completion: CompletionMessage = await client.complete(prompt)
-        timings["generation"] = time.perf_counter() - gen_start
+    @staticmethod
+    def _record_deadline(timings: dict, deadline: Deadline) -> None:
+        if not deadline.enabled:
+            return
+        timings["deadline_ms"] = deadline.budget_ms
+        timings["deadline_remaining_ms"] = deadline.remaining_ms()
+        timings["skipped"] = list(deadline.skipped)
 
-        usage = completion.usage
-        input_tokens = usage.get("input_tokens") or 0
-        output_tokens = usage.get("output_tokens") or 0
-        estimated_cost = self._estimate_cost(provider, input_tokens, output_tokens)
-        if estimated_cost is not None:
-            usage["estimated_cost_usd"] = round(estimated_cost, 6)
+    @staticmethod
+    def _extractive_answer(chunks: Sequence[RagChunk]) -> str:
+        lines = ["Respuesta parcial por límite de tiempo; fragmentos más relevantes:"]
+        for chunk in chunks[:3]:
+            preview = " ".join(chunk.content.split())[:300]
+            lines.append(f"- {preview} ({chunk.path or 'desconocido'})")
+        return "\n".join(lines)
 
-        sources = []
-        for chunk, score in zip(chunks, scores):
-            path = chunk.path or "desconocido"
-            sources.append({"path": path, "score": float(score)})
+    def _candidate_count(self, k: int) -> int:
+        # Over-fetch only pays off when a reranker gets to reorder the wider pool.
+        if self.reranker is None:
+            return k
+        return k * max(1, self.settings.rerank_fanout)
+
+    async def _generate(
+        self,
+        query: AskQuery,
+        chunks: List[RagChunk],
+        scores: List[float],
+        timings: dict,
+        deadline: Deadline,
+    ) -> AskResult:
+        if not chunks:
+            self._record_deadline(timings, deadline)
+            return AskResult(answer=NO_CONTEXT_ANSWER, sources=[], usage={}, timings=timings)
+
+        sources = self._sources(chunks, scores)
+        max_tokens = self._generation_tokens(timings, deadline)
+        if max_tokens is None:
+            self._record_deadline(timings, deadline)
+            return AskResult(
+                answer=self._extractive_answer(chunks), sources=sources, usage={}, timings=timings
+            )
+
+        prompt = build_prompt(self.settings, query.question, chunks)
+        gen_start = time.perf_counter()
+        client = self._get_client(query.provider)
+        completion: CompletionMessage = await client.complete(prompt, max_tokens=max_tokens)
+        timings["generation"] = time.perf_counter() - gen_start
+        self._record_deadline(timings, deadline)
 
         return AskResult(
             answer=completion.text.strip(),
             sources=sources,
-            usage=usage,
+            usage=self._with_cost(query.provider, completion.usage),
             timings=timings,
         )
 
+    def _generation_tokens(self, timings: dict, deadline: Deadline) -> int | None:
+        # None means the deadline leaves no room for the LLM at all.
+        max_tokens = self.settings.max_tokens
+        if not deadline.enabled:
+            return max_tokens
+        # Whatever budget is left after the fixed request overhead bounds how many tokens we can
+        # wait for.
+        budget_ms = deadline.remaining_ms() - self.settings.generation_overhead_ms
+        max_tokens = min(max_tokens, int(budget_ms / self.settings.generation_ms_per_token))
+        if max_tokens < self.settings.generation_min_tokens:
+            deadline.skipped.append("generation")
+            return None
+        timings["max_tokens"] = max_tokens
+        return max_tokens
+
+    @staticmethod
+    def _sources(chunks: Sequence[RagChunk], scores: Sequence[float]) -> List[dict]:
+        sources = []
+        for chunk, score in zip(chunks, scores, strict=True):
+            path = chunk.path or "desconocido"
+            sources.append({"path": path, "score": float(score)})
+        return sources
+
+    def _with_cost(self, provider: str | None, usage: dict) -> dict:
+        input_tokens = usage.get("input_tokens") or 0
+        output_tokens = usage.get("output_tokens") or 0
+        estimated_cost = self._estimate_cost(provider, input_tokens, output_tokens)
+        if estimated_cost is not None:
+            usage["estimated_cost_usd"] = round(estimated_cost, 6)
+        return usage
+
     async def ingest_chunks(
         self,
         session: AsyncSession,
@@ -124,8 +506,146 @@ class RAGService:
     ) -> None:
         for chunk, embedding in docs:
             chunk.embedding = embedding
-            session.add(chunk)
+        chunks = [chunk for chunk, _ in docs]
+        await insert_chunks(session, chunks)
         await session.commit()
+        await self._index_written(session, chunks)
+
+    async def sync_documents(
+        self, session: AsyncSession, docs: Sequence[DocumentUpdate]
+    ) -> SyncResult:
+        # Replaces what the manifest holds for each file, all in one transaction: chunks whose
+        # content is unchanged keep their row and embedding, the others are inserted or deleted.
+        started = time.perf_counter()
+        result = SyncResult()
+        plans = [await self._plan_sync(session, doc, result) for doc in docs]
+        missing = [
+            (doc, position)
+            for doc, _, _, added, *_ in plans
+            for position in added
+            if doc.embeddings[position] is None
+        ]
+        if missing:
+            vectors = await self.embeddings.embed_documents(
+                [doc.chunks[position].content for doc, position in missing]
+            )
+            for (doc, position), vector in zip(missing, vectors, strict=True):
+                doc.embeddings[position] = vector
+
+        removed = sorted(chunk_id for *_, stale, _ in plans for chunk_id in stale)
+        moved = [chunk_id for *_, moved_ids in plans for chunk_id in moved_ids]
+        await self._delete_chunks(session, removed)
+        written: list[RagChunk] = []
+        for doc, _, _, added, *_ in plans:
+            for position in added:
+                doc.chunks[position].embedding = doc.embeddings[position]
+                written.append(doc.chunks[position])
+        await insert_chunks(session, written)
+        for doc, entry, manifest, added, *_ in plans:
+            for position in added:
+                manifest[position][1] = doc.chunks[position].id
+            if entry is None:
+                entry = IngestManifest(
+                    path=doc.path, repo=doc.repo, tag=doc.tag, version=doc.version
+                )
+                session.add(entry)
+            entry.file_hash = doc.file_hash
+            entry.acl = doc.acl
+            entry.chunks = manifest
+            entry.updated_at = datetime.utcnow()
+        await session.commit()
+
+        result.added, result.removed = len(written), len(removed)
+        result.seconds = time.perf_counter() - started
+        # Moved rows keep their id but their metadata changed, so cached copies are stale.
+        for chunk_id in moved:
+            self.retriever.chunk_cache.pop(chunk_id)
+        if written or removed or moved:
+            await self._index_written(session, written, removed)
+        return result
+
+    async def _plan_sync(
+        self,
+        session: AsyncSession,
+        doc: DocumentUpdate,
+        result: SyncResult,
+    ) -> tuple[DocumentUpdate, IngestManifest | None, list[list], list[int], set[int], list[int]]:
+        # Matches the file's new chunks against its manifest by content hash.
+        entry = await get_manifest_entry(session, doc.path, doc.repo, doc.tag, doc.version)
+        if entry is None:
+            # First sync of this file; rows from ingests that predate the manifest are replaced.
+            scope = in_scope(RagChunk, doc.repo, doc.tag, doc.version)
+            stmt = select(RagChunk.id).where(RagChunk.path == doc.path, *scope)
+            stale = set((await session.execute(stmt)).scalars())
+        else:
+            stale = {chunk_id for _, chunk_id, _ in entry.chunks}
+        existing: dict[str, list[tuple[int, int | None]]] = defaultdict(list)
+        if reusable(entry, doc.acl):
+            for chunk_hash, chunk_id, start in entry.chunks:
+                existing[chunk_hash].append((chunk_id, start))
+
+        manifest: list[list] = []
+        added: list[int] = []
+        moved: list[dict] = []
+        for position, (chunk, chunk_hash) in enumerate(zip(doc.chunks, doc.hashes, strict=True)):
+            start = (chunk.meta or {}).get("start_index")
+            if existing.get(chunk_hash):
+                chunk_id, previous_start = existing[chunk_hash].pop(0)
+                stale.discard(chunk_id)
+                if previous_start != start:
+                    # Same text at a new offset (e.g. a paragraph was inserted above it).
+                    moved.append({"id": chunk_id, "meta": chunk.meta})
+                manifest.append([chunk_hash, chunk_id, start])
+                result.reused += 1
+            else:
+                manifest.append([chunk_hash, None, start])
+                added.append(position)
+        if moved:
+            await session.execute(update(RagChunk), moved)
+        return doc, entry, manifest, added, stale, [row["id"] for row in moved]
+
+    async def remove_documents(
+        self, session: AsyncSession, entries: Sequence[IngestManifest]
+    ) -> int:
+        # Drops files that no longer exist at the source, with their chunks, in one transaction.
+        removed = sorted({chunk_id for entry in entries for _, chunk_id, _ in entry.chunks})
+        await self._delete_chunks(session, removed)
+        for entry in entries:
+            await session.delete(entry)
+        await session.commit()
+        if removed:
+            await self._index_written(session, [], removed)
+        return len(removed)
+
+    @staticmethod
+    async def _delete_chunks(session: AsyncSession, ids: Sequence[int]) -> None:
+        for start in range(0, len(ids), ID_BATCH_SIZE):
+            await session.execute(
+                delete(RagChunk).where(RagChunk.id.in_(ids[start : start + ID_BATCH_SIZE]))
+            )
+
+    async def _index_written(
+        self,
+        session: AsyncSession,
+        chunks: Sequence[RagChunk],
+        removed: Sequence[int] = (),
+    ) -> None:
+        await self.retriever.index_chunks(session, chunks, removed)
+        if self.hybrid:
+            await self.hybrid.index_chunks(chunks, removed)
+
+    def cache_stats(self) -> dict:
+        stats = {"chunks": self.retriever.chunk_cache.stats()}
+        embedding_stats = getattr(self.embeddings, "cache_stats", None)
+        if embedding_stats is not None:
+            stats["query_embeddings"] = embedding_stats()
+        if self.reranker is not None:
+            stats["rerank_scores"] = self.reranker.cache.stats()
+        if self.answer_cache is not None:
+            stats["answers"] = self.answer_cache.stats()
+        if self.inflight is not None:
+            stats["in_flight_asks"] = self.inflight.stats()
+        return stats
 
     def _get_client(self, provider: str | None) -> ClaudeClient | OpenAIClient:
         if self._client_override:
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class SingleFlight(Generic[K, V]):
+    # Dedupes concurrent calls with the same key: the first caller runs, the others await its
+    # outcome. Nothing is kept once the call finishes, so this never serves stale results.
+    def __init__(self) -> None:
+        self.coalesced = 0
+        self._calls: dict[K, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def run(self, key: K, call: Callable[[], Awaitable[V]]) -> tuple[V, bool]:
+        while (pending := self._calls.get(key)) is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending), True
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The leading caller was cancelled (e.g. its client disconnected); take over.
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Retrieve it once so asyncio doesn't log it when nobody was waiting.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._calls.pop(key, None)
+
+    def stats(self) -> dict[str, int]:
+        return {"coalesced": self.coalesced, "in_flight": len(self._calls)}
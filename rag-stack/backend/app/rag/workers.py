@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, List, Sequence
+
+import numpy as np
+
+# Set once per worker process by the pool initializer.
+_MODEL: Any = None
+
+
+def _init_worker(loader: Callable[[], Any]) -> None:
+    global _MODEL
+    _MODEL = loader()
+
+
+def _attach(name: str) -> SharedMemory:
+    # The parent creates, tracks and unlinks every block; workers only map it. Spawned workers share
+    # the parent's resource tracker, so attaching on older Pythons re-registers a name it already
+    # holds.
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+    return SharedMemory(name=name)
+
+
+def pack_texts(texts: Sequence[str]) -> tuple[SharedMemory, int]:
+    # Layout: int64 offsets (n + 1) followed by the concatenated UTF-8 bytes.
+    encoded = [text.encode("utf-8") for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    header = offsets.nbytes
+    shm = SharedMemory(create=True, size=max(1, header + int(offsets[-1])))
+    shm.buf[:header] = offsets.tobytes()
+    shm.buf[header : header + int(offsets[-1])] = b"".join(encoded)
+    return shm, len(encoded)
+
+
+def unpack_texts(buf: memoryview, count: int) -> List[str]:
+    offsets = np.frombuffer(buf, dtype=np.int64, count=count + 1)
+    header = offsets.nbytes
+    data = bytes(buf[header : header + int(offsets[-1])])
+    return [data[offsets[i] : offsets[i + 1]].decode("utf-8") for i in range(count)]
+
+
+def _dimension_task() -> int:
+    return int(_MODEL.get_sentence_embedding_dimension())
+
+
+def _encode_task(input_name: str, count: int, output_name: str, dim: int, batch_size: int) -> None:
+    source, target = _attach(input_name), _attach(output_name)
+    try:
+        texts = unpack_texts(source.buf, count)
+        vectors = _MODEL.encode(
+            texts,
+            batch_size=batch_size,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=False,
+        )
+        np.ndarray((count, dim), dtype=np.float32, buffer=target.buf)[:] = vectors
+    finally:
+        source.close()
+        target.close()
+
+
+def _predict_task(input_name: str, count: int, output_name: str, batch_size: int) -> None:
+    # Texts are [query, doc_1, ..., doc_n]; scores are written for each (query, doc) pair.
+    source, target = _attach(input_name), _attach(output_name)
+    try:
+        query, *documents = unpack_texts(source.buf, count)
+        scores = _MODEL.predict(
+            [(query, doc) for doc in documents], batch_size=batch_size, show_progress_bar=False
+        )
+        np.ndarray((len(documents),), dtype=np.float32, buffer=target.buf)[:] = scores
+    finally:
+        source.close()
+        target.close()
+
+
+class ModelWorkerPool:
+    def __init__(self, loader: Callable[[], Any], workers: int) -> None:
+        # spawn: torch and tokenizers are not fork-safe once threads exist.
+        self._executor = ProcessPoolExecutor(
+            max_workers=max(1, workers),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(loader,),
+        )
+        self._dimension: int | None = None
+
+    async def encode(self, texts: Sequence[str], batch_size: int) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        loop = asyncio.get_event_loop()
+        if self._dimension is None:
+            self._dimension = await loop.run_in_executor(self._executor, _dimension_task)
+        dim = self._dimension
+        source, count = pack_texts(texts)
+        target = SharedMemory(create=True, size=count * dim * 4)
+        try:
+            await loop.run_in_executor(
+                self._executor, _encode_task, source.name, count, target.name, dim, batch_size
+            )
+            return np.ndarray((count, dim), dtype=np.float32, buffer=target.buf).copy()
+        finally:
+            self._release(source, target)
+
+    async def predict(
+        self, query: str, documents: Sequence[str], batch_size: int = 32
+    ) -> np.ndarray:
+        if not documents:
+            return np.zeros(0, dtype=np.float32)
+        loop = asyncio.get_event_loop()
+        source, count = pack_texts([query, *documents])
+        target = SharedMemory(create=True, size=len(documents) * 4)
+        try:
+            await loop.run_in_executor(
+                self._executor, _predict_task, source.name, count, target.name, batch_size
+            )
+            return np.ndarray((len(documents),), dtype=np.float32, buffer=target.buf).copy()
+        finally:
+            self._release(source, target)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def _release(*blocks: SharedMemory) -> None:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
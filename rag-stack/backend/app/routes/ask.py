@@ -1,21 +1,67 @@
 from __future__ import annotations
 
-from typing import Optional
+from typing import Annotated, AsyncIterator, Optional
 
-from fastapi import APIRouter, Depends, Query
+import orjson
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..auth import require_api_key
 from ..deps import get_rag_service, get_session
-from ..schemas import AskRequest, AskResponse, LLMProvider
+from ..rag.service import AskQuery
+from ..schemas import (
+    AskBatchError,
+    AskBatchRequest,
+    AskBatchResponse,
+    AskRequest,
+    AskResponse,
+    LLMProvider,
+)
 
 router = APIRouter(prefix="/ask", tags=["ask"], dependencies=[Depends(require_api_key)])
+DeadlineHeader = Annotated[Optional[int], Header(alias="x-deadline-ms", ge=1, le=600_000)]
+BATCH_ITEM_ERROR = "No se pudo generar la respuesta para esta consulta."
 
 
 def _build_response(result) -> AskResponse:
     return AskResponse(answer=result.answer, sources=result.sources, usage=result.usage, timings=result.timings)
 
 
+def _query_from_request(request: AskRequest, deadline_ms: int | None = None) -> AskQuery:
+    return AskQuery(
+        question=request.q,
+        k=request.k,
+        repo=request.repo,
+        tag=request.tag,
+        acl=request.acl,
+        provider=request.provider.value if request.provider else None,
+        ef_search=request.ef_search,
+        probes=request.probes,
+        deadline_ms=request.deadline_ms or deadline_ms,
+    )
+
+
+async def _sse(events: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    async for event in events:
+        yield (
+            b"event: "
+            + event["event"].encode()
+            + b"\ndata: "
+            + orjson.dumps(event["data"])
+            + b"\n\n"
+        )
+
+
+def _stream_response(events: AsyncIterator[dict]) -> StreamingResponse:
+    # X-Accel-Buffering stops nginx from holding tokens back until the response ends.
+    return StreamingResponse(
+        _sse(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("", response_model=AskResponse)
 async def ask_get(
     q: str = Query(..., min_length=3, max_length=2048),
@@ -24,7 +70,11 @@ async def ask_get(
     tag: Optional[str] = Query(None),
     acl: Optional[str] = Query(None),
     session: AsyncSession = Depends(get_session),
-    provider: Optional[LLMProvider] = Query(None),
+    provider: Annotated[Optional[LLMProvider], Query()] = None,
+    ef_search: Annotated[Optional[int], Query(ge=1, le=1000)] = None,
+    probes: Annotated[Optional[int], Query(ge=1, le=1000)] = None,
+    bypass_cache: Annotated[bool, Query()] = False,
+    deadline_ms: DeadlineHeader = None,
 ):
     rag_service = await get_rag_service()
     acl_list = [scope.strip() for scope in acl.split(",") if scope.strip()] if acl else None
@@ -36,6 +86,10 @@ async def ask_get(
         tag=tag,
         acl=acl_list,
         provider=provider.value if provider else None,
+        ef_search=ef_search,
+        probes=probes,
+        bypass_cache=bypass_cache,
+        deadline_ms=deadline_ms,
     )
     return _build_response(result)
 
@@ -44,6 +98,7 @@ async def ask_get(
 async def ask_post(
     request: AskRequest,
     session: AsyncSession = Depends(get_session),
+    deadline_ms: DeadlineHeader = None,
 ):
     rag_service = await get_rag_service()
     result = await rag_service.ask(
@@ -54,5 +109,77 @@ async def ask_post(
         tag=request.tag,
         acl=request.acl,
         provider=request.provider.value if request.provider else None,
+        ef_search=request.ef_search,
+        probes=request.probes,
+        bypass_cache=request.bypass_cache,
+        deadline_ms=request.deadline_ms or deadline_ms,
     )
     return _build_response(result)
+
+
+@router.post("/batch", response_model=AskBatchResponse)
+async def ask_batch(
+    request: AskBatchRequest,
+    session: AsyncSession = Depends(get_session),
+    deadline_ms: DeadlineHeader = None,
+):
+    rag_service = await get_rag_service()
+    results = await rag_service.ask_batch(
+        session,
+        [_query_from_request(item, deadline_ms) for item in request.requests],
+    )
+    return AskBatchResponse(
+        results=[
+            AskBatchError(error=BATCH_ITEM_ERROR)
+            if isinstance(result, Exception)
+            else _build_response(result)
+            for result in results
+        ]
+    )
+
+
+@router.get("/stream")
+async def ask_stream_get(
+    q: str = Query(..., min_length=3, max_length=2048),
+    k: int = Query(8, ge=1, le=20),
+    repo: Optional[str] = Query(None),
+    tag: Optional[str] = Query(None),
+    acl: Optional[str] = Query(None),
+    session: AsyncSession = Depends(get_session),
+    provider: Annotated[Optional[LLMProvider], Query()] = None,
+    ef_search: Annotated[Optional[int], Query(ge=1, le=1000)] = None,
+    probes: Annotated[Optional[int], Query(ge=1, le=1000)] = None,
+    bypass_cache: Annotated[bool, Query()] = False,
+    deadline_ms: DeadlineHeader = None,
+):
+    rag_service = await get_rag_service()
+    acl_list = [scope.strip() for scope in acl.split(",") if scope.strip()] if acl else None
+    events = await rag_service.ask_stream(
+        session,
+        AskQuery(
+            question=q,
+            k=k,
+            repo=repo,
+            tag=tag,
+            acl=acl_list,
+            provider=provider.value if provider else None,
+            ef_search=ef_search,
+            probes=probes,
+            deadline_ms=deadline_ms,
+        ),
+        bypass_cache=bypass_cache,
+    )
+    return _stream_response(events)
+
+
+@router.post("/stream")
+async def ask_stream_post(
+    request: AskRequest,
+    session: AsyncSession = Depends(get_session),
+    deadline_ms: DeadlineHeader = None,
+):
+    rag_service = await get_rag_service()
+    events = await rag_service.ask_stream(
+        session, _query_from_request(request, deadline_ms), bypass_cache=request.bypass_cache
+    )
+    return _stream_response(events)
@@ -2,9 +2,11 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 
-from ..schemas import HealthResponse
+from ..auth import require_api_key
+from ..deps import get_rag_service
+from ..schemas import BatchingStatsResponse, CacheStatsResponse, HealthResponse
 
 router = APIRouter(prefix="/healthz", tags=["health"])
 
@@ -12,3 +14,18 @@ router = APIRouter(prefix="/healthz", tags=["health"])
 @router.get("", response_model=HealthResponse)
 async def healthcheck() -> HealthResponse:
     return HealthResponse(status="ok", timestamp=datetime.utcnow())
+
+
+@router.get("/caches", response_model=CacheStatsResponse, dependencies=[Depends(require_api_key)])
+async def cache_stats() -> CacheStatsResponse:
+    rag_service = await get_rag_service()
+    return CacheStatsResponse(caches=rag_service.cache_stats())
+
+
+@router.get(
+    "/batching", response_model=BatchingStatsResponse, dependencies=[Depends(require_api_key)]
+)
+async def batching_stats() -> BatchingStatsResponse:
+    rag_service = await get_rag_service()
+    stats = getattr(rag_service.embeddings, "batching_stats", None)
+    return BatchingStatsResponse(embeddings=stats() if stats is not None else None)
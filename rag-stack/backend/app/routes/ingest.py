@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import hashlib
 import io
 from typing import List
 
@@ -8,16 +9,15 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..auth import require_api_key
 from ..deps import get_rag_service, get_session
+from ..ingest.batches import embed_in_batches
+from ..ingest.manifest import DocumentUpdate, SyncResult, chunk_hashes, get_manifest_entry, reusable
 from ..ingest.splitter import ChunkSplitter
-from ..models import RagChunk
-from ..rag.embeddings import get_default_embedding_provider
 from ..schemas import IngestResult
 
 router = APIRouter(prefix="/ingest", tags=["ingest"], dependencies=[Depends(require_api_key)])
 
 
-async def _read_upload(file: UploadFile) -> str:
-    data = await file.read()
+def _read_upload(file: UploadFile, data: bytes) -> str:
     suffix = (file.filename or "").lower()
     if suffix.endswith(".pdf"):
         from pypdf import PdfReader
@@ -43,44 +43,85 @@ async def ingest_endpoint(
     acl: str = Form("public"),
     session: AsyncSession = Depends(get_session),
 ):
-    embeddings = get_default_embedding_provider()
     splitter = ChunkSplitter()
     rag_service = await get_rag_service()
+    settings = rag_service.settings
+    acl_scopes = [scope.strip() for scope in acl.split(",") if scope.strip()]
 
     processed = 0
     failed = 0
+    unchanged = 0
+    # Keyed by path: a file uploaded twice in one request keeps its last copy.
+    updates: dict[str, DocumentUpdate] = {}
+    targets: dict[str, List[int]] = {}
 
     for upload in files:
+        data = await upload.read()
+        path = upload.filename or "unknown"
+        # Re-uploading a file replaces its previous chunks instead of adding duplicates.
+        entry = await get_manifest_entry(session, path, repo, tag, version)
+        file_hash = hashlib.sha256(data).hexdigest()
+        if reusable(entry, acl_scopes) and entry.file_hash == file_hash:
+            processed += 1
+            unchanged += 1
+            continue
         try:
-            text = await _read_upload(upload)
+            text = _read_upload(upload, data)
         except Exception:  # pragma: no cover - validated in tests
             failed += 1
             continue
         metadata = {
-            "path": upload.filename or "unknown",
+            "path": path,
             "mime": upload.content_type or "text/plain",
             "repo": repo,
             "tag": tag,
             "version": version,
-            "acl": [scope.strip() for scope in acl.split(",") if scope.strip()],
+            "acl": acl_scopes,
         }
-        chunks = splitter.split(text, metadata)
-        texts = [chunk.content for chunk in chunks]
-        embeddings_list = await embeddings.embed_documents(texts)
-        rag_chunks = [
-            RagChunk(
-                content=chunk.content,
-                path=metadata["path"],
-                mime=metadata["mime"],
-                repo=metadata["repo"],
-                tag=metadata["tag"],
-                version=metadata["version"],
-                acl=metadata["acl"],
-                meta={**chunk.metadata, "source": metadata["path"]},
-            )
-            for chunk in chunks
-        ]
-        await rag_service.ingest_chunks(session, list(zip(rag_chunks, embeddings_list)))
+        update = DocumentUpdate(
+            path=path,
+            mime=metadata["mime"],
+            file_hash=file_hash,
+            repo=repo,
+            tag=tag,
+            version=version,
+            acl=acl_scopes,
+        )
+        update.add_chunks(splitter.split(text, metadata))
+        updates[path] = update
+        targets[path] = update.to_embed(chunk_hashes(entry, acl_scopes))
         processed += 1
 
-    return IngestResult(processed=processed, failed=failed)
+    # New chunk text from every file is embedded together in length-bucketed batches.
+    pairs = [(update, position) for path, update in updates.items() for position in targets[path]]
+    if pairs:
+        vectors = await embed_in_batches(
+            rag_service.embeddings,
+            [update.chunks[position].content for update, position in pairs],
+            settings.ingest_embed_token_budget,
+            settings.ingest_embed_batch_size,
+        )
+        for (update, position), vector in zip(pairs, vectors, strict=True):
+            update.embeddings[position] = vector
+
+    # All files go through the bulk writer together, INGEST_WRITE_BATCH_ROWS rows per transaction.
+    batch_rows = max(1, settings.ingest_write_batch_rows)
+    written = SyncResult()
+    group: List[DocumentUpdate] = []
+    rows = 0
+    for position, update in enumerate(updates.values(), start=1):
+        group.append(update)
+        rows += len(update.chunks)
+        if rows >= batch_rows or position == len(updates):
+            result = await rag_service.sync_documents(session, group)
+            written.added += result.added
+            written.seconds += result.seconds
+            group, rows = [], 0
+
+    return IngestResult(
+        processed=processed,
+        failed=failed,
+        unchanged=unchanged,
+        rows=written.added,
+        rows_per_second=round(written.rows_per_second, 1),
+    )
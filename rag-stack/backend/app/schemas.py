@@ -20,6 +20,11 @@ class ChunkMetadata(BaseModel):
 class IngestResult(BaseModel):
     processed: int
     failed: int
+    # Files skipped because their content matched the last ingest.
+    unchanged: int = 0
+    # Chunk rows inserted, and the write rate of the transactions that inserted them.
+    rows: int = 0
+    rows_per_second: float = 0.0
 
 
 class LLMProvider(str, Enum):
@@ -34,6 +39,14 @@ class AskRequest(BaseModel):
     tag: Optional[str] = None
     acl: Optional[List[str]] = None
     provider: Optional[LLMProvider] = None
+    ef_search: Optional[int] = Field(default=None, ge=1, le=1000)
+    probes: Optional[int] = Field(default=None, ge=1, le=1000)
+    bypass_cache: bool = False
+    deadline_ms: Optional[int] = Field(default=None, ge=1, le=600_000)
+
+
+class AskBatchRequest(BaseModel):
+    requests: List[AskRequest] = Field(min_length=1, max_length=256)
 
 
 class SourceDocument(BaseModel):
@@ -48,6 +61,22 @@ class AskResponse(BaseModel):
     timings: dict
 
 
+class AskBatchError(BaseModel):
+    error: str
+
+
+class AskBatchResponse(BaseModel):
+    results: List[AskResponse | AskBatchError]
+
+
 class HealthResponse(BaseModel):
     status: str
     timestamp: datetime
+
+
+class CacheStatsResponse(BaseModel):
+    caches: dict
+
+
+class BatchingStatsResponse(BaseModel):
+    embeddings: Optional[dict] = None
@@ -56,11 +56,18 @@ class StubEmbeddings:
 
 
 class StubClient:
-    async def complete(self, prompt):
+    async def complete(self, prompt, max_tokens=None):
         from app.rag.clients import CompletionMessage
 
         return CompletionMessage(text="respuesta", usage={"input_tokens": 10, "output_tokens": 20})
 
+    async def stream(self, prompt, max_tokens=None):
+        from app.rag.clients import StreamChunk
+
+        for text in ("res", "puesta"):
+            yield StreamChunk(text=text)
+        yield StreamChunk(usage={"input_tokens": 10, "output_tokens": 20})
+
 
 @pytest.fixture
 def stubbed_rag(monkeypatch):
@@ -78,5 +85,6 @@ def stubbed_rag(monkeypatch):
         return service
 
     monkeypatch.setattr(deps, "get_rag_service", _get_service)
+    deps._rag_service = service
     yield service
     deps._rag_service = None
@@ -1,15 +1,21 @@
+import asyncio
 import io
 
-from starlette.datastructures import UploadFile
+import orjson
+from starlette.datastructures import Headers, UploadFile
 
-from app.routes.ask import ask_get
+from app.routes.ask import ask_batch, ask_get, ask_stream_post
 from app.routes.ingest import ingest_endpoint
-from app.schemas import LLMProvider
+from app.schemas import AskBatchError, AskBatchRequest, AskRequest, AskResponse, LLMProvider
 
 
 async def test_ask_returns_answer(db_session, stubbed_rag):
     async with db_session() as session:
-        upload = UploadFile(filename="setup.txt", file=io.BytesIO(b"Guia de instalacion"), content_type="text/plain")
+        upload = UploadFile(
+            filename="setup.txt",
+            file=io.BytesIO(b"Guia de instalacion"),
+            headers=Headers({"content-type": "text/plain"}),
+        )
         await ingest_endpoint(
             files=[upload],
             repo="company",
@@ -35,7 +41,11 @@ async def test_ask_returns_answer(db_session, stubbed_rag):
 
 async def test_ask_allows_provider_selection(db_session, stubbed_rag):
     async with db_session() as session:
-        upload = UploadFile(filename="setup.txt", file=io.BytesIO(b"Guia de instalacion"), content_type="text/plain")
+        upload = UploadFile(
+            filename="setup.txt",
+            file=io.BytesIO(b"Guia de instalacion"),
+            headers=Headers({"content-type": "text/plain"}),
+        )
         await ingest_endpoint(
             files=[upload],
             repo="company",
@@ -56,3 +66,256 @@ async def test_ask_allows_provider_selection(db_session, stubbed_rag):
         )
 
         assert response.answer
+
+
+async def test_ask_batch_returns_results_per_request(db_session, stubbed_rag):
+    async with db_session() as session:
+        for repo in ("company", "other"):
+            upload = UploadFile(
+                filename=f"{repo}.txt",
+                file=io.BytesIO(b"Guia de instalacion"),
+                headers=Headers({"content-type": "text/plain"}),
+            )
+            await ingest_endpoint(
+                files=[upload], repo=repo, tag="v1", version="1.0", acl="public", session=session
+            )
+
+        response = await ask_batch(
+            request=AskBatchRequest(
+                requests=[
+                    AskRequest(q="Como instalar?", k=1, repo="company"),
+                    AskRequest(q="Como instalar?", k=1, repo="other", acl=["public"]),
+                    AskRequest(q="Como instalar?", k=1, repo="missing"),
+                ]
+            ),
+            session=session,
+        )
+
+        company, other, missing = response.results
+        assert company.sources[0].path.endswith("company.txt")
+        assert other.sources[0].path.endswith("other.txt")
+        assert not missing.sources
+        assert company.timings["batch_size"] == 3
+        assert "generation" in company.timings
+
+
+async def test_ask_batch_reports_failed_items_without_dropping_the_rest(db_session, stubbed_rag):
+    complete = stubbed_rag._client_override.complete
+
+    async def flaky_complete(prompt, max_tokens=None):
+        if "Como desinstalar?" in prompt:
+            raise RuntimeError("upstream error")
+        return await complete(prompt, max_tokens=max_tokens)
+
+    stubbed_rag._client_override.complete = flaky_complete
+    async with db_session() as session:
+        upload = UploadFile(
+            filename="setup.txt",
+            file=io.BytesIO(b"Guia de instalacion"),
+            headers=Headers({"content-type": "text/plain"}),
+        )
+        await ingest_endpoint(
+            files=[upload], repo="company", tag="v1", version="1.0", acl="public", session=session
+        )
+
+        response = await ask_batch(
+            request=AskBatchRequest(
+                requests=[
+                    AskRequest(q="Como instalar?", k=1, repo="company"),
+                    AskRequest(q="Como desinstalar?", k=1, repo="company"),
+                ]
+            ),
+            session=session,
+        )
+
+        answered, failed = response.results
+        assert isinstance(answered, AskResponse)
+        assert answered.answer == "respuesta"
+        assert isinstance(failed, AskBatchError)
+        assert failed.error
+
+
+async def test_ask_serves_paraphrases_from_answer_cache(db_session, stubbed_rag):
+    from app.models import RagChunk
+    from app.rag.cache import SemanticCache
+    from app.rag.retriever import Retriever
+    from app.rag.service import RAGService
+
+    stubbed_rag.answer_cache = SemanticCache(maxsize=4, threshold=0.95)
+    async with db_session() as session:
+        upload = UploadFile(
+            filename="setup.txt",
+            file=io.BytesIO(b"Guia de instalacion"),
+            headers=Headers({"content-type": "text/plain"}),
+        )
+        await ingest_endpoint(
+            files=[upload], repo="company", tag="v1", version="1.0", acl="public", session=session
+        )
+
+        first = await ask_get(
+            q="Como instalar?", k=1, repo="company", tag="v1", acl="public", session=session
+        )
+        second = await ask_get(
+            q="Como se instala?", k=1, repo="company", tag="v1", acl="public", session=session
+        )
+        assert first.timings["cache_hit"] is False
+        assert second.timings["cache_hit"] is True
+        assert second.answer == first.answer
+
+        bypassed = await ask_get(
+            q="Como instalar?",
+            k=1,
+            repo="company",
+            tag="v1",
+            acl="public",
+            session=session,
+            bypass_cache=True,
+        )
+        assert "cache_hit" not in bypassed.timings
+        other_scope = await ask_get(
+            q="Como instalar?", k=1, repo="other", tag="v1", acl="public", session=session
+        )
+        assert other_scope.timings["cache_hit"] is False
+
+        # Ingesting bumps the corpus generation and invalidates cached answers.
+        upload = UploadFile(
+            filename="more.txt",
+            file=io.BytesIO(b"Mas guias"),
+            headers=Headers({"content-type": "text/plain"}),
+        )
+        await ingest_endpoint(
+            files=[upload], repo="company", tag="v1", version="1.0", acl="public", session=session
+        )
+        after_ingest = await ask_get(
+            q="Como instalar?", k=1, repo="company", tag="v1", acl="public", session=session
+        )
+        assert after_ingest.timings["cache_hit"] is False
+
+        # So do writes from another process, e.g. the ingest CLI.
+        again = await ask_get(
+            q="Como instalar?", k=1, repo="company", tag="v1", acl="public", session=session
+        )
+        assert again.timings["cache_hit"] is True
+        cli = RAGService(
+            settings=stubbed_rag.settings,
+            embeddings=None,
+            retriever=Retriever(stubbed_rag.settings),
+        )
+        chunk = RagChunk(
+            content="Otra guia", path="otra.txt", repo="company", tag="v1", acl=["public"]
+        )
+        await cli.ingest_chunks(session, [(chunk, [1.0, 0.0, 0.0])])
+        after_cli = await ask_get(
+            q="Como instalar?", k=1, repo="company", tag="v1", acl="public", session=session
+        )
+        assert after_cli.timings["cache_hit"] is False
+
+
+async def test_ask_coalesces_identical_concurrent_requests(db_session, stubbed_rag):
+    from app.rag.singleflight import SingleFlight
+
+    calls = []
+    complete = stubbed_rag._client_override.complete
+
+    async def slow_complete(prompt, max_tokens=None):
+        calls.append(prompt)
+        await asyncio.sleep(0.05)
+        return await complete(prompt, max_tokens=max_tokens)
+
+    stubbed_rag._client_override.complete = slow_complete
+    stubbed_rag.inflight = SingleFlight()
+    async with db_session() as session:
+        upload = UploadFile(
+            filename="setup.txt",
+            file=io.BytesIO(b"Guia de instalacion"),
+            headers=Headers({"content-type": "text/plain"}),
+        )
+        await ingest_endpoint(
+            files=[upload], repo="company", tag="v1", version="1.0", acl="public", session=session
+        )
+
+    async def ask(question, **options):
+        # One session per request, as the routes get; an AsyncSession is not safe to share.
+        async with db_session() as session:
+            return await stubbed_rag.ask(
+                session, question, repo="company", acl=["public"], **options
+            )
+
+    results = await asyncio.gather(
+        ask("Como instalar?", k=1),
+        ask("Como  instalar?", k=1),
+        ask("Como instalar?", k=2),
+        ask("Como instalar?", k=1, bypass_cache=True),
+        ask("Como instalar?", k=1, deadline_ms=60_000),
+    )
+
+    assert len(calls) == 4
+    assert results[1].answer == results[0].answer
+    assert results[1].timings["coalesced"] is True
+    assert "coalesced" not in results[0].timings
+    assert stubbed_rag.cache_stats()["in_flight_asks"] == {"coalesced": 1, "in_flight": 0}
+
+
+async def test_ask_degrades_when_deadline_is_short(db_session, stubbed_rag):
+    from app.rag.rerank import Reranker
+
+    stubbed_rag.reranker = Reranker("stub")
+    async with db_session() as session:
+        upload = UploadFile(
+            filename="setup.txt",
+            file=io.BytesIO(b"Guia de instalacion"),
+            headers=Headers({"content-type": "text/plain"}),
+        )
+        await ingest_endpoint(
+            files=[upload], repo="company", tag="v1", version="1.0", acl="public", session=session
+        )
+
+        # Enough budget for a short generation, not for the cross-encoder.
+        settings = stubbed_rag.settings
+        settings.rerank_min_budget_ms = 10_000
+        budget = settings.generation_overhead_ms + settings.generation_ms_per_token * 200
+        partial = await stubbed_rag.ask(session, "Como instalar?", k=1, deadline_ms=budget)
+        assert partial.answer == "respuesta"
+        assert partial.timings["skipped"] == ["rerank"]
+        assert settings.generation_min_tokens <= partial.timings["max_tokens"] <= 200
+
+        # No budget left for generation: the top chunks are returned as an extractive answer.
+        extractive = await stubbed_rag.ask(session, "Como instalar?", k=1, deadline_ms=1)
+        assert extractive.timings["skipped"] == ["rerank", "generation"]
+        assert "Guia de instalacion" in extractive.answer
+        assert extractive.sources
+
+
+async def test_ask_stream_emits_sources_tokens_and_done(db_session, stubbed_rag):
+    async with db_session() as session:
+        upload = UploadFile(
+            filename="setup.txt",
+            file=io.BytesIO(b"Guia de instalacion"),
+            headers=Headers({"content-type": "text/plain"}),
+        )
+        await ingest_endpoint(
+            files=[upload],
+            repo="company",
+            tag="v1",
+            version="1.0",
+            acl="public",
+            session=session,
+        )
+
+        response = await ask_stream_post(
+            AskRequest(q="Como instalar?", k=1, repo="company"), session=session
+        )
+
+    assert response.media_type == "text/event-stream"
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    events = []
+    for block in body.decode().strip().split("\n\n"):
+        name, data = block.split("\n")
+        events.append((name.removeprefix("event: "), orjson.loads(data.removeprefix("data: "))))
+
+    assert [name for name, _ in events] == ["sources", "token", "token", "done"]
+    assert events[0][1][0]["path"].endswith("setup.txt")
+    assert "".join(data["text"] for name, data in events if name == "token") == "respuesta"
+    done = events[-1][1]
+    assert done["usage"]["output_tokens"] == 20
+    assert {"retrieval", "time_to_first_token", "generation"} <= done["timings"].keys()
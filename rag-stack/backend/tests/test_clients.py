@@ -0,0 +1,80 @@
+import httpx
+import pytest
+import respx
+
+
+@pytest.fixture
+def llm_settings():
+    from app import config
+
+    config.get_settings.cache_clear()
+    settings = config.get_settings()
+    settings.openai_api_key = "test-key"
+    settings.llm_retry_backoff = 0
+    yield settings
+    config.get_settings.cache_clear()
+
+
+async def test_openai_client_retries_rate_limited_requests(llm_settings):
+    from app.rag.clients import OpenAIClient
+
+    completion = {
+        "id": "c1",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt",
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": "hola"},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7},
+    }
+    rate_limited = {"error": {"message": "Rate limit", "type": "rate_limit_error"}}
+    with respx.mock(base_url="https://api.openai.com") as mock:
+        route = mock.post("/v1/chat/completions").mock(
+            side_effect=[
+                httpx.Response(429, json=rate_limited),
+                httpx.Response(200, json=completion),
+            ]
+        )
+        result = await OpenAIClient(llm_settings).complete("pregunta")
+
+    assert route.call_count == 2
+    assert result.text == "hola"
+    assert result.usage == {"input_tokens": 5, "output_tokens": 2}
+
+
+async def test_openai_client_streams_tokens_and_usage(llm_settings):
+    from app.rag.clients import OpenAIClient
+
+    def chunk(choices, usage=None):
+        payload = {
+            "id": "c1",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "gpt",
+            "choices": choices,
+        }
+        if usage:
+            payload["usage"] = usage
+        return "data: " + httpx.Response(200, json=payload).text + "\n\n"
+
+    body = (
+        chunk([{"index": 0, "delta": {"content": "res"}, "finish_reason": None}])
+        + chunk([{"index": 0, "delta": {"content": "puesta"}, "finish_reason": "stop"}])
+        + chunk([], usage={"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5})
+        + "data: [DONE]\n\n"
+    )
+    with respx.mock(base_url="https://api.openai.com") as mock:
+        mock.post("/v1/chat/completions").mock(
+            return_value=httpx.Response(
+                200, text=body, headers={"content-type": "text/event-stream"}
+            )
+        )
+        chunks = [item async for item in OpenAIClient(llm_settings).stream("pregunta")]
+
+    assert "".join(item.text for item in chunks) == "respuesta"
+    assert chunks[-1].usage == {"input_tokens": 3, "output_tokens": 2}
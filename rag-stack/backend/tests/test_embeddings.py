@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from app.rag.batching import MicroBatcher
+from app.rag.cache import DiskCache
+from app.rag.embeddings import SentenceTransformerEmbeddings
+
+
+class CountingEmbeddings(SentenceTransformerEmbeddings):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = []
+
+    async def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[0.6, 0.8, 0.0] for _ in texts]
+
+
+async def test_embed_query_uses_memory_and_disk_cache(tmp_path):
+    disk = DiskCache(tmp_path / "queries.sqlite")
+    embeddings = CountingEmbeddings("test", query_cache_size=8, disk_cache=disk)
+
+    first = await embeddings.embed_query("Como  instalar?")
+    second = await embeddings.embed_query(" Como instalar? ")
+    assert first == second
+    assert embeddings.calls == [["Como instalar?"]]
+    assert embeddings.cache_stats()["memory"]["hits"] == 1
+
+    # A fresh process starts with an empty memory tier but reuses the disk entries.
+    restarted = CountingEmbeddings(
+        "test", query_cache_size=8, disk_cache=DiskCache(tmp_path / "queries.sqlite")
+    )
+    assert await restarted.embed_query("Como instalar?") == pytest.approx(first)
+    assert restarted.calls == []
+    assert restarted.cache_stats()["disk"]["hits"] == 1
+
+    # Entries are keyed by model name.
+    other_model = CountingEmbeddings("other", query_cache_size=8, disk_cache=disk)
+    await other_model.embed_query("Como instalar?")
+    assert other_model.calls == [["Como instalar?"]]
+
+
+def test_disk_cache_evicts_oldest_entries_past_its_size(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+
+    clock = iter(range(100))
+    monkeypatch.setattr("app.rag.cache.time", SimpleNamespace(time=lambda: float(next(clock))))
+    disk = DiskCache(tmp_path / "queries.sqlite", max_entries=2)
+    for key in ("a", "b", "c"):
+        disk.put(key, key.encode())
+
+    assert disk.get("a") is None
+    assert (disk.get("b"), disk.get("c")) == (b"b", b"c")
+    assert disk.stats()["size"] == 2
+
+
+async def test_micro_batcher_coalesces_concurrent_calls():
+    calls = []
+
+    async def encode(texts):
+        calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    batcher = MicroBatcher(encode, max_batch_size=4, max_wait_ms=50)
+    results = await asyncio.gather(*(batcher.submit(["x" * n]) for n in range(1, 6)))
+
+    assert results == [[[float(n)]] for n in range(1, 6)]
+    assert [len(call) for call in calls] == [4, 1]
+    stats = batcher.stats()
+    assert stats["batch_size"]["count"] == 2
+    assert stats["queue_wait_ms"]["count"] == 5
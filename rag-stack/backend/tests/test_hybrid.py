@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+from app.models import RagChunk
+from app.rag.bm25_index import BM25Index
+
+
+def test_bm25_index_scores_only_matching_postings(tmp_path):
+    index = BM25Index(tmp_path)
+    index.add(
+        [
+            (1, "Guía de instalación del pipeline"),
+            (2, "Configurar el cluster"),
+            (3, "pipeline pipeline"),
+        ]
+    )
+
+    hits = index.search("instalacion pipeline", k=5)
+    assert [doc_id for doc_id, _ in hits] == [1, 3]
+
+    index.remove([1])
+    assert [doc_id for doc_id, _ in index.search("instalacion", k=5)] == []
+
+    index.save()
+    reloaded = BM25Index(tmp_path)
+    assert reloaded.load()
+    assert len(reloaded) == 2
+    assert reloaded.search("pipeline", k=5) == pytest.approx(index.search("pipeline", k=5))
+
+
+def test_bm25_index_appends_changes_and_shares_them_between_processes(tmp_path):
+    api, cli = BM25Index(tmp_path), BM25Index(tmp_path)
+    api.add([(1, "guia de instalacion " * 50), (2, "notas de version " * 50)])
+    api.save()
+    snapshot = api.path.read_bytes()
+    assert cli.load()
+
+    # Small writes only append to the log; the snapshot stays as it was.
+    cli.add([(3, "instalacion en cluster")])
+    cli.save()
+    api.refresh()
+    api.remove([1])
+    api.save()
+    assert api.path.read_bytes() == snapshot
+    cli.refresh()
+    assert [doc_id for doc_id, _ in cli.search("instalacion", k=5)] == [3]
+
+    # A log past half the snapshot's size is folded into a new snapshot.
+    cli.add([(doc_id, "cluster " * 50) for doc_id in range(4, 40)])
+    cli.save()
+    assert not cli.log_path.exists()
+    reloaded = BM25Index(tmp_path)
+    assert reloaded.load()
+    assert len(reloaded) == len(cli) == 38
+    assert reloaded.search("cluster instalacion", k=3) == pytest.approx(
+        cli.search("cluster instalacion", k=3)
+    )
+
+
+async def test_hybrid_search_fuses_lexical_hits(db_session, stubbed_rag, monkeypatch, tmp_path):
+    from app.rag.hybrid import HybridRetriever
+
+    monkeypatch.setattr("app.rag.bm25_index.INDEX_DIR", tmp_path)
+    stubbed_rag.hybrid = HybridRetriever(stubbed_rag.retriever)
+
+    async with db_session() as session:
+        await stubbed_rag.ingest_chunks(
+            session,
+            [
+                (
+                    RagChunk(
+                        content="Guia de instalacion",
+                        path="setup.md",
+                        repo="company",
+                        acl=["public"],
+                    ),
+                    [1.0, 0.0, 0.0],
+                ),
+                (
+                    RagChunk(
+                        content="Notas de version", path="notes.md", repo="company", acl=["public"]
+                    ),
+                    [1.0, 0.0, 0.0],
+                ),
+                (
+                    RagChunk(
+                        content="instalacion privada",
+                        path="private.md",
+                        repo="company",
+                        acl=["team"],
+                    ),
+                    [1.0, 0.0, 0.0],
+                ),
+            ],
+        )
+        result = await stubbed_rag.ask(session, "instalacion", k=1, repo="company", acl=["public"])
+
+    assert [source["path"] for source in result.sources] == ["setup.md"]
+    assert "hybrid" in result.timings
+    assert len(stubbed_rag.hybrid.index) == 3
+
+
+async def test_bm25_readers_wait_for_a_writer_holding_the_lock(db_session, tmp_path):
+    from app.config import get_settings
+    from app.rag.hybrid import HybridRetriever
+    from app.rag.retriever import Retriever
+
+    writer = BM25Index(tmp_path)
+    writer.add([(1, "guia de instalacion")])
+    writer.save()
+    hybrid = HybridRetriever(Retriever(get_settings()), BM25Index(tmp_path))
+
+    async with db_session() as session:
+        async with writer.writer_lock():
+            reader = asyncio.create_task(hybrid.ensure_ready(session))
+            await asyncio.sleep(0.1)
+            assert not reader.done()
+        await reader
+
+    assert len(hybrid.index) == 1
+
+
+async def test_start_build_indexes_the_corpus_before_the_first_search(
+    db_session, stubbed_rag, monkeypatch, tmp_path
+):
+    from app.rag.hybrid import HybridRetriever
+
+    monkeypatch.setattr("app.rag.bm25_index.INDEX_DIR", tmp_path)
+    async with db_session() as session:
+        await stubbed_rag.ingest_chunks(
+            session,
+            [(RagChunk(content="Guia de instalacion", path="setup.md", repo="company"), [1.0, 0.0, 0.0])],
+        )
+
+    hybrid = HybridRetriever(stubbed_rag.retriever)
+    hybrid.start_build(db_session)
+    await hybrid._build
+    assert hybrid.index.is_ready
+    assert len(hybrid.index) == 1
+    await hybrid.close()
@@ -1,7 +1,8 @@
 import io
+import struct
 
 from sqlalchemy import select
-from starlette.datastructures import UploadFile
+from starlette.datastructures import Headers, UploadFile
 
 from app.models import RagChunk
 from app.routes.ingest import ingest_endpoint
@@ -9,7 +10,11 @@ from app.routes.ingest import ingest_endpoint
 
 async def test_ingest_endpoint(db_session, stubbed_rag):
     async with db_session() as session:
-        upload = UploadFile(filename="doc.txt", file=io.BytesIO(b"Contenido de prueba"), content_type="text/plain")
+        upload = UploadFile(
+            filename="doc.txt",
+            file=io.BytesIO(b"Contenido de prueba"),
+            headers=Headers({"content-type": "text/plain"}),
+        )
         result = await ingest_endpoint(
             files=[upload],
             repo="company",
@@ -25,3 +30,302 @@ async def test_ingest_endpoint(db_session, stubbed_rag):
         assert len(rows) == 1
         assert rows[0].repo == "company"
         assert rows[0].acl == ["public"]
+
+
+async def test_ingest_endpoint_skips_unchanged_files(db_session, stubbed_rag):
+    async with db_session() as session:
+        for content, unchanged in (
+            (b"Contenido de prueba", 0),
+            (b"Contenido de prueba", 1),
+            (b"Contenido nuevo", 0),
+        ):
+            headers = Headers({"content-type": "text/plain"})
+            upload = UploadFile(filename="doc.txt", file=io.BytesIO(content), headers=headers)
+            result = await ingest_endpoint(
+                files=[upload],
+                repo="company",
+                tag="v1",
+                version="1.0",
+                acl="public",
+                session=session,
+            )
+            assert (result.processed, result.unchanged) == (1, unchanged)
+
+        rows = (await session.execute(select(RagChunk))).scalars().all()
+        assert [row.content for row in rows] == ["Contenido nuevo"]
+
+
+async def _parse_all(parser, paths):
+    from app.ingest.parsing import ParseFailure
+
+    documents, failures = {}, {}
+    async for item in parser.parse(paths):
+        if isinstance(item, ParseFailure):
+            failures[item.path.name] = item.error
+        else:
+            documents[item.path.name] = item
+    return documents, failures
+
+
+async def test_document_parser_records_failures_per_file(tmp_path):
+    from pypdf import PdfWriter
+
+    from app.ingest.parsing import DocumentParser
+
+    writer = PdfWriter()
+    for _ in range(5):
+        writer.add_blank_page(width=72, height=72)
+    with open(tmp_path / "manual.pdf", "wb") as handle:
+        writer.write(handle)
+    (tmp_path / "roto.pdf").write_bytes(b"no es un pdf")
+    (tmp_path / "guia.md").write_text("# Guia\nPasos de instalacion", encoding="utf-8")
+    paths = sorted(tmp_path.iterdir())
+
+    for parser in (
+        DocumentParser(workers=0),
+        DocumentParser(workers=2, timeout=60, pages_per_task=2),
+    ):
+        documents, failures = await _parse_all(parser, paths)
+
+        assert set(documents) == {"manual.pdf", "guia.md"}
+        assert documents["guia.md"].content.startswith("# Guia")
+        # Blank pages extract as empty strings; one per page once the ranges are stitched back
+        # together.
+        assert documents["manual.pdf"].content == "\n" * 4
+        assert documents["manual.pdf"].mime == "application/pdf"
+        assert list(failures) == ["roto.pdf"]
+
+
+async def test_document_parser_recycles_workers_stuck_past_the_timeout(tmp_path):
+    import os
+
+    from app.ingest.parsing import DocumentParser
+
+    (tmp_path / "a.md").write_text("Primero", encoding="utf-8")
+    # Opening a FIFO with no writer blocks forever, like a parser stuck on a pathological file.
+    os.mkfifo(tmp_path / "b.txt")
+    (tmp_path / "c.md").write_text("Despues", encoding="utf-8")
+
+    parser = DocumentParser(workers=1, timeout=2)
+    documents, failures = await _parse_all(parser, sorted(tmp_path.iterdir()))
+
+    # With the stuck worker still alive, the single-worker pool could never parse c.md.
+    assert set(documents) == {"a.md", "c.md"}
+    assert failures["b.txt"].startswith("timeout")
+
+
+async def test_ingest_paths_streams_documents_through_all_stages(db_session, stubbed_rag, tmp_path):
+    from app.ingest.parsing import DocumentParser
+    from app.ingest.pipeline import ingest_paths
+
+    stubbed_rag.settings.ingest_queue_size = 1
+    stubbed_rag.settings.ingest_embed_batch_size = 2
+    stubbed_rag.settings.ingest_write_batch_rows = 2
+    for index in range(5):
+        (tmp_path / f"doc{index}.txt").write_text(f"Documento numero {index}", encoding="utf-8")
+    (tmp_path / "roto.pdf").write_bytes(b"no es un pdf")
+
+    async with db_session() as session:
+        report = await ingest_paths(
+            stubbed_rag,
+            session,
+            sorted(tmp_path.iterdir()),
+            DocumentParser(workers=0),
+            repo="company",
+            tag="v1",
+            version=None,
+            acl=["public"],
+        )
+        rows = (await session.execute(select(RagChunk))).scalars().all()
+
+    assert sorted(row.path.rsplit("/", 1)[-1] for row in rows) == [
+        f"doc{index}.txt" for index in range(5)
+    ]
+    assert all(row.embedding is not None for row in rows)
+    assert [failure.path.name for failure in report.failures] == ["roto.pdf"]
+    assert {stage.name: stage.items for stage in report.stages} == {
+        "load": 5,
+        "split": 5,
+        "embed": 5,
+        "write": 5,
+    }
+    assert "write" in report.format()
+
+
+async def test_reingest_skips_unchanged_files_and_removes_stale_chunks(
+    db_session, stubbed_rag, tmp_path, monkeypatch
+):
+    from app.ingest.parsing import DocumentParser
+    from app.ingest.pipeline import ingest_paths
+    from app.models import IngestManifest
+
+    embedded = []
+    embed_documents = stubbed_rag.embeddings.embed_documents
+
+    async def counting_embed(texts):
+        embedded.extend(texts)
+        return await embed_documents(texts)
+
+    monkeypatch.setattr(stubbed_rag.embeddings, "embed_documents", counting_embed)
+    # Each section is longer than half a chunk, so every section becomes its own chunk.
+    sections = [
+        f"Seccion {i}. " + " ".join(f"termino{i}x{j}" for j in range(200)) for i in range(3)
+    ]
+    (tmp_path / "manual.md").write_text("\n\n".join(sections), encoding="utf-8")
+    (tmp_path / "notas.txt").write_text("Notas sueltas", encoding="utf-8")
+    (tmp_path / "viejo.txt").write_text("Documento obsoleto", encoding="utf-8")
+
+    async def run(session):
+        embedded.clear()
+        return await ingest_paths(
+            stubbed_rag,
+            session,
+            sorted(tmp_path.iterdir()),
+            DocumentParser(workers=0),
+            repo="company",
+            tag="v1",
+            version=None,
+            acl=["public"],
+            prune_under=tmp_path,
+        )
+
+    async with db_session() as session:
+        await run(session)
+        assert len(embedded) == 5
+
+        report = await run(session)
+        assert (report.unchanged, embedded) == (3, [])
+        # Warm the chunk cache with the current rows.
+        ids = (await session.execute(select(RagChunk.id))).scalars().all()
+        await stubbed_rag.retriever.load_chunks(session, ids)
+
+        sections[1] = "Seccion 1 revisada. " + sections[1]
+        (tmp_path / "manual.md").write_text("\n\n".join(sections), encoding="utf-8")
+        (tmp_path / "viejo.txt").unlink()
+        report = await run(session)
+        assert [text.split(".")[0] for text in embedded] == ["Seccion 1 revisada"]
+        assert (report.unchanged, report.reused, report.removed) == (1, 2, 2)
+
+        rows = (await session.execute(select(RagChunk))).scalars().all()
+        manifest = (await session.execute(select(IngestManifest))).scalars().all()
+        # Section 2 kept its row but moved down; the cache must not serve its old offset.
+        moved = next(row for row in rows if row.content.startswith("Seccion 2"))
+        cached = await stubbed_rag.retriever.load_chunks(session, [moved.id])
+        assert cached[0].meta["start_index"] == moved.meta["start_index"]
+
+    assert sorted(row.content.split(".")[0] for row in rows) == [
+        "Notas sueltas",
+        "Seccion 0",
+        "Seccion 1 revisada",
+        "Seccion 2",
+    ]
+    assert sorted(entry.path.rsplit("/", 1)[-1] for entry in manifest) == ["manual.md", "notas.txt"]
+
+
+def test_encode_vector_matches_pgvector_binary_format():
+    from app.rag.bulk_insert import encode_vector
+
+    # int16 dimension, int16 unused, then big-endian float32 values.
+    assert encode_vector([1.0, 2.5]) == struct.pack(">HHff", 2, 0, 1.0, 2.5)
+
+
+async def test_insert_chunks_copies_binary_rows_through_psycopg():
+    from contextlib import asynccontextmanager
+    from types import SimpleNamespace
+
+    import orjson
+
+    from app.rag.bulk_insert import COPY_COLUMNS, COPY_TYPES, encode_vector, insert_chunks
+
+    class Copy:
+        def __init__(self):
+            self.types, self.rows = None, []
+
+        def set_types(self, types):
+            self.types = types
+
+        async def write_row(self, row):
+            self.rows.append(row)
+
+    class Cursor:
+        def __init__(self):
+            self.statements, self.copy_statement, self.copied = [], None, Copy()
+
+        async def execute(self, statement, params):
+            self.statements.append((statement, params))
+
+        async def fetchall(self):
+            return [(11,), (12,)]
+
+        @asynccontextmanager
+        async def copy(self, statement):
+            self.copy_statement = statement
+            yield self.copied
+
+    cursor = Cursor()
+
+    @asynccontextmanager
+    async def open_cursor():
+        yield cursor
+
+    async def get_raw_connection():
+        return SimpleNamespace(driver_connection=SimpleNamespace(cursor=open_cursor))
+
+    connection = SimpleNamespace(
+        dialect=SimpleNamespace(name="postgresql", driver="psycopg"),
+        get_raw_connection=get_raw_connection,
+    )
+
+    async def get_connection():
+        return connection
+
+    chunks = [
+        RagChunk(content="uno", path="a.md", acl=["public"], meta={"start_index": 0}),
+        RagChunk(content="dos", path="a.md"),
+    ]
+    chunks[0].embedding = [1.0, 2.5]
+    await insert_chunks(SimpleNamespace(connection=get_connection), chunks)
+
+    [(nextval, params)] = cursor.statements
+    assert "nextval(pg_get_serial_sequence('rag_chunks', 'id'))" in nextval and params == (2,)
+    assert cursor.copy_statement == (
+        f"COPY rag_chunks ({', '.join(COPY_COLUMNS)}) FROM STDIN (FORMAT BINARY)"
+    )
+    assert cursor.copied.types == COPY_TYPES and len(COPY_TYPES) == len(COPY_COLUMNS)
+    first, second = (dict(zip(COPY_COLUMNS, row, strict=True)) for row in cursor.copied.rows)
+    assert first["id"] == 11 and first["content"] == "uno" and first["acl"] == ["public"]
+    assert first["embedding"] == encode_vector([1.0, 2.5])
+    assert first["meta"] == orjson.dumps({"start_index": 0})
+    assert second["embedding"] is None and second["meta"] is None
+    assert [chunk.id for chunk in chunks] == [11, 12]
+
+
+def test_plan_batches_buckets_by_length_within_token_budget():
+    from app.ingest.batches import plan_batches
+
+    # Estimated tokens: 100, 2, 3, 100, 1.
+    texts = ["x" * 300, "a" * 6, "b" * 9, "y" * 300, "c" * 3]
+    assert plan_batches(texts, token_budget=200, max_batch_size=3) == [[4, 1, 2], [0, 3]]
+    assert plan_batches(texts, token_budget=150, max_batch_size=3) == [[4, 1, 2], [0], [3]]
+
+
+async def test_embed_in_batches_returns_vectors_in_input_order():
+    from app.ingest.batches import embed_in_batches
+
+    class RecordingEmbeddings:
+        def __init__(self):
+            self.batches = []
+
+        async def embed_documents(self, texts):
+            raise AssertionError("embed_batch should be used")
+
+        async def embed_batch(self, texts):
+            self.batches.append(len(texts))
+            return [[float(len(text))] for text in texts]
+
+    embeddings = RecordingEmbeddings()
+    texts = ["largo " * 50, "a", "bb", "medio " * 10, "ccc"]
+    vectors = await embed_in_batches(embeddings, texts, token_budget=80, max_batch_size=8)
+
+    assert vectors == [[float(len(text))] for text in texts]
+    assert embeddings.batches == [4, 1]
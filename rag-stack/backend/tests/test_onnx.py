@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("onnx")
+
+
+@pytest.fixture
+def tiny_checkpoint(tmp_path):
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizer
+
+    vocab = [
+        "[PAD]",
+        "[UNK]",
+        "[CLS]",
+        "[SEP]",
+        "[MASK]",
+        "como",
+        "instalar",
+        "el",
+        "pipeline",
+        "guia",
+    ]
+    hf_dir = tmp_path / "hf"
+    hf_dir.mkdir()
+    (hf_dir / "vocab.txt").write_text("\n".join(vocab))
+    BertTokenizer(vocab_file=str(hf_dir / "vocab.txt")).save_pretrained(str(hf_dir))
+    config = BertConfig(
+        vocab_size=len(vocab),
+        hidden_size=16,
+        num_hidden_layers=1,
+        num_attention_heads=2,
+        intermediate_size=32,
+    )
+    BertModel(config).save_pretrained(str(hf_dir))
+
+    model = SentenceTransformer(
+        modules=[models.Transformer(str(hf_dir), max_seq_length=32), models.Pooling(16, "cls")]
+    )
+    model.save(str(tmp_path / "st"))
+    return model, str(tmp_path / "st")
+
+
+async def test_onnx_export_matches_sentence_transformers(tmp_path, tiny_checkpoint):
+    from app.rag.onnx_embeddings import OnnxEmbeddings
+    from app.rag.onnx_export import export_model
+
+    model, source = tiny_checkpoint
+    output = export_model(source, tmp_path / "onnx", quantize=True)
+    texts = ["como instalar el pipeline", "guia"]
+    expected = model.encode(texts, normalize_embeddings=True)
+
+    vectors = np.array(await OnnxEmbeddings(output).embed_documents(texts))
+    assert vectors.shape == (2, 16)
+    assert np.allclose(vectors, expected, atol=1e-4)
+
+    quantized = np.array(await OnnxEmbeddings(output, quantized=True).embed_documents(texts))
+    assert np.all(np.sum(quantized * expected, axis=1) > 0.9)
@@ -0,0 +1,51 @@
+from app.ingest.splitter import ChunkSplitter
+from app.models import RagChunk
+from app.rag.packing import estimate_tokens, pack_context
+
+
+def _chunks(text, path="guia.md", with_offsets=True):
+    pieces = ChunkSplitter(chunk_size=200, overlap=60).split(text)
+    chunks = []
+    for index, piece in enumerate(pieces):
+        meta = piece.metadata if with_offsets else {}
+        chunks.append(
+            RagChunk(
+                id=index + 1, content=piece.content, path=path, repo="company", tag="v1", meta=meta
+            )
+        )
+    return chunks
+
+
+def test_pack_context_merges_overlapping_chunks_of_the_same_document():
+    text = " ".join(
+        f"paso {n}: ejecuta el comando numero {n} y revisa la salida." for n in range(30)
+    )
+    for with_offsets in (True, False):
+        chunks = _chunks(text, with_offsets=with_offsets)
+        other = RagChunk(
+            id=99, content="Otra guia distinta.", path="otra.md", repo="company", tag="v1", meta={}
+        )
+        # Retrieval order, not document order.
+        ranked = [chunks[3], other, chunks[2], chunks[4]]
+
+        segments = pack_context(ranked, token_budget=0)
+
+        assert [segment.path for segment in segments] == ["guia.md", "otra.md"]
+        expected = " ".join(chunk.content for chunk in chunks[2:5])
+        assert len(segments[0].content) < len(expected)
+        assert text.find(segments[0].content) != -1
+        assert segments[0].chunk_ids == [3, 4, 5]
+
+
+def test_pack_context_fills_the_token_budget_in_rank_order():
+    first = RagChunk(id=1, content="alfa " * 200, path="a.md", meta={})
+    second = RagChunk(id=2, content="beta " * 200, path="b.md", meta={})
+    small = RagChunk(id=3, content="gamma " * 10, path="c.md", meta={})
+
+    segments = pack_context(
+        [first, second, small], token_budget=estimate_tokens(first.content) + 100
+    )
+
+    assert [segment.path for segment in segments] == ["a.md", "b.md"]
+    assert segments[1].content.endswith("…")
+    assert sum(segment.tokens for segment in segments) <= estimate_tokens(first.content) + 100
@@ -0,0 +1,54 @@
+from app.rag.rerank import Reranker
+
+
+class RecordingCrossEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, pairs, **kwargs):
+        self.calls.append([doc for _, doc in pairs])
+        return [float(len(doc)) for _, doc in pairs]
+
+
+async def test_rerank_caches_scores_and_sorts_by_length():
+    reranker = Reranker("stub", cache_size=16)
+    model = RecordingCrossEncoder()
+    reranker._model = model
+
+    documents = ["bastante largo", "a", "medio"]
+    scores = await reranker.rerank("Como instalar?", documents, ids=[1, 2, 3])
+    assert scores == [14.0, 1.0, 5.0]
+    assert model.calls == [["a", "medio", "bastante largo"]]
+
+    # Only the unseen chunk is scored again; the rest come from the cache.
+    scores = await reranker.rerank(" Como  instalar? ", ["bastante largo", "nuevo"], ids=[1, 4])
+    assert scores == [14.0, 5.0]
+    assert model.calls[-1] == ["nuevo"]
+    assert reranker.cache.stats()["hits"] == 1
+
+
+async def test_ask_cascade_overfetches_prunes_and_reranks(db_session, stubbed_rag):
+    from app.models import RagChunk
+
+    model = RecordingCrossEncoder()
+    stubbed_rag.reranker = Reranker("stub", cache_size=16)
+    stubbed_rag.reranker._model = model
+    stubbed_rag.settings.rerank_fanout = 3
+    stubbed_rag.settings.rerank_candidates = 3
+
+    async with db_session() as session:
+        docs = [
+            (
+                RagChunk(content="x" * (8 - i), path=f"{i}.md", repo="company", tag="v1"),
+                [1.0, 0.1 * i, 0.0],
+            )
+            for i in range(8)
+        ]
+        await stubbed_rag.ingest_chunks(session, docs)
+        result = await stubbed_rag.ask(session, "Como instalar?", k=2)
+
+    assert result.timings["candidates_retrieved"] == 6
+    assert result.timings["candidates_reranked"] == 3
+    assert len(model.calls[0]) == 3
+    # Bi-encoder keeps 7, 6, 5; the cross-encoder (longer is better) reorders them.
+    assert [source["path"] for source in result.sources] == ["5.md", "6.md"]
@@ -0,0 +1,521 @@
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql
+
+from app.models import RagChunk
+
+
+@pytest.fixture
+def faiss_settings(monkeypatch, tmp_path):
+    from app import config
+
+    monkeypatch.setenv("VECTOR_BACKEND", "faiss")
+    monkeypatch.setattr("app.rag.faiss_index.INDEX_DIR", tmp_path)
+    config.get_settings.cache_clear()
+    settings = config.get_settings()
+    # Train on the tiny test tables instead of waiting for a real corpus.
+    settings.faiss_train_min_rows = 1
+    settings.faiss_nlist = 1
+    yield settings
+    config.get_settings.cache_clear()
+
+
+@pytest.fixture
+def pgvector_settings():
+    from app import config
+
+    config.get_settings.cache_clear()
+    settings = config.get_settings()
+    yield settings
+    config.get_settings.cache_clear()
+
+
+class _Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return SimpleNamespace(all=lambda: [next(iter(row.values())) for row in self.rows])
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class _PostgresSession:
+    # Compiles every statement for the postgresql dialect and answers with scripted rows, so the
+    # pgvector paths run without a server.
+    def __init__(self, *results):
+        self.bind = SimpleNamespace(dialect=postgresql.dialect())
+        self.results = list(results)
+        self.statements: list[tuple[str, dict]] = []
+
+    async def execute(self, statement, params=None):
+        compiled = statement.compile(dialect=self.bind.dialect)
+        self.statements.append((" ".join(str(compiled).split()), params or {}))
+        return _Result(self.results.pop(0) if self.results else [])
+
+    @asynccontextmanager
+    async def begin_nested(self):
+        yield
+
+
+def _row(chunk_id, **values):
+    from app.rag.retriever import CHUNK_COLUMNS
+
+    row = {column.name: None for column in CHUNK_COLUMNS}
+    row.update(id=chunk_id, content=f"chunk {chunk_id}", **values)
+    return row
+
+
+def _chunk(content, repo, acl):
+    return RagChunk(content=content, path=f"{content}.md", repo=repo, tag="v1", acl=acl)
+
+
+@pytest.mark.parametrize(
+    ("index_type", "quantization"),
+    [("flat", "none"), ("ivf", "none"), ("hnsw", "none"), ("flat", "int8"), ("hnsw", "float16")],
+)
+async def test_faiss_search_maps_ids_and_filters(
+    db_session, faiss_settings, index_type, quantization
+):
+    from app.rag.retriever import Retriever
+    from app.rag.service import RAGService
+
+    faiss_settings.faiss_index_type = index_type
+    faiss_settings.faiss_quantization = quantization
+    retriever = Retriever(faiss_settings)
+    service = RAGService(settings=faiss_settings, embeddings=None, retriever=retriever)
+
+    async with db_session() as session:
+        # The first search builds the index from the table.
+        await service.ingest_chunks(
+            session, [(_chunk("alpha", "company", ["public"]), [1.0, 0.0, 0.0])]
+        )
+        assert [r.chunk.content for r in await retriever.search(session, [1.0, 0.0, 0.0], k=1)] == [
+            "alpha"
+        ]
+
+        # Later ingests append to the existing index.
+        await service.ingest_chunks(
+            session,
+            [
+                (_chunk("beta", "company", ["team"]), [0.9, 0.1, 0.0]),
+                (_chunk("gamma", "other", ["public"]), [0.0, 1.0, 0.0]),
+            ],
+        )
+        assert retriever.ann_index.ntotal == 3
+
+        results = await retriever.search(session, [0.0, 1.0, 0.0], k=3)
+        assert results[0].chunk.content == "gamma"
+        assert results[0].score == pytest.approx(1.0)
+
+        filtered = await retriever.search(
+            session, [0.0, 1.0, 0.0], k=3, repo="company", acl=["public"]
+        )
+        assert [r.chunk.content for r in filtered] == ["alpha"]
+
+    reloaded = Retriever(faiss_settings)
+    assert reloaded.ann_index.is_ready
+    assert reloaded.ann_index.ntotal == 3
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "hnsw"])
+async def test_removed_chunks_leave_faiss_and_metadata_indexes(
+    db_session, faiss_settings, index_type
+):
+    from app.rag.retriever import Retriever
+    from app.rag.service import RAGService
+
+    faiss_settings.faiss_index_type = index_type
+    retriever = Retriever(faiss_settings)
+    service = RAGService(settings=faiss_settings, embeddings=None, retriever=retriever)
+
+    async with db_session() as session:
+        chunks = [_chunk("alpha", "company", ["public"]), _chunk("gamma", "other", ["public"])]
+        await service.ingest_chunks(
+            session, list(zip(chunks, [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]], strict=True))
+        )
+        assert [r.chunk.content for r in await retriever.search(session, [0.0, 1.0, 0.0], k=1)] == [
+            "gamma"
+        ]
+
+        gamma_id = chunks[1].id
+        await session.execute(delete(RagChunk).where(RagChunk.id == gamma_id))
+        await session.commit()
+        await retriever.index_chunks(session, [], removed=[gamma_id])
+
+        # HNSW and IVF can't drop vectors in place; their tombstones must hide gamma all the same.
+        assert [r.chunk.content for r in await retriever.search(session, [0.0, 1.0, 0.0], k=2)] == [
+            "alpha"
+        ]
+        assert await retriever.search(session, [0.0, 1.0, 0.0], k=2, repo="other") == []
+        assert retriever.metadata_index.size == 1
+
+    reloaded = Retriever(faiss_settings)
+    assert [cid for cid, _ in reloaded.ann_index.search([0.0, 1.0, 0.0], 2)] == [chunks[0].id]
+
+
+async def test_faiss_writers_sharing_the_index_file_keep_each_others_vectors(
+    db_session, faiss_settings
+):
+    from app.rag.retriever import Retriever
+    from app.rag.service import RAGService
+
+    # Two processes (the API and the ingest CLI) with the same index loaded.
+    api, cli = Retriever(faiss_settings), Retriever(faiss_settings)
+    api_service = RAGService(settings=faiss_settings, embeddings=None, retriever=api)
+    cli_service = RAGService(settings=faiss_settings, embeddings=None, retriever=cli)
+
+    async with db_session() as session:
+        await api_service.ingest_chunks(
+            session, [(_chunk("alpha", "company", None), [1.0, 0.0, 0.0])]
+        )
+        await api.search(session, [1.0, 0.0, 0.0], k=1)
+        cli.ann_index.load()
+
+        await cli_service.ingest_chunks(
+            session, [(_chunk("beta", "company", None), [0.0, 1.0, 0.0])]
+        )
+        await api_service.ingest_chunks(
+            session, [(_chunk("gamma", "company", None), [0.0, 0.0, 1.0])]
+        )
+        assert api.ann_index.ntotal == 3
+
+        # Rows written while no index was loaded are picked up by the next search.
+        delta = _chunk("delta", "company", None)
+        delta.embedding = [0.0, 0.7, 0.7]
+        session.add(delta)
+        await session.commit()
+        assert [r.chunk.content for r in await api.search(session, [0.0, 0.7, 0.7], k=1)] == [
+            "delta"
+        ]
+
+    reloaded = Retriever(faiss_settings)
+    assert reloaded.ann_index.ntotal == 4
+
+
+async def test_faiss_stays_flat_until_enough_rows_to_train(db_session, faiss_settings):
+    import faiss
+
+    from app.rag.retriever import Retriever
+    from app.rag.service import RAGService
+
+    faiss_settings.faiss_index_type = "ivf"
+    faiss_settings.faiss_train_min_rows = 3
+    retriever = Retriever(faiss_settings)
+    service = RAGService(settings=faiss_settings, embeddings=None, retriever=retriever)
+
+    async with db_session() as session:
+        await service.ingest_chunks(session, [(_chunk("alpha", "company", None), [1.0, 0.0, 0.0])])
+        assert [r.chunk.content for r in await retriever.search(session, [1.0, 0.0, 0.0], k=1)] == [
+            "alpha"
+        ]
+        assert retriever.ann_index.is_provisional
+
+        # Reaching the threshold retrains from the table instead of keeping the first batch's
+        # centroids.
+        await service.ingest_chunks(
+            session,
+            [
+                (_chunk("beta", "company", None), [0.0, 1.0, 0.0]),
+                (_chunk("gamma", "company", None), [0.0, 0.0, 1.0]),
+            ],
+        )
+        assert not retriever.ann_index.is_provisional
+        assert isinstance(retriever.ann_index._search_index(), faiss.IndexIVF)
+        assert retriever.ann_index.ntotal == 3
+        assert [r.chunk.content for r in await retriever.search(session, [0.0, 1.0, 0.0], k=1)] == [
+            "beta"
+        ]
+
+
+async def test_metadata_index_prefilters_fallback_search(db_session):
+    from app import config
+    from app.rag.retriever import Retriever
+    from app.rag.service import RAGService
+
+    settings = config.get_settings()
+    retriever = Retriever(settings)
+    service = RAGService(settings=settings, embeddings=None, retriever=retriever)
+
+    async with db_session() as session:
+        await service.ingest_chunks(
+            session,
+            [
+                (_chunk("alpha", "company", ["public"]), [1.0, 0.0, 0.0]),
+                (_chunk("beta", "company", ["team"]), [0.0, 1.0, 0.0]),
+                (_chunk("gamma", "other", ["public"]), [0.0, 1.0, 0.0]),
+                (_chunk("delta", "company", None), [0.0, 0.9, 0.1]),
+            ],
+        )
+
+        results = await retriever.search(
+            session, [0.0, 1.0, 0.0], k=3, repo="company", acl=["public"]
+        )
+        assert [r.chunk.content for r in results] == ["delta", "alpha"]
+        assert retriever.metadata_index.size == 4
+
+        await service.ingest_chunks(
+            session, [(_chunk("epsilon", "company", ["public"]), [0.0, 1.0, 0.0])]
+        )
+        results = await retriever.search(
+            session, [0.0, 1.0, 0.0], k=1, repo="company", acl=["public"]
+        )
+        assert [r.chunk.content for r in results] == ["epsilon"]
+        assert await retriever.search(session, [0.0, 1.0, 0.0], k=1, repo="missing") == []
+
+
+async def test_fallback_search_loads_chunks_without_embeddings(db_session):
+    from app import config
+    from app.rag.retriever import Retriever
+    from app.rag.service import RAGService
+
+    settings = config.get_settings()
+    retriever = Retriever(settings)
+    service = RAGService(settings=settings, embeddings=None, retriever=retriever)
+
+    async with db_session() as session:
+        await service.ingest_chunks(
+            session, [(_chunk("alpha", "company", ["public"]), [1.0, 0.0, 0.0])]
+        )
+        session.expunge_all()
+
+        [first] = await retriever.search(session, [1.0, 0.0, 0.0], k=1)
+        assert first.chunk.content == "alpha"
+        assert first.chunk.embedding is None
+
+        await retriever.search(session, [1.0, 0.0, 0.0], k=1)
+        assert retriever.chunk_cache.stats()["hits"] == 1
+
+
+async def test_chunk_cache_drops_rows_another_process_moved(db_session):
+    from sqlalchemy import update
+
+    from app import config
+    from app.models import IngestManifest
+    from app.rag.retriever import Retriever
+    from app.rag.service import RAGService
+
+    settings = config.get_settings()
+    retriever = Retriever(settings)
+    service = RAGService(settings=settings, embeddings=None, retriever=retriever)
+
+    async with db_session() as session:
+        await service.ingest_chunks(
+            session, [(_chunk("alpha", "company", ["public"]), [1.0, 0.0, 0.0])]
+        )
+        [first] = await retriever.search(session, [1.0, 0.0, 0.0], k=1)
+        assert not (first.chunk.meta or {}).get("start_index")
+        await session.commit()
+
+        # A sync in the CLI moves the row and records the file in the manifest.
+        async with db_session() as other:
+            await other.execute(update(RagChunk).values(meta={"start_index": 40}))
+            other.add(IngestManifest(path="alpha.md", repo="company", file_hash="h", chunks=[]))
+            await other.commit()
+
+        [moved] = await retriever.search(session, [1.0, 0.0, 0.0], k=1)
+        assert moved.chunk.meta == {"start_index": 40}
+
+
+async def test_failed_pgvector_search_rolls_back_before_the_fallback(db_session, monkeypatch):
+    from sqlalchemy import func, insert, select, text
+
+    from app import config
+    from app.rag.retriever import Retriever, SearchRequest
+    from app.rag.service import RAGService
+
+    settings = config.get_settings()
+    retriever = Retriever(settings)
+    service = RAGService(settings=settings, embeddings=None, retriever=retriever)
+
+    async def failing_search(session, *args, **kwargs):
+        # Leaves a write behind, then fails the way a missing pgvector function would.
+        await session.execute(insert(RagChunk).values(content="parcial", path="parcial.md"))
+        await session.execute(text("SELECT binary_quantize(1)"))
+
+    monkeypatch.setattr(Retriever, "_uses_pgvector", staticmethod(lambda session: True))
+    monkeypatch.setattr(retriever, "_postgres_vector_search", failing_search)
+    monkeypatch.setattr(retriever, "_postgres_vector_search_batch", failing_search)
+
+    async with db_session() as session:
+        await service.ingest_chunks(
+            session, [(_chunk("alpha", "company", ["public"]), [1.0, 0.0, 0.0])]
+        )
+
+        [hit] = await retriever.search(session, [1.0, 0.0, 0.0], k=1)
+        assert hit.chunk.content == "alpha"
+        [[batch_hit]] = await retriever.search_batch(
+            session, [SearchRequest(embedding=[1.0, 0.0, 0.0], k=1)]
+        )
+        assert batch_hit.chunk.content == "alpha"
+        assert (await session.execute(select(func.count()).select_from(RagChunk))).scalar() == 1
+
+
+@pytest.mark.parametrize("method", ["prefix", "pca"])
+async def test_faiss_coarse_search_rescores_at_full_dimension(db_session, faiss_settings, method):
+    from app.rag.retriever import Retriever
+    from app.rag.service import RAGService
+
+    faiss_settings.coarse_dims = 2
+    faiss_settings.coarse_method = method
+    retriever = Retriever(faiss_settings)
+    service = RAGService(settings=faiss_settings, embeddings=None, retriever=retriever)
+
+    async with db_session() as session:
+        await service.ingest_chunks(
+            session,
+            [
+                (_chunk("alpha", "company", None), [1.0, 0.0, 0.0]),
+                (_chunk("beta", "company", None), [0.6, 0.0, 0.8]),
+                (_chunk("gamma", "company", None), [0.0, 1.0, 0.0]),
+            ],
+        )
+        timings: dict[str, float] = {}
+        results = await retriever.search(session, [0.6, 0.0, 0.8], k=1, timings=timings)
+
+    assert retriever.ann_index.is_reduced
+    assert [r.chunk.content for r in results] == ["beta"]
+    assert results[0].score == pytest.approx(1.0)
+    assert {"coarse_search", "rescore", "coarse_candidates"} <= timings.keys()
+
+
+def test_pgvector_rejects_coarse_dims_without_a_prefix_index(monkeypatch):
+    from pydantic import ValidationError
+
+    from app.config import Settings
+
+    monkeypatch.setenv("COARSE_DIMS", "100")
+    with pytest.raises(ValidationError, match="COARSE_DIMS"):
+        Settings()
+
+    monkeypatch.setenv("VECTOR_BACKEND", "faiss")
+    assert Settings().coarse_dims == 100
+
+
+@pytest.mark.parametrize(
+    ("quantization", "coarse_dims", "factor", "coarse_order"),
+    [
+        (
+            "halfvec",
+            0,
+            4,
+            "ORDER BY embedding::halfvec(1024) <=> CAST(%(embedding)s AS halfvec(1024))",
+        ),
+        (
+            "binary",
+            0,
+            4,
+            "ORDER BY binary_quantize(embedding)::bit(1024) "
+            "<~> binary_quantize(CAST(%(embedding)s AS vector(1024)))",
+        ),
+        (
+            "none",
+            128,
+            8,
+            "ORDER BY subvector(embedding, 1, 128)::vector(128) "
+            "<=> subvector(CAST(%(embedding)s AS vector(1024)), 1, 128)::vector(128)",
+        ),
+    ],
+)
+async def test_pgvector_search_rescores_the_coarse_pool_at_full_precision(
+    pgvector_settings, quantization, coarse_dims, factor, coarse_order
+):
+    from app.rag.retriever import Retriever
+
+    pgvector_settings.pgvector_quantization = quantization
+    pgvector_settings.coarse_dims = coarse_dims
+    pgvector_settings.two_phase_retrieval = False
+    retriever = Retriever(pgvector_settings)
+    session = _PostgresSession(
+        [],
+        [{"id": 3}, {"id": 1}],
+        [_row(3, similarity=0.9), _row(1, similarity=0.5)],
+    )
+
+    timings: dict[str, float] = {}
+    results = await retriever.search(
+        session, [0.1, 0.2], k=20, repo="company", acl=["public"], timings=timings
+    )
+
+    set_ef, (pool, pool_params), (rescore, rescore_params) = session.statements
+    assert set_ef[0] == f"SET LOCAL hnsw.ef_search = {20 * factor}"
+    assert "WHERE TRUE AND repo = %(repo)s AND acl && %(acl)s" in pool
+    assert coarse_order in pool
+    assert pool.endswith("LIMIT %(candidates)s")
+    assert pool_params["candidates"] == 20 * factor
+    assert "WHERE id = ANY(%(ids)s) ORDER BY embedding <=> %(embedding)s" in rescore
+    assert rescore_params["ids"] == [3, 1]
+    assert [(r.chunk.id, r.score) for r in results] == [(3, 0.9), (1, 0.5)]
+    assert timings["coarse_candidates"] == 2
+
+
+@pytest.mark.parametrize(
+    ("k", "ef_search", "expected"),
+    [
+        (5, None, None),
+        (5, 100, "SET LOCAL hnsw.ef_search = 100"),
+        (60, None, "SET LOCAL hnsw.ef_search = 60"),
+        (5, 5000, "SET LOCAL hnsw.ef_search = 1000"),
+    ],
+)
+async def test_pgvector_search_sets_ef_search_only_when_the_scan_needs_it(
+    pgvector_settings, k, ef_search, expected
+):
+    from app.rag.retriever import Retriever
+
+    pgvector_settings.two_phase_retrieval = False
+    retriever = Retriever(pgvector_settings)
+    session = _PostgresSession()
+
+    await retriever.search(session, [0.1, 0.2], k=k, ef_search=ef_search, probes=10)
+
+    statements = [statement for statement, _ in session.statements]
+    assert [s for s in statements if s.startswith("SET LOCAL hnsw")] == (
+        [expected] if expected else []
+    )
+    assert "SET LOCAL ivfflat.probes = 10" in statements
+    assert statements[-1].endswith("ORDER BY embedding <=> %(embedding)s LIMIT %(limit)s")
+
+
+async def test_pgvector_batch_search_joins_each_query_lateral(pgvector_settings):
+    from app.rag.retriever import Retriever, SearchRequest
+
+    pgvector_settings.pgvector_quantization = "halfvec"
+    pgvector_settings.chunk_cache_size = 0
+    retriever = Retriever(pgvector_settings)
+    session = _PostgresSession(
+        [{"qid": 0, "id": 1, "similarity": 0.9}, {"qid": 1, "id": 2, "similarity": 0.7}],
+        [_row(1), _row(2)],
+    )
+
+    results = await retriever.search_batch(
+        session,
+        [
+            SearchRequest(embedding=[0.1, 0.2], k=3, repo="company"),
+            SearchRequest(embedding=[0.3, 0.4], k=5, acl=["public"]),
+        ],
+    )
+
+    (batch, params), (load, _) = session.statements
+    assert (
+        "FROM (VALUES (%(qid0)s, CAST(%(query0)s AS vector(1024)), %(k0)s, "
+        "CAST(%(repo0)s AS text), CAST(%(tag0)s AS text), CAST(%(acl0)s AS text[])), "
+        "(%(qid1)s, CAST(%(query1)s AS vector(1024))" in batch
+    )
+    assert "CROSS JOIN LATERAL" in batch
+    assert "ORDER BY embedding::halfvec(1024) <=> CAST(q.query AS halfvec(1024))" in batch
+    assert "LIMIT q.k * 4" in batch
+    assert batch.endswith("ORDER BY c.embedding <=> q.query LIMIT q.k ) AS hits")
+    assert params["repo0"] == "company" and params["acl1"] == ["public"] and params["k1"] == 5
+    assert "embedding" not in load.split("FROM")[0]
+    assert [[(r.chunk.id, r.score) for r in hits] for hits in results] == [[(1, 0.9)], [(2, 0.7)]]
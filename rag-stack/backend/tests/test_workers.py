@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.rag.workers import ModelWorkerPool, pack_texts, unpack_texts
+
+
+class StubModel:
+    def get_sentence_embedding_dimension(self):
+        return 2
+
+    def encode(self, texts, **kwargs):
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+    def predict(self, pairs, **kwargs):
+        return np.array([len(doc) - len(query) for query, doc in pairs], dtype=np.float32)
+
+
+def test_pack_texts_round_trip():
+    shm, count = pack_texts(["", "hola", "canción"])
+    try:
+        assert unpack_texts(shm.buf, count) == ["", "hola", "canción"]
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+async def test_worker_pool_encodes_and_predicts_in_subprocess():
+    pool = ModelWorkerPool(StubModel, workers=1)
+    try:
+        vectors = await pool.encode(["a", "abc"], batch_size=8)
+        scores = await pool.predict("q", ["doc", "document"])
+    finally:
+        pool.shutdown()
+    assert vectors.tolist() == [[1.0, 1.0], [3.0, 1.0]]
+    assert scores.tolist() == [2.0, 7.0]
+
+
+
+class PidModel(StubModel):
+    def encode(self, texts, **kwargs):
+        return np.array([[os.getpid(), 0.0] for _ in texts], dtype=np.float32)
+
+
+async def test_closing_the_rag_service_stops_model_workers():
+    from app import config
+    from app.rag.embeddings import SentenceTransformerEmbeddings
+    from app.rag.retriever import Retriever
+    from app.rag.service import RAGService
+
+    settings = config.get_settings()
+    embeddings = SentenceTransformerEmbeddings("test", worker_pool=ModelWorkerPool(PidModel, 1))
+    service = RAGService(settings=settings, embeddings=embeddings, retriever=Retriever(settings))
+    pid = int((await embeddings.worker_pool.encode(["a"], batch_size=1))[0][0])
+
+    await service.close()
+
+    with pytest.raises(ProcessLookupError):
+        os.kill(pid, 0)